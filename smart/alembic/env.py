@@ -5,6 +5,11 @@ from sqlalchemy import pool
 
 from alembic import context
 
+# Reflex has to load before sqlmodel, so the app modules come first
+import app.models  # noqa: F401
+import reflex as rx
+from sqlmodel import SQLModel
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -16,9 +21,21 @@ if config.config_file_name is not None:
 
 # add your model's MetaData object here
 # for 'autogenerate' support
-# from myapp import mymodel
-# target_metadata = mymodel.Base.metadata
-target_metadata = None
+target_metadata = SQLModel.metadata
+
+if config.get_main_option("sqlalchemy.url").startswith("driver://"):
+    config.set_main_option("sqlalchemy.url", rx.config.get_config().db_url)
+
+# The search index (app/search.py) is an FTS5 virtual table and its shadow
+# tables, created with raw SQL and not in the models
+SEARCH_INDEX_PREFIX = "uploadedfile_fts"
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Keep autogenerate from dropping the search index tables."""
+    if type_ == "table" and reflected and compare_to is None:
+        return not name.startswith(SEARCH_INDEX_PREFIX)
+    return True
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -42,6 +59,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -57,6 +75,12 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
+    # A caller (the tests) may hand over its own connection
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run_on(connection)
+        return
+
     connectable = engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
@@ -64,12 +88,22 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(
-            connection=connection, target_metadata=target_metadata
-        )
+        _run_on(connection)
+
 
-        with context.begin_transaction():
-            context.run_migrations()
+def _run_on(connection) -> None:
+    # Same options as `reflex db makemigrations`
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        render_item=rx.Model._alembic_render_item,
+        compare_type=False,
+        render_as_batch=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
 
 
 if context.is_offline_mode():
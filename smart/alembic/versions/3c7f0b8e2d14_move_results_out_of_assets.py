@@ -0,0 +1,48 @@
+"""move results out of assets
+
+Revision ID: 3c7f0b8e2d14
+Revises: 9b4d7e2f1a63
+Create Date: 2026-10-17 21:14:37.260519
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '3c7f0b8e2d14'
+down_revision: Union[str, Sequence[str], None] = '9b4d7e2f1a63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Results sheets used to be saved under assets, where Reflex serves them
+OLD_RESULTS_DIR = "assets/uploaded_files/results"
+NEW_RESULTS_DIR = "uploaded_results"
+
+
+def _move_results(source: str, target: str):
+    bind = op.get_bind()
+    rows = bind.execute(sa.text("SELECT id, file_path FROM semesterresult")).fetchall()
+    for result_id, file_path in rows:
+        if os.path.dirname(file_path) != source:
+            continue
+        new_path = os.path.join(target, os.path.basename(file_path))
+        if os.path.exists(file_path):
+            os.makedirs(target, exist_ok=True)
+            os.replace(file_path, new_path)
+        bind.execute(
+            sa.text("UPDATE semesterresult SET file_path = :path WHERE id = :id"),
+            {"path": new_path, "id": result_id},
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _move_results(OLD_RESULTS_DIR, NEW_RESULTS_DIR)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _move_results(NEW_RESULTS_DIR, OLD_RESULTS_DIR)
@@ -0,0 +1,70 @@
+"""add file search index
+
+Revision ID: 852e762ede04
+Revises: d33d0222dadc
+Create Date: 2026-10-17 11:20:05.311842
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '852e762ede04'
+down_revision: Union[str, Sequence[str], None] = 'd33d0222dadc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Schema and text folding as of this revision, copied from app/search.py so
+# the migration keeps working when the app module changes
+_TASHKEEL = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]")
+_LETTERS = str.maketrans("أإآٱةىؤئ", "ااااهيوي")
+_ARTICLE = re.compile(r"^(?:وال|بال|كال|فال|لل|ال)(?=\w{2})")
+_WORD = re.compile(r"\w+")
+
+
+def _normalize(value):
+    if not value:
+        return ""
+    value = _TASHKEEL.sub("", value).translate(_LETTERS).lower()
+    return " ".join(_ARTICLE.sub("", word) for word in _WORD.findall(value))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != "sqlite":
+        # Search falls back to LIKE on other databases
+        return
+
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS uploadedfile_fts USING fts5("
+        "file_description, filename, uploader, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+
+    # Index the files uploaded before the search existed
+    rows = bind.execute(sa.text(
+        "SELECT f.id, f.file_description, f.filename, COALESCE(u.full_name, u.username, '') "
+        "FROM uploadedfile f LEFT JOIN user u ON u.id = f.uploaded_by_id"
+    )).fetchall()
+    insert = sa.text(
+        "INSERT OR REPLACE INTO uploadedfile_fts (rowid, file_description, filename, uploader) "
+        "VALUES (:id, :description, :filename, :uploader)"
+    )
+    for file_id, description, filename, uploader in rows:
+        bind.execute(insert, {
+            "id": file_id,
+            "description": _normalize(description),
+            "filename": _normalize(filename),
+            "uploader": _normalize(uploader),
+        })
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    op.execute("DROP TABLE IF EXISTS uploadedfile_fts")
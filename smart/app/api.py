@@ -0,0 +1,184 @@
+import hmac
+from urllib.parse import quote
+
+import reflex as rx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from app import db
+from app.downloads import check_download, find_semester_result, find_uploaded_file, send_file
+from app.exports import (
+    EXPORT_MEDIA_TYPES,
+    EXPORT_TABLES,
+    find_export_entries,
+    iter_table_export,
+    iter_zip,
+)
+from app.listing_cache import listing_cache
+from app.passwords import password_pool
+from app.uploads import UploadError, abort_upload, append_chunk, get_upload_session
+
+
+def _error(e: UploadError) -> JSONResponse:
+    return JSONResponse({"error": str(e)}, status_code=e.status_code)
+
+
+def _is_export_allowed(request: Request) -> bool:
+    """Exports carry a token signed for a supervisor (see SupervisorState)."""
+    return check_download(request.query_params.get("token", ""), "exports")
+
+
+async def upload_status(request: Request):
+    """Report how many bytes of a resumable upload the server has."""
+    try:
+        upload = await get_upload_session(request.path_params["upload_id"])
+    except UploadError as e:
+        return _error(e)
+
+    headers = {
+        "Upload-Offset": str(upload.offset),
+        "Upload-Length": str(upload.total_size),
+        "Cache-Control": "no-store",
+    }
+    if request.method == "HEAD":
+        return Response(headers=headers)
+    return JSONResponse(
+        {"offset": upload.offset, "length": upload.total_size}, headers=headers
+    )
+
+
+async def upload_chunk(request: Request):
+    """Append the request body to a resumable upload at Upload-Offset."""
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        return JSONResponse({"error": "Missing Upload-Offset"}, status_code=400)
+
+    try:
+        new_offset = await append_chunk(
+            request.path_params["upload_id"],
+            offset,
+            request.stream(),
+            request.headers.get("Upload-Checksum"),
+        )
+    except UploadError as e:
+        return _error(e)
+
+    return JSONResponse({"offset": new_offset}, headers={"Upload-Offset": str(new_offset)})
+
+
+async def upload_abort(request: Request):
+    """Cancel a resumable upload."""
+    try:
+        await abort_upload(request.path_params["upload_id"])
+    except UploadError as e:
+        return _error(e)
+    return Response(status_code=204)
+
+
+async def download_uploaded_file(request: Request):
+    """Download an uploaded file; supports Range and conditional requests."""
+    found = await find_uploaded_file(request.path_params["file_id"])
+    if not found:
+        return Response("File not found", status_code=404)
+    return await send_file(request, *found)
+
+
+async def download_semester_result(request: Request):
+    """Download a semester results sheet, with a token signed for a supervisor."""
+    if not check_download(request.query_params.get("token", ""), "results"):
+        return Response("Forbidden", status_code=403)
+    found = await find_semester_result(request.path_params["result_id"])
+    if not found:
+        return Response("File not found", status_code=404)
+    return await send_file(request, *found)
+
+
+async def export_files_zip(request: Request):
+    """Stream uploaded files as one ZIP, filtered by semester, teacher or type."""
+    if not _is_export_allowed(request):
+        return Response("Forbidden", status_code=403)
+    params = request.query_params
+    teacher_id = params.get("teacher")
+    entries = await find_export_entries(
+        semester=params.get("semester") or None,
+        teacher_id=int(teacher_id) if teacher_id and teacher_id.isdigit() else None,
+        file_type=params.get("type") or None,
+    )
+    if not entries:
+        return Response("No files to export", status_code=404)
+
+    filename = f"{params.get('semester') or 'files'}.zip"
+    return StreamingResponse(
+        iter_zip(entries),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename*=utf-8''{quote(filename)}",
+            "Cache-Control": "no-store",
+        },
+    )
+
+
+async def export_table(request: Request):
+    """Stream a whole table as CSV or JSON lines."""
+    if not _is_export_allowed(request):
+        return Response("Forbidden", status_code=403)
+    table = request.path_params["table"]
+    fmt = request.path_params["fmt"]
+    if table not in EXPORT_TABLES or fmt not in EXPORT_MEDIA_TYPES:
+        return Response("Unknown export", status_code=404)
+
+    return StreamingResponse(
+        iter_table_export(table, fmt),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={
+            "Content-Disposition": f"attachment; filename={table}.{fmt}",
+            "Cache-Control": "no-store",
+        },
+    )
+
+
+def _stats(request: Request, stats) -> Response:
+    """Monitoring data, only for requests bearing rxconfig.py's stats_token.
+
+    Counters, pool settings and code sites are not for students, so the
+    routes stay closed until a token is configured.
+    """
+    token = getattr(rx.config.get_config(), "stats_token", "")
+    given = request.headers.get("authorization", "").removeprefix("Bearer ")
+    if not token or not hmac.compare_digest(given.encode(), token.encode()):
+        return Response(status_code=403)
+    return JSONResponse(stats(), headers={"Cache-Control": "no-store"})
+
+
+async def listing_cache_stats(request: Request):
+    """Hit/miss counters of the shared file-listing cache."""
+    return _stats(request, listing_cache.stats)
+
+
+async def password_pool_stats(request: Request):
+    """Queue depth of the bcrypt pool."""
+    return _stats(request, password_pool.stats)
+
+
+async def db_pool_stats(request: Request):
+    """Connections in use in the database pool of this worker."""
+    return _stats(request, db.pool_status)
+
+
+api = Starlette(
+    routes=[
+        Route("/api/uploads/{upload_id}", upload_status, methods=["GET", "HEAD"]),
+        Route("/api/uploads/{upload_id}", upload_chunk, methods=["PATCH"]),
+        Route("/api/uploads/{upload_id}", upload_abort, methods=["DELETE"]),
+        Route("/api/files/{file_id:int}", download_uploaded_file, methods=["GET", "HEAD"]),
+        Route("/api/results/{result_id:int}", download_semester_result, methods=["GET", "HEAD"]),
+        Route("/api/exports/files.zip", export_files_zip, methods=["GET"]),
+        Route("/api/exports/{table}.{fmt}", export_table, methods=["GET"]),
+        Route("/api/stats/listing-cache", listing_cache_stats, methods=["GET"]),
+        Route("/api/stats/password-pool", password_pool_stats, methods=["GET"]),
+        Route("/api/stats/db-pool", db_pool_stats, methods=["GET"]),
+    ]
+)
@@ -7,6 +7,11 @@ from app.pages.supervisor_dashboard import supervisor_dashboard
 from app.pages.student_dashboard import student_dashboard
 from app.states.auth_state import AuthState
 from app.models import create_default_users
+from app.api import api
+from app.uploads import upload_janitor
+from app.identity import identity_invalidator
+from app.jobs import job_runner
+from reflex.utils.exec import is_prod_mode
 
 app = rx.App(
     theme=rx.theme(appearance="light"),
@@ -17,8 +22,13 @@ app = rx.App(
             href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap",
             rel="stylesheet",
         ),
+        rx.script(src="/resumable_upload.js"),
     ],
+    api_transformer=api,
 )
+app.register_lifespan_task(upload_janitor)
+app.register_lifespan_task(identity_invalidator)
+app.register_lifespan_task(job_runner)
 app.add_page(index, route="/")
 app.add_page(login, route="/login")
 app.add_page(signup, route="/signup")
@@ -32,5 +42,10 @@ app.add_page(
     student_dashboard, route="/student-dashboard", on_load=AuthState.check_auth
 )
 
+# Synthetic 50k-row table for profiling the virtual table; dev server only
+if not is_prod_mode():
+    from app.pages.table_benchmark import table_benchmark
+    app.add_page(table_benchmark, route="/benchmark/table")
+
 # Create default admin user on startup
 #create_default_users()
\ No newline at end of file
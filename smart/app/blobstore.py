@@ -0,0 +1,217 @@
+import hashlib
+import os
+import secrets
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import queries
+from app.models import FileBlob, UploadedFile
+from app.search import unindex_file
+from app.storage import STAGING_DIR, UPLOAD_DIR, hash_file, remove_file, run_io, save_upload
+
+
+# Identical uploads share one file here, named after their sha256
+BLOB_DIR = os.path.join(UPLOAD_DIR, "blobs")
+
+# Tries to take a reference while deletes of the same content race us
+BLOB_REF_ATTEMPTS = 3
+
+
+def blob_path(sha256: str, extension: str = "") -> str:
+    """Location for a new blob of a content hash.
+
+    Each FileBlob row gets a path of its own: when content is deleted and
+    uploaded again right away, the delete unlinks the old path after its
+    commit and can never remove the new copy.
+    """
+    name = f"{sha256}-{secrets.token_hex(4)}{extension.lower()}"
+    return os.path.join(BLOB_DIR, sha256[:2], name)
+
+
+async def stage_upload(file) -> Tuple[str, str, int]:
+    """Stream an upload into the staging area.
+
+    Returns the staged path, the sha256 of the content and its size.
+    """
+    staged_path = os.path.join(STAGING_DIR, f"{secrets.token_hex(16)}.part")
+    digest = hashlib.sha256()
+    size = await save_upload(file, staged_path, digest)
+    return staged_path, digest.hexdigest(), size
+
+
+async def stage_existing(file_path: str) -> Tuple[str, str, int]:
+    """Hash a file that is already on disk so it can be stored as a blob."""
+    sha256 = await run_io(hash_file, file_path)
+    size = await run_io(os.path.getsize, file_path)
+    return file_path, sha256, size
+
+
+def _move_into_place(staged_path: str, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(staged_path, path)
+
+
+def _insert_new_blobs(dialect_name: str):
+    """INSERT for FileBlob rows that skips content another session just stored."""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(FileBlob).on_conflict_do_nothing(index_elements=["sha256"])
+
+
+async def _blobs_by_hash(session: AsyncSession, hashes) -> Dict[str, FileBlob]:
+    blobs = (await session.exec(queries.blobs_by_hash(hashes))).all()
+    return {blob.sha256: blob for blob in blobs}
+
+
+async def add_blob_refs(
+    session: AsyncSession,
+    staged: List[Tuple[str, str, int, str]],
+    moved: Optional[List[Tuple[str, str]]] = None,
+) -> List[FileBlob]:
+    """Take a reference on the blob of every staged file in one pass.
+
+    staged holds (staged_path, sha256, size, extension) tuples. Content that
+    is new is moved into the blob store, duplicates are simply dropped, and
+    existing blobs are looked up with a single query. Reference counts are
+    changed with UPDATE ... SET ref_count = ref_count + n, so concurrent
+    uploads and deletes of the same content never lose a count. The caller
+    commits.
+
+    Each file moved into the store is recorded in moved as (staged_path,
+    blob_path), so a caller whose commit fails can put it back with
+    unmove_blobs.
+    """
+    counts = Counter(sha256 for _, sha256, _, _ in staged)
+    first_copy = {}
+    for _, sha256, size, extension in staged:
+        first_copy.setdefault(sha256, (size, extension))
+
+    found: Dict[str, FileBlob] = {}
+    # Rows with no reference yet were inserted by this transaction
+    fresh = set()
+    missing = set(counts)
+    for _ in range(BLOB_REF_ATTEMPTS):
+        blobs = await _blobs_by_hash(session, missing)
+        new_hashes = missing - blobs.keys()
+        if new_hashes:
+            # Two uploads of the same new content both insert; the unique
+            # sha256 keeps one row and both take a reference on it
+            now = datetime.now()
+            await session.execute(
+                _insert_new_blobs(session.bind.dialect.name),
+                [
+                    {
+                        "sha256": sha256,
+                        "file_path": blob_path(sha256, first_copy[sha256][1]),
+                        "file_size": first_copy[sha256][0],
+                        "ref_count": 0,
+                        "created_date": now,
+                    }
+                    for sha256 in new_hashes
+                ],
+            )
+            blobs.update(await _blobs_by_hash(session, new_hashes))
+
+        fresh.update(sha256 for sha256, blob in blobs.items() if blob.ref_count <= 0)
+        for sha256, blob in blobs.items():
+            taken = await session.execute(
+                update(FileBlob)
+                .where(FileBlob.id == blob.id)
+                .values(ref_count=FileBlob.ref_count + counts[sha256])
+            )
+            # No row: the last reference was dropped meanwhile, store it again
+            if taken.rowcount == 1:
+                found[sha256] = blob
+                missing.discard(sha256)
+        if not missing:
+            break
+    else:
+        raise RuntimeError("Could not take a reference on the stored content")
+
+    for staged_path, sha256, _, _ in staged:
+        blob = found[sha256]
+        # A new row always takes the first copy; later duplicates are dropped
+        if sha256 in fresh or not await run_io(os.path.exists, blob.file_path):
+            fresh.discard(sha256)
+            await run_io(_move_into_place, staged_path, blob.file_path)
+            if moved is not None:
+                moved.append((staged_path, blob.file_path))
+        else:
+            await run_io(remove_file, staged_path)
+
+    return [found[sha256] for _, sha256, _, _ in staged]
+
+
+async def add_blob_ref(
+    session: AsyncSession,
+    staged_path: str,
+    sha256: str,
+    size: int,
+    extension: str = "",
+    moved: Optional[List[Tuple[str, str]]] = None,
+) -> FileBlob:
+    """Take a reference on the blob for sha256, creating it from staged_path."""
+    return (await add_blob_refs(session, [(staged_path, sha256, size, extension)], moved))[0]
+
+
+def _move_back(path: str, staged_path: str):
+    try:
+        os.replace(path, staged_path)
+    except FileNotFoundError:
+        pass
+
+
+async def unmove_blobs(moved: List[Tuple[str, str]]):
+    """Put files moved by add_blob_refs back where they were staged.
+
+    For a rolled-back transaction: the blob rows are gone, so the files
+    would otherwise stay in the store with nothing pointing at them.
+    """
+    for staged_path, path in reversed(moved):
+        await run_io(_move_back, path, staged_path)
+
+
+async def delete_uploaded_file(session: AsyncSession, uploaded_file: UploadedFile) -> Optional[str]:
+    """Delete an UploadedFile row and drop its reference on the content.
+
+    Returns the path to unlink once the session is committed, or None when
+    other uploads still share the blob or the row was already deleted.
+    """
+    blob_id = uploaded_file.blob_id
+    # Only the write that actually removes the row drops its reference
+    removed = await session.execute(delete(UploadedFile).where(UploadedFile.id == uploaded_file.id))
+    if not removed.rowcount:
+        return None
+    connection = await session.connection()
+    await connection.run_sync(unindex_file, uploaded_file.id)
+
+    if blob_id is None:
+        # Legacy uploads own a private copy
+        return uploaded_file.file_path
+
+    # Decrement in the database, then look at what is left
+    await session.execute(
+        update(FileBlob).where(FileBlob.id == blob_id).values(ref_count=FileBlob.ref_count - 1)
+    )
+    blob = (
+        await session.exec(
+            select(FileBlob)
+            .where(FileBlob.id == blob_id)
+            .execution_options(populate_existing=True)
+        )
+    ).first()
+    if not blob or blob.ref_count > 0:
+        return None
+
+    # Only removed if no upload took a reference in between
+    removed = await session.execute(
+        delete(FileBlob).where(FileBlob.id == blob_id, FileBlob.ref_count <= 0)
+    )
+    return blob.file_path if removed.rowcount else None
@@ -0,0 +1,159 @@
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import reflex as rx
+
+
+# Every row is exactly this tall, so a scroll offset maps straight to a row index
+ROW_HEIGHT = 40
+
+# Rows kept above and below the visible part so fast scrolling stays filled
+OVERSCAN = 10
+
+# Rows fetched and rendered at once (visible rows + overscan on both sides)
+WINDOW_ROWS = 40
+
+SCROLL_THROTTLE_MS = 80
+
+# How long a loaded table is shown again without asking the database
+TABLE_TTL_SECONDS = 60
+
+
+class VirtualTableState(rx.State, ABC, mixin=True):
+    """Backend half of virtual_table: holds only the rows in view.
+
+    Subclasses implement _fetch_count and _fetch_window; rows are dicts
+    keyed by the column keys given to virtual_table, plus "id". A subclass
+    missing either cannot be instantiated.
+    """
+
+    rows: List[Dict[str, Any]] = []
+    total_rows: int = 0
+    window_start: int = 0
+    _loaded_at: float = 0.0
+
+    @abstractmethod
+    async def _fetch_count(self) -> int:
+        """Number of rows in the table."""
+
+    @abstractmethod
+    async def _fetch_window(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        """Rows offset to offset + limit, in display order."""
+
+    async def _load_window(self, start: int):
+        self.window_start = start
+        self.rows = await self._fetch_window(start, WINDOW_ROWS)
+
+    async def _read_table(self, start: int):
+        total = await self._fetch_count()
+        start = min(start, max(0, total - WINDOW_ROWS))
+        return total, start, await self._fetch_window(start, WINDOW_ROWS)
+
+    @rx.event
+    async def load_table(self):
+        """Count the rows and (re)load the current window."""
+        self.total_rows, self.window_start, self.rows = await self._read_table(self.window_start)
+        self._loaded_at = time.monotonic()
+
+    @rx.event(background=True)
+    async def show_table(self):
+        """Load the table when it is first shown or its data has expired.
+
+        Runs in the background so the tables of a page load side by side;
+        the state is only locked to store the result.
+        """
+        async with self:
+            if time.monotonic() - self._loaded_at < TABLE_TTL_SECONDS:
+                return
+            start = self.window_start
+        total, start, rows = await self._read_table(start)
+        async with self:
+            self.total_rows, self.window_start, self.rows = total, start, rows
+            self._loaded_at = time.monotonic()
+
+    @rx.event
+    async def scroll_to(self, scroll_top: int):
+        """Move the window to a scroll offset reported by the browser."""
+        start = max(0, int(scroll_top or 0) // ROW_HEIGHT - OVERSCAN)
+        start = min(start, max(0, self.total_rows - WINDOW_ROWS))
+        if start != self.window_start or not self.rows:
+            await self._load_window(start)
+
+
+def _cell(content) -> rx.Component:
+    return rx.el.div(
+        content,
+        class_name="px-3 overflow-hidden text-ellipsis whitespace-nowrap",
+    )
+
+
+def virtual_table(
+    state,
+    columns: List[Tuple[str, str]],
+    table_id: str,
+    height: int = 480,
+    row_action: Optional[Callable[[Any], rx.Component]] = None,
+    empty_text: str = "لا توجد بيانات",
+) -> rx.Component:
+    """Table that only renders the rows in view and fetches them on scroll.
+
+    columns are (header, row key) pairs. row_action, when given, renders an
+    extra cell (e.g. a delete button) for a row.
+    """
+    grid = f"repeat({len(columns)}, minmax(0, 1fr))" + (" 96px" if row_action else "")
+    row_style = {
+        "display": "grid",
+        "gridTemplateColumns": grid,
+        "alignItems": "center",
+        "height": f"{ROW_HEIGHT}px",
+    }
+
+    header = rx.el.div(
+        *[_cell(title) for title, _ in columns],
+        *([_cell("")] if row_action else []),
+        style=row_style,
+        class_name="font-semibold bg-gray-100 border-b border-gray-200",
+    )
+
+    def render_row(row):
+        return rx.el.div(
+            *[_cell(row[key]) for _, key in columns],
+            *([_cell(row_action(row))] if row_action else []),
+            style=row_style,
+            class_name="border-b border-gray-100",
+        )
+
+    # Resolve one throttle period later so the last accepted scroll event
+    # still reports where scrolling stopped
+    read_scroll_top = (
+        "new Promise((resolve) => setTimeout(() => resolve("
+        f"document.getElementById('{table_id}')?.scrollTop ?? 0), {SCROLL_THROTTLE_MS}))"
+    )
+
+    body = rx.el.div(
+        rx.el.div(
+            rx.el.div(
+                rx.foreach(state.rows, render_row),
+                style={"transform": f"translateY({state.window_start * ROW_HEIGHT}px)"},
+            ),
+            style={"height": f"{state.total_rows * ROW_HEIGHT}px"},
+        ),
+        id=table_id,
+        # A remounted table starts at the top; bring the window back with it
+        on_mount=rx.call_script(read_scroll_top, callback=state.scroll_to),
+        on_scroll=rx.call_script(read_scroll_top, callback=state.scroll_to).throttle(
+            SCROLL_THROTTLE_MS
+        ),
+        style={"height": f"{height}px", "overflowY": "auto"},
+    )
+
+    return rx.el.div(
+        header,
+        rx.cond(
+            state.total_rows > 0,
+            body,
+            rx.el.p(empty_text, class_name="p-4 text-gray-500"),
+        ),
+        class_name="w-full border border-gray-200 rounded-lg overflow-hidden text-sm bg-white",
+    )
@@ -0,0 +1,396 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+import reflex as rx
+import sqlalchemy
+import sqlmodel
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+# Used for any database setting rxconfig.py leaves out
+DB_DEFAULTS: Dict[str, Any] = {
+    "db_pool_size": 5,
+    "db_max_overflow": 10,
+    "db_pool_timeout": 30,
+    "db_pool_recycle": 1800,
+    "db_pool_pre_ping": True,
+    "db_sqlite_profile": True,
+}
+
+# Set on every new SQLite connection when db_sqlite_profile is on
+SQLITE_PRAGMAS: Tuple[Tuple[str, Any], ...] = (
+    # Readers and the writer no longer block each other
+    ("journal_mode", "WAL"),
+    # Safe with WAL: a power cut can lose the last commits, never corrupt the file
+    ("synchronous", "NORMAL"),
+    # Wait up to 5 s for another process's write lock instead of "database is locked"
+    ("busy_timeout", 5000),
+    # Read the first 256 MB of the file through the page cache of the OS
+    ("mmap_size", 256 * 1024 * 1024),
+    # 64 MB page cache per connection (negative means KiB)
+    ("cache_size", -64 * 1024),
+)
+
+# Queued writes committed in one transaction at most
+WRITE_BATCH_MAX = 64
+
+# Upper bounds (ms) of the connection hold-time histogram; the last bucket is open
+HOLD_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+# A connection held longer than this is logged with the code that opened the
+# session: usually one left open across a yield, a bcrypt hash or file I/O
+HOLD_WARNING_MS = 250
+
+# Long holds listed in pool_status()
+LONG_HOLDS_KEPT = 20
+
+_engine: Optional[sqlalchemy.engine.Engine] = None
+_async_engine: Optional[AsyncEngine] = None
+_async_sessions: Optional[async_sessionmaker] = None
+_write_queue: Optional["WriteQueue"] = None
+_read_executor: Optional[ThreadPoolExecutor] = None
+
+T = TypeVar("T")
+
+
+def db_settings() -> Dict[str, Any]:
+    """Database settings from rxconfig.py, with DB_DEFAULTS filled in."""
+    config = rx.config.get_config()
+    return {name: getattr(config, name, default) for name, default in DB_DEFAULTS.items()}
+
+
+def _engine_args(url: str) -> Dict[str, Any]:
+    settings = db_settings()
+    # Reflex's defaults (echo, SQLite thread check), then the configured pool
+    args = rx.model.get_engine_args(url)
+    args.update(
+        pool_size=settings["db_pool_size"],
+        max_overflow=settings["db_max_overflow"],
+        pool_timeout=settings["db_pool_timeout"],
+        pool_recycle=settings["db_pool_recycle"],
+        pool_pre_ping=settings["db_pool_pre_ping"],
+    )
+    return args
+
+
+class PoolMonitor:
+    """How long pooled connections stay checked out, and by whom."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.buckets = [0] * (len(HOLD_BUCKETS_MS) + 1)
+        self.checkouts = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.long_holds = deque(maxlen=LONG_HOLDS_KEPT)
+
+    def attach(self, engine: sqlalchemy.engine.Engine):
+        event.listen(engine, "checkout", self._checkout)
+        event.listen(engine, "checkin", self._checkin)
+
+    def _checkout(self, dbapi_connection, record, proxy):
+        record.info["checked_out_at"] = time.perf_counter()
+
+    def _checkin(self, dbapi_connection, record):
+        started = record.info.pop("checked_out_at", None)
+        site = record.info.pop("site", None)
+        if started is None:
+            return
+        held_ms = (time.perf_counter() - started) * 1000
+        bucket = next(
+            (i for i, bound in enumerate(HOLD_BUCKETS_MS) if held_ms <= bound), len(HOLD_BUCKETS_MS)
+        )
+        with self._lock:
+            self.buckets[bucket] += 1
+            self.checkouts += 1
+            self.total_ms += held_ms
+            self.max_ms = max(self.max_ms, held_ms)
+            if held_ms > HOLD_WARNING_MS:
+                self.long_holds.append({"ms": round(held_ms, 1), "site": site or "?"})
+        if held_ms > HOLD_WARNING_MS:
+            print(f"DB connection held {held_ms:.0f} ms by {site or 'unknown caller'}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            labels = [f"<={bound}ms" for bound in HOLD_BUCKETS_MS] + [f">{HOLD_BUCKETS_MS[-1]}ms"]
+            return {
+                "checkouts": self.checkouts,
+                "avg_ms": round(self.total_ms / (self.checkouts or 1), 2),
+                "max_ms": round(self.max_ms, 1),
+                "histogram": dict(zip(labels, self.buckets)),
+                "long_holds": list(self.long_holds),
+            }
+
+
+pool_monitor = PoolMonitor()
+
+
+def _caller() -> str:
+    """file:line of the first frame outside this module and contextlib."""
+    frame = sys._getframe(2)
+    while frame is not None and os.path.basename(frame.f_code.co_filename) in ("db.py", "contextlib.py"):
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+    return f"{os.path.relpath(frame.f_code.co_filename)}:{frame.f_lineno} {frame.f_code.co_name}"
+
+
+@event.listens_for(sqlmodel.Session, "after_begin")
+def _tag_connection(session, transaction, connection):
+    # The session's origin travels with its connection until checkin
+    site = session.info.get("site")
+    if site:
+        connection.info["site"] = site
+
+
+def _apply_sqlite_pragmas(dbapi_connection, record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS:
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def use_sqlite_profile(engine: sqlalchemy.engine.Engine):
+    """Apply SQLITE_PRAGMAS to each connection the engine opens."""
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+
+
+def _is_sqlite(engine: sqlalchemy.engine.Engine) -> bool:
+    return engine.dialect.name == "sqlite"
+
+
+def _configure(engine: sqlalchemy.engine.Engine):
+    pool_monitor.attach(engine)
+    if _is_sqlite(engine) and db_settings()["db_sqlite_profile"]:
+        use_sqlite_profile(engine)
+
+
+def get_engine() -> sqlalchemy.engine.Engine:
+    """Blocking engine, for scripts and code already running off the event loop."""
+    global _engine
+    if _engine is None:
+        url = rx.config.get_config().db_url
+        _engine = sqlmodel.create_engine(url, **_engine_args(url))
+        _configure(_engine)
+    return _engine
+
+
+def get_async_engine() -> AsyncEngine:
+    """Engine behind asession(), sized by the pool settings."""
+    global _async_engine
+    if _async_engine is None:
+        url = rx.config.get_config().async_db_url
+        if url is None:
+            raise ValueError("No async database url configured")
+        _async_engine = create_async_engine(url, **_engine_args(url))
+        _configure(_async_engine.sync_engine)
+    return _async_engine
+
+
+def session() -> sqlmodel.Session:
+    """Blocking session; never use it inside an async handler."""
+    session = sqlmodel.Session(get_engine())
+    session.info["site"] = _caller()
+    return session
+
+
+def asession() -> AsyncSession:
+    """Async session for handlers, so queries never block the event loop.
+
+    Same behaviour as rx.asession() (no expiry on commit, no autoflush),
+    but on the pool configured in rxconfig.py.
+    """
+    global _async_sessions
+    if _async_sessions is None:
+        _async_sessions = async_sessionmaker(
+            bind=get_async_engine(),
+            class_=AsyncSession,
+            expire_on_commit=False,
+            autoflush=False,
+        )
+    session = _async_sessions()
+    session.sync_session.info["site"] = _caller()
+    return session
+
+
+def _run_read(work: Callable[[sqlmodel.Session], T], site: str) -> T:
+    with sqlmodel.Session(get_engine()) as session:
+        session.info["site"] = site
+        return work(session)
+
+
+async def read(work: Callable[[sqlmodel.Session], T]) -> T:
+    """Run work(session) on a blocking session in a worker thread.
+
+    For hot read paths: the whole read is one thread hop, where an async
+    session pays one per query and fetch. On a single core that hop is
+    what made asession() pages slower than the old blocking ones. The
+    threads match the pool, so a read never waits for a connection.
+    """
+    global _read_executor
+    if _read_executor is None:
+        settings = db_settings()
+        _read_executor = ThreadPoolExecutor(
+            max_workers=settings["db_pool_size"] + settings["db_max_overflow"],
+            thread_name_prefix="db-read",
+        )
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_read_executor, _run_read, work, _caller())
+
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncIterator[AsyncSession]:
+    """Session committed when the block ends, rolled back if it raises.
+
+    The connection (on SQLite, the write lock too) is back in the pool as
+    soon as the block is left, so handlers do their database work inside
+    and yield toasts and redirects after it.
+    """
+    session = asession()
+    try:
+        yield session
+        await session.commit()
+    except BaseException:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
+
+class WriteQueue:
+    """Runs this process's small writes one transaction at a time, in batches.
+
+    SQLite has a single writer. Rather than every handler racing for the
+    lock, writes wait here and one task runs up to WRITE_BATCH_MAX of them
+    per commit. Each runs in its own savepoint with a clean identity map,
+    so a failing write is rolled back alone and the others still commit.
+    Reads never go through the queue and stay concurrent.
+    """
+
+    def __init__(self, sessions: Callable[[], AsyncSession], batch_max: int = WRITE_BATCH_MAX):
+        self._sessions = sessions
+        self._batch_max = batch_max
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.writes = 0
+        self.commits = 0
+
+    async def run(self, work: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # The writer task belongs to the loop that first needs it
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._drain())
+        future = loop.create_future()
+        self._queue.put_nowait((work, future))
+        return await future
+
+    async def _drain(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self._batch_max and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            batch = [(work, future) for work, future in batch if not future.done()]
+            if batch:
+                await self._commit(batch)
+
+    async def _commit(self, batch: List[Tuple[Callable, asyncio.Future]]):
+        if len(batch) > 1:
+            outcomes = []
+            try:
+                async with self._sessions() as session:
+                    for work, _ in batch:
+                        # Each write gets a savepoint and an empty identity map,
+                        # so rows one loaded or changed never leak into the next
+                        try:
+                            async with session.begin_nested():
+                                result = await work(session)
+                                await session.flush()
+                            outcomes.append((result, None))
+                        except Exception as e:
+                            outcomes.append((None, e))
+                        finally:
+                            session.expunge_all()
+                    await session.commit()
+            except Exception:
+                # The shared commit failed; run each alone so only the culprit fails
+                pass
+            else:
+                self.commits += 1
+                for (_, future), (result, error) in zip(batch, outcomes):
+                    if error is None:
+                        self.writes += 1
+                    if future.done():
+                        continue
+                    if error is None:
+                        future.set_result(result)
+                    else:
+                        future.set_exception(error)
+                return
+
+        for work, future in batch:
+            try:
+                async with self._sessions() as session:
+                    result = await work(session)
+                    await session.commit()
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                self.writes += 1
+                self.commits += 1
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "writes": self.writes,
+            "commits": self.commits,
+            "pending": self._queue.qsize() if self._queue else 0,
+        }
+
+
+def _writer_session() -> AsyncSession:
+    session = asession()
+    session.sync_session.info["site"] = "write queue"
+    return session
+
+
+async def write(work: Callable[[AsyncSession], Awaitable[T]]) -> T:
+    """Run work(session) as a committed write and return its result.
+
+    On SQLite the work goes through the write queue and may share its
+    transaction with others, each in a savepoint of its own. If the shared
+    commit fails the work is run again alone, so it must only touch the
+    database (no toasts), or first undo what an earlier run did on disk.
+    """
+    global _write_queue
+    if not _is_sqlite(get_async_engine().sync_engine):
+        async with unit_of_work() as session:
+            return await work(session)
+    if _write_queue is None:
+        _write_queue = WriteQueue(_writer_session)
+    return await _write_queue.run(work)
+
+
+def pool_status() -> Dict[str, Any]:
+    """Async pool usage and connection hold times, for monitoring."""
+    pool = get_async_engine().pool
+    status = {"settings": db_settings(), "pool": pool.status(), "holds": pool_monitor.stats()}
+    if _write_queue is not None:
+        status["write_queue"] = _write_queue.stats()
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            status[name] = getattr(pool, name)()
+    return status
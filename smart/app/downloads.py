@@ -0,0 +1,148 @@
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+
+import reflex as rx
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+from app import db, queries
+from app.models import SemesterResult
+from app.storage import run_io
+
+
+# Browsers keep the file but ask again every time; unchanged files cost a 304
+CACHE_CONTROL = "private, no-cache"
+
+# Signed download links stay valid this long (seconds); the browser opens
+# them right away
+DOWNLOAD_TOKEN_SECONDS = 60
+
+# Key for signed download links, created on first use and shared by workers
+DOWNLOAD_SECRET_PATH = ".download_secret"
+
+_download_secret: Optional[bytes] = None
+
+
+def backend_url(path: str) -> str:
+    """Absolute URL of a backend route, as seen from the browser."""
+    return f"{rx.config.get_config().api_url.rstrip('/')}{path}"
+
+
+def _signing_key() -> bytes:
+    global _download_secret
+    if _download_secret is None:
+        if not os.path.exists(DOWNLOAD_SECRET_PATH):
+            # Written aside and linked into place, so a worker racing us
+            # never reads a half-written key
+            staged = f"{DOWNLOAD_SECRET_PATH}.{secrets.token_hex(8)}"
+            fd = os.open(staged, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(secrets.token_bytes(32))
+            try:
+                os.link(staged, DOWNLOAD_SECRET_PATH)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(staged)
+        with open(DOWNLOAD_SECRET_PATH, "rb") as f:
+            _download_secret = f.read()
+    return _download_secret
+
+
+def _signature(purpose: str, user_id: int, expires: int) -> str:
+    message = f"{purpose}:{user_id}:{expires}".encode()
+    return hmac.new(_signing_key(), message, hashlib.sha256).hexdigest()
+
+
+def sign_download(purpose: str, user_id: int) -> str:
+    """Short-lived token granting a user one kind of download."""
+    expires = int(time.time()) + DOWNLOAD_TOKEN_SECONDS
+    return f"{expires}.{user_id}.{_signature(purpose, user_id, expires)}"
+
+
+def check_download(token: str, purpose: str) -> bool:
+    """Whether a token from sign_download is genuine, unexpired and for this purpose."""
+    try:
+        expires, user_id, signature = token.split(".")
+        expires, user_id = int(expires), int(user_id)
+    except ValueError:
+        return False
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(signature, _signature(purpose, user_id, expires))
+
+
+def _etag(stat_result: os.stat_result, sha256: Optional[str]) -> str:
+    """Strong validator: the content hash when known, else mtime and size."""
+    if sha256:
+        return f'"{sha256}"'
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def _not_modified(request: Request, etag: str, stat_result: os.stat_result) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        # Weak comparison is what RFC 9110 asks for on If-None-Match
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(stat_result.st_mtime) <= since
+    return False
+
+
+async def send_file(
+    request: Request, file_path: str, filename: str, sha256: Optional[str] = None
+) -> Response:
+    """Serve a stored file with validators, conditional GET and Range support.
+
+    Range/206 and If-Range are handled by Starlette's FileResponse, which
+    also hands the file to the server for zero-copy sending when the server
+    supports the ASGI pathsend extension.
+    """
+    try:
+        stat_result = await run_io(os.stat, file_path)
+    except FileNotFoundError:
+        return Response("File not found", status_code=404)
+
+    etag = _etag(stat_result, sha256)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Cache-Control": CACHE_CONTROL,
+    }
+    if _not_modified(request, etag, stat_result):
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(
+        file_path,
+        headers=headers,
+        filename=filename,
+        stat_result=stat_result,
+    )
+
+
+async def find_uploaded_file(file_id: int) -> Optional[Tuple[str, str, Optional[str]]]:
+    """Path, original name and content hash of an uploaded file."""
+    async with db.asession() as session:
+        row = (await session.exec(queries.file_download(file_id))).first()
+    return tuple(row) if row else None
+
+
+async def find_semester_result(result_id: int) -> Optional[Tuple[str, str, Optional[str]]]:
+    """Path and original name of a semester results file."""
+    async with db.asession() as session:
+        result = await session.get(SemesterResult, result_id)
+    return (result.file_path, result.filename, None) if result else None
+
@@ -0,0 +1,179 @@
+import csv
+import io
+import json
+import os
+import zipfile
+from datetime import datetime
+from typing import Any, Iterator, List, NamedTuple, Optional
+
+from app import db, queries
+from app.models import AllowedStudent, AllowedTeacher, SemesterResult, UploadedFile, User
+from app.storage import CHUNK_SIZE
+
+
+# Formats that are already compressed; deflating them again only burns CPU
+STORED_EXTENSIONS = {
+    ".zip", ".rar", ".7z", ".gz", ".bz2", ".xz",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp",
+    ".mp3", ".mp4", ".m4a", ".mkv", ".avi", ".mov",
+    ".pdf", ".docx", ".xlsx", ".pptx",
+}
+
+
+# Tables that can be exported row by row, with the columns that leave the
+# server (never password hashes or on-disk paths)
+EXPORT_TABLES = {
+    "users": (
+        User.id, User.username, User.email, User.role,
+        User.full_name, User.university_id, User.semester,
+    ),
+    "allowed-students": (
+        AllowedStudent.id, AllowedStudent.student_number,
+        AllowedStudent.is_registered, AllowedStudent.added_date,
+    ),
+    "allowed-teachers": (
+        AllowedTeacher.id, AllowedTeacher.university_email,
+        AllowedTeacher.is_registered, AllowedTeacher.added_date,
+    ),
+    "files": (
+        UploadedFile.id, UploadedFile.filename, UploadedFile.file_description,
+        UploadedFile.semester, UploadedFile.file_type, UploadedFile.file_size,
+        UploadedFile.uploaded_by_id, UploadedFile.upload_date,
+    ),
+    "results": (
+        SemesterResult.id, SemesterResult.semester, SemesterResult.filename,
+        SemesterResult.description, SemesterResult.file_size, SemesterResult.upload_date,
+    ),
+}
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+}
+
+# Rows fetched from the cursor and encoded per chunk sent
+EXPORT_BATCH_SIZE = 1000
+
+
+class ExportEntry(NamedTuple):
+    file_path: str
+    arcname: str
+    date: datetime
+
+
+class _ZipSink:
+    """Write-only file object that hands out what zipfile wrote so far.
+
+    It has no seek/tell, so zipfile switches to data descriptors and never
+    goes back to patch a header; nothing but the current chunk is held.
+    """
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+async def find_export_entries(
+    semester: Optional[str] = None,
+    teacher_id: Optional[int] = None,
+    file_type: Optional[str] = None,
+) -> List[ExportEntry]:
+    """Files to put in an export, laid out as semester/teacher/type/name."""
+    async with db.asession() as session:
+        rows = (await session.exec(queries.export_entries(semester, teacher_id, file_type))).all()
+
+    entries = []
+    used = set()
+    for file_path, filename, file_semester, type_, upload_date, teacher in rows:
+        folder = "/".join(
+            part.replace("/", "_") for part in (file_semester, teacher or "-", type_)
+        )
+        stem, ext = os.path.splitext(filename.replace("/", "_"))
+        arcname = f"{folder}/{stem}{ext}"
+        n = 1
+        while arcname in used:
+            n += 1
+            arcname = f"{folder}/{stem} ({n}){ext}"
+        used.add(arcname)
+        entries.append(ExportEntry(file_path, arcname, upload_date))
+    return entries
+
+
+def iter_zip(entries: List[ExportEntry], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Build a ZIP archive on the fly and yield it piece by piece.
+
+    This is a plain generator doing blocking reads; Starlette runs it on its
+    thread pool when it is handed to a StreamingResponse.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as archive:
+        for entry in entries:
+            if not os.path.exists(entry.file_path):
+                print(f"Export: missing file {entry.file_path}")
+                continue
+
+            info = zipfile.ZipInfo(entry.arcname, entry.date.timetuple()[:6])
+            if os.path.splitext(entry.arcname)[1].lower() in STORED_EXTENSIONS:
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+
+            with open(entry.file_path, "rb") as src, archive.open(info, "w", force_zip64=True) as dst:
+                while chunk := src.read(chunk_size):
+                    dst.write(chunk)
+                    if data := sink.drain():
+                        yield data
+            if data := sink.drain():
+                yield data
+    # Central directory
+    yield sink.drain()
+
+
+def _cell(value: Any) -> Any:
+    return value.isoformat(sep=" ", timespec="seconds") if isinstance(value, datetime) else value
+
+
+def iter_table_export(table: str, fmt: str, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """Stream a table as CSV or JSON lines, one batch of rows at a time.
+
+    Rows come off a streaming cursor in batch_size partitions, so memory
+    stays flat whatever the table size. Like iter_zip, this blocks and is
+    run on Starlette's thread pool.
+    """
+    columns = EXPORT_TABLES[table]
+    names = [column.key for column in columns]
+
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        # BOM so Excel reads the Arabic text as UTF-8
+        buffer.write("\ufeff")
+        writer.writerow(names)
+        yield buffer.getvalue().encode("utf-8")
+
+    with db.session() as session:
+        result = session.connection().execution_options(
+            stream_results=True, yield_per=batch_size
+        ).execute(queries.table_export(columns))
+        for rows in result.partitions():
+            if fmt == "csv":
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows([_cell(value) for value in row] for row in rows)
+                yield buffer.getvalue().encode("utf-8")
+            else:
+                yield "".join(
+                    json.dumps(dict(zip(names, map(_cell, row))), ensure_ascii=False) + "\n"
+                    for row in rows
+                ).encode("utf-8")
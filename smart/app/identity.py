@@ -0,0 +1,123 @@
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import reflex as rx
+
+from app import db, queries
+from app.models import User
+from app.pubsub import LISTEN_TIMEOUT_SECONDS, get_bus
+
+
+# Sessions remembered at most; the least recently active is dropped first
+IDENTITY_CACHE_MAX_ENTRIES = 10_000
+
+# Channel on which every worker hears about changed or deleted users
+IDENTITY_CHANNEL = "identity"
+
+
+class Identity(NamedTuple):
+    """What handlers need to know about the logged-in user."""
+
+    id: int
+    username: str
+    role: str
+    semester: str
+    full_name: str
+    university_id: str
+
+    @property
+    def display_name(self) -> str:
+        return self.full_name or self.username
+
+    @classmethod
+    def from_user(cls, user: User) -> "Identity":
+        return cls(
+            id=user.id,
+            username=user.username,
+            role=user.role,
+            semester=user.semester or "",
+            full_name=user.full_name or "",
+            university_id=user.university_id or "",
+        )
+
+
+class IdentityCache:
+    """Identity of each logged-in session, keyed by client token.
+
+    Login stores the record, so handlers skip the user lookup. A session
+    missing from the cache (another worker, a restart, an eviction) is
+    looked up once through AuthState and stored again.
+    """
+
+    def __init__(self, max_entries: int = IDENTITY_CACHE_MAX_ENTRIES):
+        self._max_entries = max_entries
+        self._identities: "OrderedDict[str, Identity]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Identity]:
+        with self._lock:
+            identity = self._identities.get(token)
+            if identity is not None:
+                self._identities.move_to_end(token)
+            return identity
+
+    def remember(self, token: str, identity: Identity):
+        with self._lock:
+            self._identities[token] = identity
+            self._identities.move_to_end(token)
+            while len(self._identities) > self._max_entries:
+                self._identities.popitem(last=False)
+
+    def forget(self, token: str):
+        with self._lock:
+            self._identities.pop(token, None)
+
+    def drop_user(self, user_id: int):
+        """Forget every session of a user on this worker."""
+        with self._lock:
+            for token in [t for t, i in self._identities.items() if i.id == user_id]:
+                del self._identities[token]
+
+
+identity_cache = IdentityCache()
+
+
+async def current_identity(state: rx.State) -> Optional[Identity]:
+    """Identity of the user behind an event, or None when logged out."""
+    token = state.router.session.client_token
+    identity = identity_cache.get(token)
+    if identity is not None:
+        return identity
+
+    from app.states.auth_state import AuthState
+
+    auth_state = await state.get_state(AuthState)
+    if not auth_state.is_authenticated or not auth_state.current_username:
+        return None
+    async with db.asession() as session:
+        user = (
+            await session.exec(queries.user_by_username(auth_state.current_username))
+        ).first()
+    if user is None:
+        return None
+    identity = Identity.from_user(user)
+    identity_cache.remember(token, identity)
+    return identity
+
+
+async def invalidate_user(user_id: int):
+    """Drop a deleted or changed user's identity on every worker."""
+    identity_cache.drop_user(user_id)
+    try:
+        await get_bus().publish(IDENTITY_CHANNEL, {"user_id": user_id})
+    except Exception as e:
+        print(f"Identity invalidation error: {e}")
+
+
+async def identity_invalidator():
+    """Lifespan task applying identity invalidations from other workers."""
+    async with get_bus().subscribe(IDENTITY_CHANNEL) as subscription:
+        while True:
+            for message in await subscription.next_batch(timeout=LISTEN_TIMEOUT_SECONDS):
+                identity_cache.drop_user(message["user_id"])
@@ -0,0 +1,202 @@
+import json
+from typing import Any, Dict, List
+
+from sqlalchemy import insert
+from sqlmodel import select
+
+from app import db, queries
+from app.blobstore import delete_uploaded_file
+from app.identity import invalidate_user
+from app.jobs import JobContext, job_handler, remove_path
+from app.listing_cache import listing_cache
+from app.models import Job, SemesterResult, StudentResult, UploadedFile, User
+from app.pubsub import publish_to_semester
+from app.results import iter_student_results, next_batch
+from app.search import FTS_TABLE, index_file
+from app.storage import run_io
+
+
+# Rows deleted per transaction, so other writers get the database in between
+DELETE_BATCH_SIZE = 100
+
+# Files indexed per transaction when rebuilding the search index
+REINDEX_BATCH_SIZE = 500
+
+
+async def _delete_file_batch(session, files: List[UploadedFile]):
+    """Delete file rows; their content is removed by a follow-up job.
+
+    The remove_files job is written in the same transaction as the
+    deletes, so the paths cannot be lost between commit and enqueue.
+    """
+    paths = []
+    for file in files:
+        file_path = await delete_uploaded_file(session, file)
+        if file_path:
+            paths.append(file_path)
+    if paths:
+        session.add(Job(kind="remove_files", payload=json.dumps({"paths": paths})))
+    await session.commit()
+    listing_cache.invalidate(*{file.semester for file in files})
+
+
+@job_handler("delete_user")
+async def delete_user(job: JobContext, payload: Dict[str, Any]):
+    """Delete a user with their uploads and whitelist registration."""
+    user_id = payload["user_id"]
+    async with db.asession() as session:
+        total = (await session.exec(queries.files_of_user_count(user_id))).one()
+    await job.progress(0, total + 1)
+
+    # Uploads first, a batch per transaction; a retry resumes where it stopped
+    done = 0
+    while True:
+        async with db.asession() as session:
+            files = (
+                await session.exec(queries.files_of_user(user_id, DELETE_BATCH_SIZE))
+            ).all()
+            if not files:
+                break
+            await _delete_file_batch(session, files)
+        done += len(files)
+        await job.progress(done)
+
+    async with db.asession() as session:
+        user = await session.get(User, user_id)
+        if user is None:
+            return
+
+        # Whitelist entries stay, but can be registered again
+        if user.role == "student" and user.university_id:
+            allowed = (await session.exec(queries.allowed_student(user.university_id))).first()
+            if allowed:
+                allowed.is_registered = False
+        if user.role == "teacher":
+            allowed = (await session.exec(queries.allowed_teacher(user.email))).first()
+            if allowed:
+                allowed.is_registered = False
+
+        await session.delete(user)
+        await session.commit()
+
+    # Sessions of the deleted user stop resolving to an identity
+    await invalidate_user(user_id)
+    await job.progress(total + 1)
+
+
+@job_handler("delete_files")
+async def delete_files(job: JobContext, payload: Dict[str, Any]):
+    """Delete uploaded files by id."""
+    file_ids = payload["file_ids"]
+    await job.progress(0, len(file_ids))
+    for i in range(0, len(file_ids), DELETE_BATCH_SIZE):
+        async with db.asession() as session:
+            files = (
+                await session.exec(
+                    select(UploadedFile).where(
+                        UploadedFile.id.in_(file_ids[i:i + DELETE_BATCH_SIZE])
+                    )
+                )
+            ).all()
+            if files:
+                await _delete_file_batch(session, files)
+        await job.progress(min(i + DELETE_BATCH_SIZE, len(file_ids)))
+
+
+@job_handler("remove_files")
+async def remove_files(job: JobContext, payload: Dict[str, Any]):
+    """Remove files from disk; a failure retries the whole list."""
+    paths = payload["paths"]
+    await job.progress(0, len(paths))
+    for i, file_path in enumerate(paths, 1):
+        await run_io(remove_path, file_path)
+        await job.progress(i)
+
+
+@job_handler("reindex_search")
+async def reindex_search(job: JobContext, payload: Dict[str, Any]):
+    """Rebuild the file search index from the database (SQLite only).
+
+    Files are indexed a batch per transaction, each followed by a progress
+    report, so a large rebuild keeps its lease and search keeps working.
+    """
+
+    def index_batch(session, after_id: int) -> List[int]:
+        connection = session.connection()
+        rows = connection.execute(queries.files_to_index(after_id, REINDEX_BATCH_SIZE)).all()
+        for row in rows:
+            index_file(connection, *row)
+        return [row[0] for row in rows]
+
+    def drop_deleted(session):
+        session.connection().exec_driver_sql(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid NOT IN (SELECT id FROM uploadedfile)"
+        )
+
+    if db.get_async_engine().dialect.name != "sqlite":
+        return
+
+    async with db.asession() as session:
+        total = (await session.exec(queries.files_count())).one()
+    await job.progress(0, total)
+
+    last_id, done = 0, 0
+    while True:
+        async with db.asession() as session:
+            indexed = await session.run_sync(index_batch, last_id)
+            await session.commit()
+        if not indexed:
+            break
+        last_id = indexed[-1]
+        done += len(indexed)
+        # Files uploaded meanwhile are indexed too
+        await job.progress(done, max(total, done))
+
+    # Entries of files deleted before or during the rebuild
+    async with db.asession() as session:
+        await session.run_sync(drop_deleted)
+        await session.commit()
+    await job.progress(done, done)
+
+
+@job_handler("ingest_results")
+async def ingest_results(job: JobContext, payload: Dict[str, Any]):
+    """Split a semester results file into one StudentResult row per student."""
+    async with db.asession() as session:
+        result = await session.get(SemesterResult, payload["result_id"])
+        if result is None:
+            return
+        # A retry starts over instead of adding the same rows twice
+        await session.execute(queries.delete_student_results(result.id))
+        await session.commit()
+
+    rows = iter_student_results(result.file_path, result.filename)
+    seen = set()
+    try:
+        while True:
+            batch = await run_io(next_batch, rows)
+            if not batch:
+                break
+            values = []
+            for number, grades in batch:
+                # A student listed twice keeps the first row
+                if number in seen:
+                    continue
+                seen.add(number)
+                values.append({
+                    "result_id": result.id,
+                    "semester": result.semester,
+                    "student_number": number,
+                    "grades": json.dumps(grades, ensure_ascii=False),
+                })
+            if values:
+                async with db.asession() as session:
+                    await session.execute(insert(StudentResult), values)
+                    await session.commit()
+            await job.progress(len(seen))
+    finally:
+        rows.close()
+
+    await job.progress(len(seen), len(seen))
+    # Students of the semester reload their own row; no grades on the bus
+    await publish_to_semester(result.semester, "results", [{"id": result.id}])
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import os
+import traceback
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import update
+
+from app import db, queries
+from app.models import Job
+
+
+# Jobs run at the same time in one process
+JOB_WORKERS = 2
+
+# Attempts before a job is marked failed; retries wait longer each time
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE_SECONDS = 5
+
+# An idle worker looks for new jobs this often (enqueue() wakes it sooner)
+JOB_POLL_SECONDS = 2
+
+# A running job whose worker stopped reporting for this long is taken over;
+# covers a process that died mid-job
+JOB_LEASE = timedelta(minutes=5)
+
+# Finished jobs are kept this long for the dashboard, then deleted
+JOB_RETENTION = timedelta(days=7)
+
+JobHandler = Callable[["JobContext", Dict[str, Any]], Awaitable[None]]
+
+_handlers: Dict[str, JobHandler] = {}
+_wakeup: Optional[asyncio.Event] = None
+
+
+def job_handler(kind: str):
+    """Register the coroutine that runs jobs of a kind."""
+    def register(func: JobHandler) -> JobHandler:
+        _handlers[kind] = func
+        return func
+    return register
+
+
+class JobLeaseLost(Exception):
+    """Another worker took the job over after this one stopped reporting."""
+
+
+def _this_attempt(job_id: int, attempt: int):
+    # A worker whose lease expired must not write over the attempt that replaced it
+    return (Job.id == job_id, Job.attempts == attempt, Job.status == "running")
+
+
+class JobContext:
+    """Handle given to a running job to report progress."""
+
+    def __init__(self, job_id: int, attempt: int):
+        self.job_id = job_id
+        self.attempt = attempt
+
+    async def progress(self, done: int, total: Optional[int] = None):
+        """Record progress; also tells other workers the job is alive.
+
+        Raises JobLeaseLost when the job was taken over meanwhile, which
+        stops the handler.
+        """
+        values = {"progress": done, "updated_date": datetime.now()}
+        if total is not None:
+            values["total"] = total
+
+        async def save(session) -> int:
+            saved = await session.execute(
+                update(Job).where(*_this_attempt(self.job_id, self.attempt)).values(**values)
+            )
+            return saved.rowcount
+
+        if not await db.write(save):
+            raise JobLeaseLost(f"Job {self.job_id} attempt {self.attempt} was taken over")
+
+
+async def enqueue(kind: str, payload: Dict[str, Any], created_by_id: Optional[int] = None) -> int:
+    """Queue a job and return its id; it survives restarts until it has run."""
+
+    async def add(session) -> int:
+        job = Job(kind=kind, payload=json.dumps(payload), created_by_id=created_by_id)
+        session.add(job)
+        await session.flush()
+        return job.id
+
+    job_id = await db.write(add)
+    if _wakeup is not None:
+        _wakeup.set()
+    return job_id
+
+
+async def _claim() -> Optional[Job]:
+    """Take the oldest runnable job, or None.
+
+    The status check in the UPDATE makes the claim atomic, so workers in
+    other processes never run the same job twice.
+    """
+    now = datetime.now()
+    async with db.asession() as session:
+        candidates = [
+            (await session.exec(query)).first()
+            for query in (queries.next_queued_job(now), queries.next_expired_job(now - JOB_LEASE))
+        ]
+        candidates = [job for job in candidates if job is not None]
+        if not candidates:
+            return None
+        job = min(candidates, key=lambda job: job.id)
+        claimed = await session.execute(
+            update(Job)
+            .where(Job.id == job.id, Job.status == job.status, Job.updated_date == job.updated_date)
+            .values(status="running", attempts=Job.attempts + 1, updated_date=now)
+        )
+        await session.commit()
+        if claimed.rowcount != 1:
+            return None
+        await session.refresh(job)
+        return job
+
+
+async def _finish(job: Job, **values):
+    values["updated_date"] = datetime.now()
+
+    async def save(session) -> int:
+        saved = await session.execute(
+            update(Job).where(*_this_attempt(job.id, job.attempts)).values(**values)
+        )
+        return saved.rowcount
+
+    if not await db.write(save):
+        print(f"Job {job.id} attempt {job.attempts} was taken over, result dropped")
+
+
+async def _run(job: Job):
+    handler = _handlers.get(job.kind)
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job kind: {job.kind}")
+        await handler(JobContext(job.id, job.attempts), json.loads(job.payload or "{}"))
+    except JobLeaseLost as e:
+        # The attempt that took over reports the outcome
+        print(f"Job {job.id} ({job.kind}) stopped: {e}")
+    except Exception as e:
+        print(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed: {e}")
+        traceback.print_exc()
+        if job.attempts < JOB_MAX_ATTEMPTS and handler is not None:
+            delay = JOB_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)
+            await _finish(
+                job,
+                status="queued",
+                error=str(e),
+                run_after=datetime.now() + timedelta(seconds=delay),
+            )
+        else:
+            await _finish(job, status="failed", error=str(e))
+    else:
+        await _finish(job, status="done", error=None)
+
+
+async def _worker():
+    while True:
+        try:
+            job = await _claim()
+        except Exception as e:
+            print(f"Job queue error: {e}")
+            job = None
+        if job is not None:
+            await _run(job)
+            continue
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), JOB_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _purge_finished():
+    cutoff = datetime.now() - JOB_RETENTION
+    async with db.asession() as session:
+        for job in (await session.exec(queries.finished_jobs(cutoff))).all():
+            await session.delete(job)
+        await session.commit()
+
+
+async def job_runner():
+    """Lifespan task running the job workers of this process."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+
+    # Handlers register themselves on import
+    import app.job_handlers  # noqa: F401
+
+    try:
+        await _purge_finished()
+    except Exception as e:
+        print(f"Job purge error: {e}")
+    await asyncio.gather(*(_worker() for _ in range(JOB_WORKERS)))
+
+
+def remove_path(file_path: str):
+    """Delete a file, raising on failure so the job is retried."""
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
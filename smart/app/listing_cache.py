@@ -0,0 +1,79 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+# Pages kept at most; the least recently used page is dropped first
+CACHE_MAX_ENTRIES = 256
+
+
+class ListingCache:
+    """Process-wide cache of file-listing pages, keyed by semester and version.
+
+    Each semester has a version counter that invalidate() bumps. Readers
+    take the version before querying and store the page under it, so a page
+    built while an upload commits is filed under the old version and never
+    served. Pages are shared by reference and must be treated as read-only.
+    The all-semesters listing ("") is invalidated with every semester.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self._max_entries = max_entries
+        self._pages: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def version(self, semester: str) -> int:
+        """Current version of a semester's listing."""
+        return self._versions.get(semester, 0)
+
+    def get(self, semester: str, version: int, cursor: Optional[Hashable] = None):
+        """Cached page for semester at version, or None."""
+        key = (semester, version, cursor)
+        with self._lock:
+            page = self._pages.get(key)
+            if page is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def put(self, semester: str, version: int, cursor: Optional[Hashable], page):
+        """Store a page built while the semester was at version."""
+        with self._lock:
+            if version != self.version(semester):
+                return
+            self._pages[(semester, version, cursor)] = page
+            self._pages.move_to_end((semester, version, cursor))
+            while len(self._pages) > self._max_entries:
+                self._pages.popitem(last=False)
+
+    def invalidate(self, *semesters: str):
+        """Drop the listings of the given semesters (and the global one)."""
+        with self._lock:
+            affected = set(semesters) | {""}
+            for semester in affected:
+                self._versions[semester] = self._versions.get(semester, 0) + 1
+            for key in [key for key in self._pages if key[0] in affected]:
+                del self._pages[key]
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and size, for monitoring."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "entries": len(self._pages),
+                "max_entries": self._max_entries,
+            }
+
+
+listing_cache = ListingCache()
@@ -1,9 +1,12 @@
 import reflex as rx
+from sqlalchemy import Index
 from sqlmodel import Field, Session, select, Relationship
 from typing import Optional, List
-import bcrypt
 from datetime import datetime
 
+from app import db
+from app.passwords import check_password, hash_password
+
 
 class User(rx.Model, table=True):
     """User model for authentication."""
@@ -11,9 +14,9 @@ class User(rx.Model, table=True):
     username: str = Field(unique=True, index=True)
     email: str = Field(unique=True, index=True)
     password_hash: str
-    role: str  # Can be "student", "teacher", or "supervisor"
+    role: str = Field(index=True)  # Can be "student", "teacher", or "supervisor"
     full_name: Optional[str] = None
-    university_id: Optional[str] = None
+    university_id: Optional[str] = Field(default=None, index=True)  # Student login
     semester: Optional[str] = None  # NEW: Add this line for student's semester
     
     # Relationships
@@ -24,30 +27,46 @@ class User(rx.Model, table=True):
     
     @staticmethod
     def hash_password(password: str) -> str:
-        """Hash a password using bcrypt."""
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        """Hash a password using bcrypt (blocking; event handlers use password_pool)."""
+        return hash_password(password)
     
     def verify_password(self, password: str) -> bool:
-        """Verify a password against the hash."""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        """Verify a password against the hash (blocking; event handlers use password_pool)."""
+        return check_password(password, self.password_hash)
 
 
 class UploadedFile(rx.Model, table=True):
     """Model for storing uploaded files."""
     
+    __table_args__ = (
+        # A semester's files, newest first (student dashboard listing)
+        Index("ix_uploadedfile_semester_upload_date", "semester", "upload_date"),
+    )
+    
     filename: str
     stored_filename: str
     file_type: str
     file_description: Optional[str] = None
     semester: str
-    uploaded_by_id: int = Field(foreign_key="user.id")
-    upload_date: datetime = Field(default_factory=datetime.now)
+    uploaded_by_id: int = Field(foreign_key="user.id", index=True)
+    upload_date: datetime = Field(default_factory=datetime.now, index=True)
     file_size: Optional[int] = None
     file_path: str
+    blob_id: Optional[int] = Field(default=None, foreign_key="fileblob.id")  # Shared content, None for legacy copies
     
     uploaded_by: Optional["User"] = Relationship(back_populates="uploaded_files")
 
 
+class FileBlob(rx.Model, table=True):
+    """Content-addressed file shared by every upload with the same bytes."""
+    
+    sha256: str = Field(unique=True, index=True)
+    file_path: str  # Location under assets/uploaded_files/blobs
+    file_size: int
+    ref_count: int = 0  # Number of UploadedFile rows pointing here
+    created_date: datetime = Field(default_factory=datetime.now)
+
+
 class AllowedStudent(rx.Model, table=True):
     """Whitelist of student numbers allowed to register."""
     
@@ -69,7 +88,7 @@ class AllowedTeacher(rx.Model, table=True):
 class SemesterResult(rx.Model, table=True):
     """Semester results files uploaded by supervisor."""
     
-    semester: str  # الفصل الدراسي
+    semester: str = Field(index=True)  # الفصل الدراسي
     filename: str  # Original filename
     stored_filename: str  # Unique filename on server
     file_path: str  # Full path to file
@@ -79,9 +98,61 @@ class SemesterResult(rx.Model, table=True):
     description: Optional[str] = None  # Optional description
 
 
+class StudentResult(rx.Model, table=True):
+    """One student's row of a semester results file, parsed at upload."""
+    
+    __table_args__ = (
+        # Students look up their own rows by semester and number
+        Index("ix_studentresult_semester_student_number", "semester", "student_number"),
+    )
+    
+    result_id: int = Field(foreign_key="semesterresult.id", index=True)
+    semester: str
+    student_number: str
+    grades: str = "[]"  # JSON list of [column, value] pairs, in file order
+
+
+class UploadSession(rx.Model, table=True):
+    """Resumable upload in progress (tus-style), committed into UploadedFile."""
+    
+    upload_id: str = Field(unique=True, index=True)  # Random token used in the upload URL
+    filename: str  # Original filename
+    file_type: str
+    file_description: Optional[str] = None
+    semester: str
+    total_size: int  # Expected size in bytes
+    offset: int = 0  # Bytes received so far
+    client_key: Optional[str] = Field(default=None, index=True)  # Browser-side fingerprint used to resume after reload
+    part_path: str  # Partial file on disk
+    uploaded_by_id: int = Field(foreign_key="user.id")
+    created_date: datetime = Field(default_factory=datetime.now)
+    updated_date: datetime = Field(default_factory=datetime.now, index=True)  # Stale sessions are swept by age
+
+
+class Job(rx.Model, table=True):
+    """Background job run by the worker pool (see app/jobs.py)."""
+    
+    __table_args__ = (
+        # Claiming an expired lease and purging old jobs filter on both
+        Index("ix_job_status_updated_date", "status", "updated_date"),
+    )
+    
+    kind: str = Field(index=True)  # Name of the registered handler
+    payload: str = "{}"  # JSON arguments for the handler
+    status: str = Field(default="queued", index=True)  # queued, running, done, failed
+    progress: int = 0  # Steps done so far
+    total: int = 0  # Steps expected, 0 when unknown
+    attempts: int = 0
+    error: Optional[str] = None  # Last failure, kept while retrying
+    created_by_id: Optional[int] = Field(default=None, foreign_key="user.id")
+    run_after: datetime = Field(default_factory=datetime.now)  # Earliest start, pushed back on retry
+    created_date: datetime = Field(default_factory=datetime.now)
+    updated_date: datetime = Field(default_factory=datetime.now)  # Heartbeat of the running worker
+
+
 def create_default_users():
     """Create default users if they don't exist."""
-    with rx.session() as session:
+    with db.session() as session:
         # Check if admin already exists
         admin = session.exec(
             select(User).where(User.username == "admin")
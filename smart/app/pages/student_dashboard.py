@@ -1,51 +1,103 @@
-from typing import List, Dict
+from typing import List, Optional
 import reflex as rx
+from app import db, queries
 from app.states.auth_state import AuthState
 from app.states.file_state import FileState, FileInfo
-from app.models import SemesterResult
-from sqlmodel import select
+from app.downloads import backend_url
+from app.identity import Identity, current_identity
+from app.results import decode_grades
+from app.pubsub import LISTEN_TIMEOUT_SECONDS, get_bus, is_connected, semester_channel
+
+class ResultGrade(rx.Base):
+    """One column of a student's results row."""
+    name: str
+    value: str
+
+
+class StudentResultInfo(rx.Base):
+    """A student's own row of one semester results file."""
+    id: int
+    semester: str
+    description: str
+    upload_date: str
+    grades: List[ResultGrade]
+
 
 class StudentResultsState(rx.State):
     """State for viewing semester results."""
     
-    semester_results: List[Dict] = []
+    semester_results: List[StudentResultInfo] = []
 
     @rx.event
     async def load_results(self):
-        """Load semester results for the logged-in student's semester."""
-        from app.models import User
-        
-        # Get the logged-in student's semester
-        auth_state = await self.get_state(AuthState)
-        
-        with rx.session() as session:
-            # Get current user from database to access semester
-            current_user = session.exec(
-                select(User).where(User.username == auth_state.current_username)
-            ).first()
-            
-            # If no user or no semester assigned, return empty
-            if not current_user or not current_user.semester:
-                self.semester_results = []
-                return
-            
-            # Query results for student's semester only
-            query = select(SemesterResult).where(
-                SemesterResult.semester == current_user.semester
+        """Load the logged-in student's own results rows."""
+        # Semester and student number come from the identity stored at login
+        current_user = await current_identity(self)
+        self.semester_results = await self._fetch_results(current_user)
+    
+    @staticmethod
+    async def _fetch_results(identity: Optional[Identity]) -> List[StudentResultInfo]:
+        """One indexed lookup by (semester, student number), newest file first."""
+        if not identity or not identity.semester or not identity.university_id:
+            return []
+        async with db.asession() as session:
+            rows = (
+                await session.exec(
+                    queries.student_results(identity.semester, identity.university_id)
+                )
+            ).all()
+        return [
+            StudentResultInfo(
+                id=result.id,
+                semester=result.semester,
+                description=result.description or "",
+                upload_date=result.upload_date.strftime("%Y-%m-%d"),
+                grades=[ResultGrade(name=name, value=value) for name, value in decode_grades(row.grades)],
             )
-            results = session.exec(query).all()
-            
-            self.semester_results = [
-                {
-                    "id": r.id,
-                    "semester": r.semester,
-                    "filename": r.filename,
-                    "description": r.description or "",
-                    "upload_date": r.upload_date.strftime("%Y-%m-%d"),
-                    "file_path": r.file_path,
-                }
-                for r in results
-            ]
+            for row, result in rows
+        ]
+
+
+class StudentLiveState(rx.State):
+    """Receives new files and results of the student's semester as they are published."""
+    
+    _listening: bool = False
+    
+    @rx.event(background=True)
+    async def listen(self):
+        """Apply pushed items until the tab disconnects."""
+        async with self:
+            if self._listening:
+                return
+            identity = await current_identity(self)
+            if not identity or not identity.semester:
+                return
+            semester = identity.semester
+            self._listening = True
+        
+        token = self.router.session.client_token
+        try:
+            async with get_bus().subscribe(semester_channel(semester)) as subscription:
+                while is_connected(token):
+                    batch = await subscription.next_batch(timeout=LISTEN_TIMEOUT_SECONDS)
+                    if not batch:
+                        continue
+                    
+                    files = [item for m in batch if m["kind"] == "files" for item in m["items"]]
+                    # Results carry no grades; each student fetches their own row
+                    results = None
+                    if any(m["kind"] == "results" for m in batch):
+                        results = await StudentResultsState._fetch_results(identity)
+                    async with self:
+                        if files:
+                            file_state = await self.get_state(FileState)
+                            file_state.prepend_files([FileInfo(**f) for f in files])
+                        if results is not None:
+                            results_state = await self.get_state(StudentResultsState)
+                            results_state.semester_results = results
+        finally:
+            async with self:
+                self._listening = False
 
 def student_dashboard() -> rx.Component:
     return rx.el.main(
@@ -77,6 +129,11 @@ def student_dashboard() -> rx.Component:
                     "الملفات المتاحة لفصلك الدراسي",
                     class_name="text-2xl font-bold text-gray-800 mb-4",
                 ),
+                rx.el.input(
+                    placeholder="ابحث عن محاضرة أو ملف...",
+                    on_change=FileState.search_files.debounce(300),
+                    class_name="w-full mb-6 px-4 py-3 border border-gray-300 rounded-lg bg-white focus:outline-none focus:ring-2 focus:ring-blue-500",
+                ),
                 rx.cond(
                     FileState.uploaded_files.length() > 0,
                     rx.el.div(
@@ -94,6 +151,14 @@ def student_dashboard() -> rx.Component:
                         class_name="bg-white rounded-xl p-8 shadow-sm",
                     ),
                 ),
+                rx.cond(
+                    FileState.files_has_more,
+                    rx.el.button(
+                        "عرض المزيد",
+                        on_click=FileState.load_more_files,
+                        class_name="mt-6 mx-auto block bg-white text-blue-600 font-semibold py-2 px-6 rounded-lg shadow-sm hover:bg-blue-50 transition-colors",
+                    ),
+                ),
                 class_name="w-full mb-8",
             ),
             
@@ -105,6 +170,7 @@ def student_dashboard() -> rx.Component:
         on_mount=[
             FileState.load_student_files,  # Changed from load_files("")
             StudentResultsState.load_results,
+            StudentLiveState.listen,
         ],
         class_name="font-['Inter'] bg-sky-100 flex items-start justify-center min-h-screen p-8",
         dir="rtl",
@@ -170,25 +236,31 @@ def _student_file_card(file: FileInfo) -> rx.Component:
                 "تحميل الملف",
                 class_name="w-full bg-blue-600 text-white font-semibold py-3 px-4 rounded-lg hover:bg-blue-700 transition-colors flex items-center justify-center",
             ),
-            href=file.file_path.replace("assets/", "/"),
+            href=f"{backend_url('/api/files')}/{file.id}",
             is_external=True,
-            download=True,
         ),
         
         class_name=f"bg-white border-2 {file_type_colors.get(file.file_type, 'bg-gray-50 border-gray-200')} p-6 rounded-xl shadow-md hover:shadow-lg transition-shadow",
     )
 
 
-def _render_result_card(result: Dict[str, str]) -> rx.Component:
-    """Renders a single semester result card."""
+def _render_grade(grade: ResultGrade) -> rx.Component:
+    return rx.table.row(
+        rx.table.row_header_cell(grade.name),
+        rx.table.cell(grade.value),
+    )
+
+
+def _render_result_card(result: StudentResultInfo) -> rx.Component:
+    """Renders the student's own row of one results file."""
     return rx.card(
         rx.vstack(
             rx.hstack(
                 rx.icon("file-text", size=32, color="green.500"),
                 rx.vstack(
-                    rx.heading(result["semester"], size="4"),
-                    rx.text(result["description"], size="2", color="gray"),
-                    rx.text("تاريخ النشر: " + result["upload_date"], size="1", color="gray"),
+                    rx.heading(result.semester, size="4"),
+                    rx.text(result.description, size="2", color="gray"),
+                    rx.text("تاريخ النشر: " + result.upload_date, size="1", color="gray"),
                     spacing="1",
                     align_items="start",
                 ),
@@ -196,15 +268,10 @@ def _render_result_card(result: Dict[str, str]) -> rx.Component:
                 align="center",
                 width="100%",
             ),
-            rx.link(
-                rx.button(
-                    rx.icon("download", class_name="mr-2"),
-                    "تحميل النتيجة",
-                    color_scheme="green",
-                    width="100%",
-                ),
-                href=result["file_path"].replace("assets/", "/"),
-                is_external=True,
+            rx.table.root(
+                rx.table.body(rx.foreach(result.grades, _render_grade)),
+                size="1",
+                width="100%",
             ),
             spacing="3",
             width="100%",
@@ -229,10 +296,7 @@ def results_section():
             rx.cond(
                 StudentResultsState.semester_results.length() > 0,
                 rx.vstack(
-                    rx.foreach(
-                        StudentResultsState.semester_results.to(List[Dict[str, str]]),
-                        _render_result_card,
-                    ),
+                    rx.foreach(StudentResultsState.semester_results, _render_result_card),
                     spacing="3",
                     width="100%",
                 ),
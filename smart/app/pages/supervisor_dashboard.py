@@ -1,13 +1,37 @@
 import reflex as rx
-from app.states.supervisor_state import SupervisorState
+from app.components.virtual_table import virtual_table
+from app.states.supervisor_state import (
+    SupervisorState,
+    StudentsTableState,
+    TeachersTableState,
+    AllowedStudentsTableState,
+    AllowedTeachersTableState,
+    FilesTableState,
+)
 from app.states.auth_state import AuthState
-from app.states.file_state import FileState
 
 
 def section_title(text: str):
     return rx.heading(text, size="5", margin_bottom="8px")
 
 
+def delete_button(on_click):
+    return rx.button("حذف", color_scheme="red", size="1", on_click=on_click)
+
+
+def export_menu(label: str, table: str):
+    """Download a whole table as CSV or JSON lines."""
+    return rx.menu.root(
+        rx.menu.trigger(
+            rx.button(rx.icon("download", size=16), label, variant="soft", size="2"),
+        ),
+        rx.menu.content(
+            rx.menu.item("CSV", on_select=SupervisorState.export_table(table, "csv")),
+            rx.menu.item("JSON Lines", on_select=SupervisorState.export_table(table, "jsonl")),
+        ),
+    )
+
+
 # ========== STATISTICS DASHBOARD ==========
 def stats_section():
     """Dashboard statistics overview."""
@@ -72,46 +96,54 @@ def stats_section():
     )
 
 
-# ========== USERS TABLE ==========
-def users_table(title: str, items, is_teacher: bool = False):
-    cols = ["الاسم", "الايميل", "ID", "Actions"]
-    header = rx.table.row(*[rx.table.column_header_cell(c) for c in cols])
-
-    def render_row(u):
-        return rx.table.row(
-            rx.table.cell(u.username),
-            rx.table.cell(u.email),
-            rx.table.cell(u.university_id),
-            rx.table.cell(
-                rx.button(
-                    "حذف",
-                    color_scheme="red",
-                    size="1",
-                    on_click=SupervisorState.delete_user(u.id),
-                )
+# ========== BACKGROUND JOBS ==========
+def job_row(job):
+    return rx.hstack(
+        rx.text(job["label"], weight="bold", size="2", width="180px"),
+        rx.match(
+            job["status"],
+            ("queued", rx.badge("في الانتظار", color_scheme="gray")),
+            ("running", rx.badge("جاري التنفيذ", color_scheme="blue")),
+            ("done", rx.badge("تم", color_scheme="green")),
+            rx.badge("فشل", color_scheme="red"),
+        ),
+        rx.progress(value=job["percent"], width="200px"),
+        rx.text(job["progress"], size="1", color="gray"),
+        rx.cond(job["error"] != "", rx.text(job["error"], size="1", color="red")),
+        spacing="3",
+        align="center",
+        wrap="wrap",
+    )
+
+
+def jobs_section():
+    """Progress of deletions and other work done by the job queue."""
+    return rx.cond(
+        SupervisorState.jobs.length() > 0,
+        rx.card(
+            rx.vstack(
+                section_title("المهام في الخلفية"),
+                rx.foreach(SupervisorState.jobs, job_row),
+                spacing="2",
+                width="100%",
             ),
-        )
+            size="2",
+            width="100%",
+            style={"direction": "rtl", "textAlign": "right"}
+        ),
+    )
+
 
+# ========== USERS TABLE ==========
+def users_table(title: str, state, table_id: str):
     return rx.card(
         rx.vstack(
             section_title(title),
-            rx.box(
-                rx.table.root(
-                    rx.table.header(header),
-                    rx.cond(
-                        items.length() > 0,
-                        rx.table.body(rx.foreach(items, render_row)),
-                        rx.table.body(
-                            rx.table.row(
-                                rx.table.cell("لا توجد بيانات", col_span=len(cols))
-                            )
-                        ),
-                    ),
-                    variant="surface",
-                    size="1",
-                ),
-                overflow_x="auto",
-                width="100%",
+            virtual_table(
+                state,
+                [("الاسم", "username"), ("الايميل", "email"), ("ID", "university_id")],
+                table_id,
+                row_action=lambda u: delete_button(SupervisorState.delete_user(u["id"])),
             ),
             spacing="1",
             align="start",
@@ -124,14 +156,46 @@ def users_table(title: str, items, is_teacher: bool = False):
 
 
 # ========== WHITELIST FORMS ==========
+def whitelist_file_upload(upload_id: str, on_upload):
+    """CSV/XLSX file with one entry per cell, added in one batch."""
+    return rx.hstack(
+        rx.upload(
+            rx.el.div(
+                rx.icon("file-spreadsheet", class_name="text-green-600 h-5 w-5"),
+                rx.cond(
+                    rx.selected_files(upload_id).length() > 0,
+                    rx.foreach(rx.selected_files(upload_id), rx.text),
+                    rx.text("أو اختر ملف CSV / XLSX", size="2", color="gray"),
+                ),
+                class_name="flex items-center gap-2 px-3 py-2 border border-dashed border-gray-300 rounded-lg",
+            ),
+            id=upload_id,
+            accept={
+                "text/csv": [".csv", ".txt"],
+                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": [".xlsx"],
+            },
+            max_files=1,
+            class_name="cursor-pointer",
+        ),
+        rx.button(
+            "رفع الملف",
+            on_click=on_upload(rx.upload_files(upload_id=upload_id)),
+            variant="soft",
+            color_scheme="green",
+        ),
+        spacing="3",
+        align="center",
+    )
+
+
 def whitelist_form_students():
     return rx.card(
         rx.vstack(
             section_title("جدول: الطلاب المسموح لهم"),
-            rx.text("ادخل الرقم الجامعي للطالب (6 أرقام)"),
+            rx.text("ادخل الرقم الجامعي للطالب (6 أرقام) أو نطاقاً مثل 210001-210500"),
             rx.hstack(
                 rx.input(
-                    placeholder="مثال: 123456, 234567, 345678",
+                    placeholder="مثال: 123456, 234567, 210001-210500",
                     value=SupervisorState.new_student_numbers,
                     on_change=SupervisorState.set_new_student_numbers,
                     width="100%",
@@ -144,6 +208,7 @@ def whitelist_form_students():
                 spacing="3",
                 width="100%",
             ),
+            whitelist_file_upload("upload_allowed_students", SupervisorState.upload_allowed_students),
             whitelist_table_students(),
             spacing="3",
             align="start",
@@ -156,29 +221,12 @@ def whitelist_form_students():
 
 
 def whitelist_table_students():
-    cols = ["رقم الطالب", "مسجل", "تاريخ الإضافة"]
-    header = rx.table.row(*[rx.table.column_header_cell(c) for c in cols])
-
-    def render_row(s):
-        return rx.table.row(
-            rx.table.cell(s.student_number),
-            rx.table.cell(rx.cond(s.is_registered, "نعم", "لا")),
-            rx.table.cell(s.added_date),
-        )
-
-    return rx.table.root(
-        rx.table.header(header),
-        rx.cond(
-            SupervisorState.allowed_students.length() > 0,
-            rx.table.body(rx.foreach(SupervisorState.allowed_students, render_row)),
-            rx.table.body(
-                rx.table.row(rx.table.cell("لا يوجد طلاب في القائمة", col_span=len(cols)))
-            ),
-        ),
-        variant="surface",
-        size="3",
-        width="100%",
-        style={"direction": "rtl", "textAlign": "right"}
+    return virtual_table(
+        AllowedStudentsTableState,
+        [("رقم الطالب", "student_number"), ("مسجل", "is_registered"), ("تاريخ الإضافة", "added_date")],
+        "allowed_students_table",
+        height=320,
+        empty_text="لا يوجد طلاب في القائمة",
     )
 
 
@@ -202,6 +250,7 @@ def whitelist_form_teachers():
                 spacing="3",
                 width="100%",
             ),
+            whitelist_file_upload("upload_allowed_teachers", SupervisorState.upload_allowed_teachers),
             whitelist_table_teachers(),
             spacing="3",
             align="start",
@@ -214,29 +263,12 @@ def whitelist_form_teachers():
 
 
 def whitelist_table_teachers():
-    cols = ["الإيميل", "مسجل", "تاريخ الإضافة"]
-    header = rx.table.row(*[rx.table.column_header_cell(c) for c in cols])
-
-    def render_row(t):
-        return rx.table.row(
-            rx.table.cell(t.university_email),
-            rx.table.cell(rx.cond(t.is_registered, "نعم", "لا")),
-            rx.table.cell(t.added_date),
-        )
-
-    return rx.table.root(
-        rx.table.header(header),
-        rx.cond(
-            SupervisorState.allowed_teachers.length() > 0,
-            rx.table.body(rx.foreach(SupervisorState.allowed_teachers, render_row)),
-            rx.table.body(
-                rx.table.row(rx.table.cell("لا يوجد أساتذة في القائمة", col_span=len(cols)))
-            ),
-        ),
-        variant="surface",
-        size="3",
-        width="100%",
-        style={"direction": "rtl", "textAlign": "right"}
+    return virtual_table(
+        AllowedTeachersTableState,
+        [("الإيميل", "university_email"), ("مسجل", "is_registered"), ("تاريخ الإضافة", "added_date")],
+        "allowed_teachers_table",
+        height=320,
+        empty_text="لا يوجد أساتذة في القائمة",
     )
 
 
@@ -245,7 +277,7 @@ def results_upload_section():
     return rx.card(
         rx.vstack(
             section_title("رفع نتائج الفصل الدراسي"),
-            rx.text("قم برفع ملف النتائج (Excel/PDF) للفصل الدراسي"),
+            rx.text("قم برفع ملف النتائج (CSV/XLSX) للفصل الدراسي، يرى كل طالب صفه فقط"),
             
             # Semester selector
             rx.hstack(
@@ -272,13 +304,17 @@ def results_upload_section():
                 rx.el.div(
                     rx.icon("cloud_upload", class_name="text-blue-500 h-10 w-10"),
                     rx.el.p("اختر ملف النتائج", class_name="font-semibold text-gray-700"),
-                    rx.el.p("Excel أو PDF", class_name="text-sm text-gray-500"),
+                    rx.el.p("CSV أو XLSX، بعمود رقم الطالب", class_name="text-sm text-gray-500"),
                     rx.vstack(
                         rx.foreach(rx.selected_files("upload_result"), rx.text),
                     ),
                     class_name="flex flex-col items-center justify-center p-6 bg-blue-50 border-2 border-dashed border-blue-200 rounded-lg text-center h-40",
                 ),
                 id="upload_result",
+                accept={
+                    "text/csv": [".csv"],
+                    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": [".xlsx"],
+                },
                 class_name="w-full cursor-pointer",
             ),
             
@@ -309,17 +345,58 @@ def files_management_section():
             section_title("إدارة الملفات المرفوعة"),
             rx.text("عرض وحذف الملفات التي رفعها الأساتذة"),
             
-            rx.button(
-                "تحميل جميع الملفات",
-                color_scheme="blue",
+            rx.hstack(
+                rx.select.root(
+                    rx.select.trigger(placeholder="الفصل"),
+                    rx.select.content(
+                        rx.select.item("كل الفصول", value="all"),
+                        rx.foreach(
+                            SupervisorState.semesters,
+                            lambda s: rx.select.item(s, value=s),
+                        ),
+                    ),
+                    value=SupervisorState.export_semester,
+                    on_change=SupervisorState.set_export_semester,
+                ),
+                rx.select.root(
+                    rx.select.trigger(placeholder="الأستاذ"),
+                    rx.select.content(
+                        rx.select.item("كل الأساتذة", value="all"),
+                        rx.foreach(
+                            SupervisorState.all_teachers,
+                            lambda t: rx.select.item(t.full_name, value=t.id.to_string()),
+                        ),
+                    ),
+                    value=SupervisorState.export_teacher_id,
+                    on_change=SupervisorState.set_export_teacher_id,
+                ),
+                rx.select.root(
+                    rx.select.trigger(placeholder="النوع"),
+                    rx.select.content(
+                        rx.select.item("كل الأنواع", value="all"),
+                        rx.select.item("محاضرات", value="lecture"),
+                        rx.select.item("واجبات", value="homework"),
+                    ),
+                    value=SupervisorState.export_file_type,
+                    on_change=SupervisorState.set_export_file_type,
+                ),
+                rx.button(
+                    "تحميل جميع الملفات",
+                    on_click=SupervisorState.download_all_files,
+                    color_scheme="blue",
+                ),
+                export_menu("تصدير قائمة الملفات", "files"),
+                rx.button(
+                    "إعادة بناء فهرس البحث",
+                    on_click=SupervisorState.reindex_search,
+                    variant="soft",
+                ),
+                spacing="3",
+                wrap="wrap",
             ),
             
             # Files table
-            rx.cond(
-                FileState.uploaded_files.length() > 0,
-                files_table(),
-                rx.text("لا توجد ملفات", color="gray"),
-            ),
+            files_table(),
             
             spacing="3",
             width="100%",
@@ -331,34 +408,21 @@ def files_management_section():
 
 
 def files_table():
-    cols = ["اسم الملف", "الفصل", "النوع", "رفع بواسطة", "التاريخ", "الحجم", "إجراءات"]
-    header = rx.table.row(*[rx.table.column_header_cell(c) for c in cols])
-
-    def render_row(file):
-        return rx.table.row(
-            rx.table.cell(file.file_description),
-            rx.table.cell(file.semester),
-            rx.table.cell(file.file_type),
-            rx.table.cell(file.uploaded_by),
-            rx.table.cell(file.upload_date),
-            rx.table.cell(file.file_size),
-            rx.table.cell(
-                rx.button(
-                    "حذف",
-                    color_scheme="red",
-                    size="1",
-                    on_click=SupervisorState.delete_file(file.id),
-                )
-            ),
-        )
-
-    return rx.table.root(
-        rx.table.header(header),
-        rx.table.body(rx.foreach(FileState.uploaded_files, render_row)),
-        variant="surface",
-        size="2",
-        width="100%",
-        style={"direction": "rtl", "textAlign": "right"}
+    cols = [
+        ("اسم الملف", "file_description"),
+        ("الفصل", "semester"),
+        ("النوع", "file_type"),
+        ("رفع بواسطة", "uploaded_by"),
+        ("التاريخ", "upload_date"),
+        ("الحجم", "file_size"),
+    ]
+    return virtual_table(
+        FilesTableState,
+        cols,
+        "files_table",
+        height=560,
+        row_action=lambda f: delete_button(SupervisorState.delete_file(f["id"])),
+        empty_text="لا توجد ملفات",
     )
 
 
@@ -408,51 +472,92 @@ def supervisor_navbar():
 
 
 # ========== MAIN DASHBOARD ==========
+def tab_section(value: str, *children):
+    return rx.tabs.content(
+        rx.vstack(*children, spacing="4", align="start", width="100%", padding_top="16px"),
+        value=value,
+        width="100%",
+    )
+
+
 def supervisor_dashboard():
     return rx.vstack(
         supervisor_navbar(),
         
         # Statistics at top
         stats_section(),
+        jobs_section(),
         
-        # User Management
-        rx.heading("إدارة المستخدمين", size="6", margin_top="20px"),
-        rx.button(
-            "تحميل المستخدمين",
-            on_click=SupervisorState.load_all_users,
-            color_scheme="blue",
-        ),
-        users_table("الطلاب", SupervisorState.all_students),
-        users_table("الأساتذة", SupervisorState.all_teachers, is_teacher=True),
-        
-        # Whitelists
-        rx.heading("إدارة القوائم المسموحة", size="6", margin_top="20px"),
-        rx.button(
-            "تحميل القوائم",
-            on_click=[
-                SupervisorState.load_allowed_students,
-                SupervisorState.load_allowed_teachers,
-            ],
-            color_scheme="blue",
+        # One section at a time; a section loads its data when first opened
+        rx.tabs.root(
+            rx.tabs.list(
+                rx.tabs.trigger("إدارة المستخدمين", value="users"),
+                rx.tabs.trigger("إدارة القوائم المسموحة", value="whitelists"),
+                rx.tabs.trigger("إدارة النتائج", value="results"),
+                rx.tabs.trigger("إدارة الملفات", value="files"),
+            ),
+            
+            # User Management
+            tab_section(
+                "users",
+                rx.hstack(
+                    rx.button(
+                        "تحميل المستخدمين",
+                        on_click=[StudentsTableState.load_table, TeachersTableState.load_table],
+                        color_scheme="blue",
+                    ),
+                    export_menu("تصدير المستخدمين", "users"),
+                    spacing="3",
+                ),
+                users_table("الطلاب", StudentsTableState, "students_table"),
+                users_table("الأساتذة", TeachersTableState, "teachers_table"),
+            ),
+            
+            # Whitelists
+            tab_section(
+                "whitelists",
+                rx.hstack(
+                    rx.button(
+                        "تحميل القوائم",
+                        on_click=[
+                            AllowedStudentsTableState.load_table,
+                            AllowedTeachersTableState.load_table,
+                        ],
+                        color_scheme="blue",
+                    ),
+                    export_menu("تصدير الطلاب المسموح لهم", "allowed-students"),
+                    export_menu("تصدير الأساتذة المسموح لهم", "allowed-teachers"),
+                    spacing="3",
+                    wrap="wrap",
+                ),
+                whitelist_form_students(),
+                whitelist_form_teachers(),
+            ),
+            
+            # Results Upload
+            tab_section(
+                "results",
+                export_menu("تصدير سجل النتائج", "results"),
+                results_upload_section(),
+            ),
+            
+            # Files Management
+            tab_section("files", files_management_section()),
+            
+            value=SupervisorState.active_tab,
+            on_change=SupervisorState.open_tab,
+            dir="rtl",
+            width="100%",
         ),
-        whitelist_form_students(),
-        whitelist_form_teachers(),
-        
-        # Results Upload
-        rx.heading("إدارة النتائج", size="6", margin_top="20px"),
-        results_upload_section(),
-        
-        # Files Management
-        rx.heading("إدارة الملفات", size="6", margin_top="20px"),
-        files_management_section(),
         
         spacing="4",
         align="start",
         width="100%",
         padding="20px",
+        # Background events: these load side by side, not one after another
         on_mount=[
-            SupervisorState.load_all_users,
-            SupervisorState.load_allowed_students,
-            SupervisorState.load_allowed_teachers,
+            SupervisorState.load_stats,
+            SupervisorState.track_jobs,
+            SupervisorState.open_tab(SupervisorState.active_tab),
         ],
-    )
\ No newline at end of file
+    )
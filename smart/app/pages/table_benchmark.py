@@ -0,0 +1,53 @@
+from typing import Any, Dict, List
+
+import reflex as rx
+
+from app.components.virtual_table import VirtualTableState, virtual_table
+
+
+BENCHMARK_ROWS = 50_000
+
+
+class BenchmarkTableState(VirtualTableState, rx.State):
+    """Synthetic rows computed from their index, no database involved."""
+    
+    async def _fetch_count(self) -> int:
+        return BENCHMARK_ROWS
+    
+    async def _fetch_window(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        return [
+            {
+                "id": i,
+                "number": str(i + 1),
+                "name": f"مستخدم {i + 1}",
+                "email": f"user{i + 1}@nilevalley.edu.sd",
+                "semester": f"الفصل {i % 10 + 1}",
+            }
+            for i in range(offset, min(offset + limit, BENCHMARK_ROWS))
+        ]
+
+
+def table_benchmark() -> rx.Component:
+    return rx.vstack(
+        rx.heading("اختبار أداء الجدول", size="6"),
+        rx.text(
+            "صفوف معروضة: ",
+            BenchmarkTableState.rows.length(),
+            " / ",
+            BenchmarkTableState.total_rows,
+            " (من الصف ",
+            BenchmarkTableState.window_start,
+            ")",
+        ),
+        virtual_table(
+            BenchmarkTableState,
+            [("#", "number"), ("الاسم", "name"), ("الايميل", "email"), ("الفصل", "semester")],
+            "benchmark_table",
+            height=600,
+        ),
+        spacing="4",
+        width="100%",
+        padding="20px",
+        style={"direction": "rtl", "textAlign": "right"},
+        on_mount=BenchmarkTableState.load_table,
+    )
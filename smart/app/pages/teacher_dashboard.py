@@ -50,6 +50,7 @@ def _upload_card(title: str, icon: str, file_type: str) -> rx.Component:
     # Determine which upload handler to use
     upload_handler = FileState.upload_lecture if file_type == "lecture" else FileState.upload_homework
     upload_id = f"upload_{file_type}"
+    resumable_input_id = f"resumable_{file_type}"
     
     return rx.el.div(
         # Store username in a hidden field that FileState can access
@@ -139,6 +140,27 @@ def _upload_card(title: str, icon: str, file_type: str) -> rx.Component:
             class_name="w-full bg-blue-600 text-white font-bold py-3 px-4 rounded-lg hover:bg-blue-700 transition-colors mt-4 disabled:opacity-50 disabled:cursor-not-allowed",
         ),
         
+        # Large files: resumable upload that survives dropped connections
+        rx.el.div(
+            rx.el.label("ملف كبير (يمكن استكمال رفعه عند انقطاع الاتصال)", class_name="text-sm font-medium text-gray-700"),
+            rx.el.input(
+                type="file",
+                id=resumable_input_id,
+                disabled=FileState.is_uploading,
+                class_name="w-full text-sm text-gray-700",
+            ),
+            rx.el.button(
+                "رفع ملف كبير",
+                on_click=rx.call_script(
+                    f"smartFileInfo('{resumable_input_id}', '{file_type}')",
+                    callback=FileState.start_resumable_upload,
+                ),
+                disabled=FileState.is_uploading,
+                class_name="w-full bg-white border border-blue-600 text-blue-600 font-semibold py-2 px-4 rounded-lg hover:bg-blue-50 transition-colors disabled:opacity-50 disabled:cursor-not-allowed",
+            ),
+            class_name="flex flex-col gap-2 mt-4 pt-4 border-t border-gray-200",
+        ),
+        
         class_name="bg-white p-6 rounded-2xl shadow-lg",
     )
 
@@ -149,6 +171,11 @@ def _uploaded_files_section() -> rx.Component:
             "الملفات المرفوعة",
             class_name="text-xl font-bold text-white mb-4",
         ),
+        rx.el.input(
+            placeholder="ابحث في الملفات المرفوعة...",
+            on_change=FileState.search_files.debounce(300),
+            class_name="w-full mb-4 px-4 py-2 rounded-lg bg-white text-gray-800 focus:outline-none focus:ring-2 focus:ring-white",
+        ),
         rx.el.div(
             rx.cond(
                 FileState.uploaded_files.length() > 0,
@@ -163,6 +190,14 @@ def _uploaded_files_section() -> rx.Component:
             ),
             class_name="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-4",
         ),
+        rx.cond(
+            FileState.files_has_more,
+            rx.el.button(
+                "عرض المزيد",
+                on_click=FileState.load_more_files,
+                class_name="mt-4 mx-auto block bg-white text-blue-600 text-sm font-semibold py-2 px-6 rounded-lg hover:bg-blue-50 transition-colors",
+            ),
+        ),
         class_name="w-full max-w-5xl bg-white/10 p-6 rounded-2xl",
     )
 
@@ -0,0 +1,35 @@
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import tuple_
+
+
+# Rows fetched per "load more"; the browser only ever gets this many at once
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def keyset_query(
+    query,
+    columns: Sequence,
+    after: Optional[Sequence] = None,
+    descending: bool = False,
+    page_size: int = PAGE_SIZE,
+):
+    """Order query by columns and start it right after the key in after.
+
+    columns must end with a unique column (normally the id) so the order is
+    stable. One extra row is fetched so split_page can tell if more follow.
+    """
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    if after is not None:
+        key = tuple_(*columns) if len(columns) > 1 else columns[0]
+        bound = tuple_(*after) if len(columns) > 1 else after[0]
+        query = query.where(key < bound if descending else key > bound)
+    order = [c.desc() if descending else c.asc() for c in columns]
+    return query.order_by(*order).limit(page_size + 1)
+
+
+def split_page(rows: List, page_size: int = PAGE_SIZE) -> Tuple[List, bool]:
+    """Drop the look-ahead row; returns the page and whether more rows exist."""
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    return list(rows[:page_size]), len(rows) > page_size
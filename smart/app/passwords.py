@@ -0,0 +1,100 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+import bcrypt
+
+
+# bcrypt releases the GIL, so threads hash in parallel without blocking the
+# event loop. One worker per core is all the CPU there is to give it.
+HASH_WORKERS = 4
+
+# Hashes waiting or running at most; beyond this logins are turned away
+# with a "try again" instead of queueing for minutes
+MAX_PENDING_HASHES = 64
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when too many password hashes are already queued."""
+
+
+class PasswordPool:
+    """Runs bcrypt off the event loop on a bounded pool, with queue metrics."""
+
+    def __init__(self, workers: int = HASH_WORKERS, max_pending: int = MAX_PENDING_HASHES):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="smart-bcrypt")
+        self._workers = workers
+        self._max_pending = max_pending
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    async def _run(self, func, *args):
+        with self._lock:
+            if self.pending >= self._max_pending:
+                self.rejected += 1
+                raise PasswordPoolBusy()
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+        queued_at = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(self._timed, queued_at, func, *args)
+            )
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def _timed(self, queued_at: float, func, *args):
+        started_at = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.completed += 1
+                self._wait_seconds += started_at - queued_at
+                self._run_seconds += time.perf_counter() - started_at
+
+    async def hash(self, password: str) -> str:
+        """bcrypt hash of a password."""
+        return await self._run(hash_password, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        """Whether a password matches a bcrypt hash."""
+        return await self._run(check_password, password, password_hash)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and timings, for monitoring."""
+        with self._lock:
+            done = self.completed or 1
+            return {
+                "workers": self._workers,
+                "max_pending": self._max_pending,
+                "pending": self.pending,
+                "peak_pending": self.peak_pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self._wait_seconds / done * 1000, 1),
+                "avg_run_ms": round(self._run_seconds / done * 1000, 1),
+            }
+
+
+def hash_password(password: str) -> str:
+    """Hash a password with bcrypt, blocking the calling thread."""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+
+def check_password(password: str, password_hash: str) -> bool:
+    """Check a password against a bcrypt hash, blocking the calling thread."""
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+password_pool = PasswordPool()
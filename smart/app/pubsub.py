@@ -0,0 +1,146 @@
+import asyncio
+import contextlib
+import json
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from reflex.utils import prerequisites
+
+
+# Messages waiting for one subscriber; a stalled tab loses the oldest first
+SUBSCRIBER_QUEUE_SIZE = 256
+
+# Most messages handed to a subscriber in one go
+BATCH_MAX = 50
+
+REDIS_PREFIX = "smart:"
+
+# How often a listening session checks that its tab is still connected
+LISTEN_TIMEOUT_SECONDS = 15
+
+
+def semester_channel(semester: str) -> str:
+    return f"semester:{semester}"
+
+
+def is_connected(token: str) -> bool:
+    """Whether a client token still has a websocket on this worker."""
+    app = prerequisites.get_and_validate_app().app
+    return token in app.event_namespace.token_to_sid
+
+
+class Subscription:
+    """Messages published on a channel since subscribing."""
+
+    def __init__(self, queue: asyncio.Queue):
+        self._queue = queue
+
+    async def next_batch(self, timeout: float) -> List[Dict[str, Any]]:
+        """Wait up to timeout for a message, then take whatever else is queued."""
+        try:
+            batch = [await asyncio.wait_for(self._queue.get(), timeout)]
+        except asyncio.TimeoutError:
+            return []
+        while len(batch) < BATCH_MAX and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+
+class InProcessBus:
+    """Fans messages out to the subscribers of this process."""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        self._deliver(channel, message)
+
+    def _deliver(self, channel: str, message: Dict[str, Any]):
+        for queue in list(self._subscribers.get(channel, ())):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self, channel: str) -> AsyncIterator[Subscription]:
+        queue: asyncio.Queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[channel].add(queue)
+        try:
+            yield Subscription(queue)
+        finally:
+            self._subscribers[channel].discard(queue)
+            if not self._subscribers[channel]:
+                del self._subscribers[channel]
+
+
+class RedisBus(InProcessBus):
+    """Publishes through Redis so every worker sees every message.
+
+    Each process holds a single Redis subscription and fans the messages it
+    receives out to its own subscribers, whatever their number.
+    """
+
+    def __init__(self, redis):
+        super().__init__()
+        self._redis = redis
+        self._listener: Optional[asyncio.Task] = None
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        await self._redis.publish(REDIS_PREFIX + channel, json.dumps(message))
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self, channel: str) -> AsyncIterator[Subscription]:
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        async with super().subscribe(channel) as subscription:
+            yield subscription
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub()
+                await pubsub.psubscribe(REDIS_PREFIX + "*")
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    channel = message["channel"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    self._deliver(channel[len(REDIS_PREFIX):], json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Pub/sub listener error: {e}")
+                await asyncio.sleep(1)
+
+
+_bus: Optional[InProcessBus] = None
+
+
+def get_bus() -> InProcessBus:
+    """The bus of this process: Redis when Reflex is configured with it."""
+    global _bus
+    if _bus is None:
+        redis = prerequisites.get_redis()
+        _bus = RedisBus(redis) if redis is not None else InProcessBus()
+    return _bus
+
+
+def set_bus(bus: InProcessBus):
+    """Swap the bus, e.g. for an InProcessBus in tests."""
+    global _bus
+    _bus = bus
+
+
+async def publish_to_semester(semester: str, kind: str, items: List[Dict[str, Any]]):
+    """Push new items to every session watching a semester.
+
+    Callers send the rows they already built, so subscribers never query.
+    Failures are logged; live updates are best effort.
+    """
+    if not items:
+        return
+    try:
+        await get_bus().publish(semester_channel(semester), {"kind": kind, "items": items})
+    except Exception as e:
+        print(f"Publish error: {e}")
@@ -0,0 +1,266 @@
+from datetime import datetime
+from typing import Iterable, Optional, Sequence
+
+from sqlalchemy import delete
+from sqlmodel import func, select
+
+from app.models import (
+    AllowedStudent,
+    AllowedTeacher,
+    FileBlob,
+    Job,
+    SemesterResult,
+    StudentResult,
+    UploadedFile,
+    UploadSession,
+    User,
+)
+from app.pagination import PAGE_SIZE, keyset_query
+
+
+# Every query that filters or sorts a growing table on anything but the
+# primary key is built here, so benchmarks/query_plans.py checks the exact
+# statements the handlers run. A new builder needs sample arguments there,
+# or the check fails.
+
+
+# ========== Users ==========
+def user_by_username(username: str):
+    return select(User).where(User.username == username)
+
+
+def user_by_university_id(university_id: str):
+    return select(User).where(User.university_id == university_id)
+
+
+def user_by_email(email: str):
+    return select(User).where(User.email == email)
+
+
+def users_count(role: str):
+    return select(func.count(User.id)).where(User.role == role)
+
+
+def users_window(role: str, offset: int, limit: int):
+    return select(User).where(User.role == role).order_by(User.id).offset(offset).limit(limit)
+
+
+def teacher_options():
+    return select(User).where(User.role == "teacher").order_by(User.full_name)
+
+
+def dashboard_counts():
+    """Supervisor statistics, all four counts in one statement."""
+
+    def count(model, *where):
+        return select(func.count()).select_from(model).where(*where).scalar_subquery()
+
+    return select(
+        count(User, User.role == "student").label("students"),
+        count(User, User.role == "teacher").label("teachers"),
+        count(AllowedStudent).label("allowed_students"),
+        count(AllowedTeacher).label("allowed_teachers"),
+    )
+
+
+# ========== Whitelist ==========
+def allowed_student(student_number: str):
+    return select(AllowedStudent).where(AllowedStudent.student_number == student_number)
+
+
+def allowed_teacher(university_email: str):
+    return select(AllowedTeacher).where(AllowedTeacher.university_email == university_email)
+
+
+def allowed_students_count():
+    return select(func.count(AllowedStudent.id))
+
+
+def allowed_students_window(offset: int, limit: int):
+    return select(AllowedStudent).order_by(AllowedStudent.id.desc()).offset(offset).limit(limit)
+
+
+def allowed_teachers_count():
+    return select(func.count(AllowedTeacher.id))
+
+
+def allowed_teachers_window(offset: int, limit: int):
+    return select(AllowedTeacher).order_by(AllowedTeacher.id.desc()).offset(offset).limit(limit)
+
+
+def existing_whitelist_values(column, values: Sequence[str]):
+    """Which of values are already in a whitelist column."""
+    return select(column).where(column.in_(values))
+
+
+# ========== Files ==========
+def files_page(semester: str, after: Optional[Sequence] = None, page_size: int = PAGE_SIZE):
+    """A page of files with their uploader, newest first, keyset-paginated."""
+    query = select(UploadedFile, User).join(User)
+    # Only filter by semester if provided
+    if semester:
+        query = query.where(UploadedFile.semester == semester)
+    return keyset_query(
+        query, [UploadedFile.upload_date, UploadedFile.id], after, descending=True, page_size=page_size
+    )
+
+
+def files_by_ids(ids: Sequence[int]):
+    return select(UploadedFile, User).join(User).where(UploadedFile.id.in_(ids))
+
+
+def files_count():
+    return select(func.count(UploadedFile.id))
+
+
+def files_window(offset: int, limit: int):
+    return (
+        select(UploadedFile, User)
+        .join(User, UploadedFile.uploaded_by_id == User.id)
+        .order_by(UploadedFile.upload_date.desc(), UploadedFile.id.desc())
+        .offset(offset)
+        .limit(limit)
+    )
+
+
+def file_download(file_id: int):
+    """Path, original name and content hash of an uploaded file."""
+    return (
+        select(UploadedFile.file_path, UploadedFile.filename, FileBlob.sha256)
+        .outerjoin(FileBlob, UploadedFile.blob_id == FileBlob.id)
+        .where(UploadedFile.id == file_id)
+    )
+
+
+def files_of_user_count(user_id: int):
+    return select(func.count(UploadedFile.id)).where(UploadedFile.uploaded_by_id == user_id)
+
+
+def files_of_user(user_id: int, limit: int):
+    return select(UploadedFile).where(UploadedFile.uploaded_by_id == user_id).limit(limit)
+
+
+def files_to_index(after_id: int, limit: int):
+    """Searchable text of the next files by id, for rebuilding the search index."""
+    return (
+        select(
+            UploadedFile.id,
+            UploadedFile.file_description,
+            UploadedFile.filename,
+            func.coalesce(User.full_name, User.username, ""),
+        )
+        .outerjoin(User, User.id == UploadedFile.uploaded_by_id)
+        .where(UploadedFile.id > after_id)
+        .order_by(UploadedFile.id)
+        .limit(limit)
+    )
+
+
+def export_entries(
+    semester: Optional[str] = None,
+    teacher_id: Optional[int] = None,
+    file_type: Optional[str] = None,
+):
+    """Files to export with their teacher's name, grouped by semester and teacher."""
+    query = (
+        select(
+            UploadedFile.file_path,
+            UploadedFile.filename,
+            UploadedFile.semester,
+            UploadedFile.file_type,
+            UploadedFile.upload_date,
+            User.full_name,
+        )
+        .join(User, UploadedFile.uploaded_by_id == User.id)
+        .order_by(UploadedFile.semester, User.full_name, UploadedFile.id)
+    )
+    if semester:
+        query = query.where(UploadedFile.semester == semester)
+    if teacher_id:
+        query = query.where(UploadedFile.uploaded_by_id == teacher_id)
+    if file_type:
+        query = query.where(UploadedFile.file_type == file_type)
+    return query
+
+
+def table_export(columns: Sequence):
+    """A whole table, in the order of its first column."""
+    return select(*columns).order_by(columns[0])
+
+
+# ========== Blobs and uploads ==========
+def blobs_by_hash(hashes: Iterable[str]):
+    # Fresh reference counts, even for blobs already loaded in the session
+    return (
+        select(FileBlob)
+        .where(FileBlob.sha256.in_(hashes))
+        .execution_options(populate_existing=True)
+    )
+
+
+def upload_session(upload_id: str):
+    return select(UploadSession).where(UploadSession.upload_id == upload_id)
+
+
+def resumable_upload(client_key: str, user_id: int, total_size: int):
+    """The unfinished upload a browser can resume after a reload."""
+    return select(UploadSession).where(
+        UploadSession.client_key == client_key,
+        UploadSession.uploaded_by_id == user_id,
+        UploadSession.total_size == total_size,
+    )
+
+
+def stale_uploads(before: datetime):
+    return select(UploadSession).where(UploadSession.updated_date < before)
+
+
+# ========== Results ==========
+def student_results(semester: str, student_number: str):
+    """A student's rows of every results file of their semester, newest file first."""
+    return (
+        select(StudentResult, SemesterResult)
+        .join(SemesterResult, SemesterResult.id == StudentResult.result_id)
+        .where(
+            StudentResult.semester == semester,
+            StudentResult.student_number == student_number,
+        )
+        .order_by(SemesterResult.upload_date.desc())
+    )
+
+
+def delete_student_results(result_id: int):
+    return delete(StudentResult).where(StudentResult.result_id == result_id)
+
+
+# ========== Jobs ==========
+def next_queued_job(now: datetime):
+    """Oldest queued job that is due.
+
+    Queued and expired jobs are two lookups: with an OR, SQLite walks the
+    whole table by id.
+    """
+    return (
+        select(Job)
+        .where(Job.status == "queued", Job.run_after <= now)
+        .order_by(Job.id)
+        .limit(1)
+    )
+
+
+def next_expired_job(stale_before: datetime):
+    """Oldest running job whose worker stopped reporting."""
+    return (
+        select(Job)
+        .where(Job.status == "running", Job.updated_date < stale_before)
+        .order_by(Job.id)
+        .limit(1)
+    )
+
+
+def finished_jobs(before: datetime):
+    return select(Job).where(Job.status.in_(("done", "failed")), Job.updated_date < before)
+
+
+def recent_jobs(kinds: Iterable[str], limit: int):
+    return select(Job).where(Job.kind.in_(kinds)).order_by(Job.id.desc()).limit(limit)
@@ -0,0 +1,73 @@
+import json
+from itertools import islice
+from typing import Iterator, List, Optional, Tuple
+
+from app.spreadsheets import iter_rows
+
+
+# Header names recognised as the student number column (compared lowercased)
+STUDENT_NUMBER_HEADERS = {
+    "student_number",
+    "student number",
+    "university_id",
+    "university id",
+    "رقم الطالب",
+    "الرقم الجامعي",
+}
+
+# Student rows parsed and inserted per batch
+RESULT_BATCH_SIZE = 1000
+
+StudentRow = Tuple[str, List[List[str]]]
+
+
+def _is_student_number(value: str) -> bool:
+    return value.isdigit() and len(value) == 6
+
+
+def iter_student_results(file_path: str, filename: str) -> Iterator[StudentRow]:
+    """(student number, [[column, value], ...]) for each student row of a results file.
+
+    A first row without any student number is the header and names the
+    columns. The number column is the one headed like STUDENT_NUMBER_HEADERS,
+    otherwise the first column holding a 6-digit number. Rows without a
+    valid number (titles, totals, blank lines) are skipped.
+    """
+    header: List[str] = []
+    column: Optional[int] = None
+    for i, row in enumerate(iter_rows(file_path, filename)):
+        row = [cell.strip() for cell in row]
+        if column is None:
+            if i == 0 and not any(_is_student_number(cell) for cell in row):
+                header = row
+                column = next(
+                    (n for n, name in enumerate(header) if name.lower() in STUDENT_NUMBER_HEADERS),
+                    None,
+                )
+                continue
+            column = next((n for n, cell in enumerate(row) if _is_student_number(cell)), None)
+            if column is None:
+                continue
+
+        number = row[column] if column < len(row) else ""
+        if not _is_student_number(number):
+            continue
+        grades = [
+            [header[n] if n < len(header) and header[n] else str(n + 1), value]
+            for n, value in enumerate(row)
+            if n != column and value
+        ]
+        yield number, grades
+
+
+def next_batch(rows: Iterator[StudentRow], size: int = RESULT_BATCH_SIZE) -> List[StudentRow]:
+    """The next rows of a results file (blocking, run on the I/O pool)."""
+    return list(islice(rows, size))
+
+
+def decode_grades(grades: str) -> List[List[str]]:
+    """Stored grades of a StudentResult, as [column, value] pairs."""
+    try:
+        return json.loads(grades or "[]")
+    except ValueError:
+        return []
@@ -0,0 +1,158 @@
+import re
+from typing import List, Optional
+
+from sqlalchemy import event, or_, select, text
+
+from app.models import UploadedFile, User
+
+
+# FTS5 table over the searchable text of UploadedFile; its rowid is the file id
+FTS_TABLE = "uploadedfile_fts"
+
+FTS_CREATE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "file_description, filename, uploader, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+
+# bm25 weights: description, filename, uploader
+RANK = f"bm25({FTS_TABLE}, 10.0, 4.0, 1.0)"
+
+SEARCH_LIMIT = 50
+
+_TASHKEEL = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]")
+_LETTERS = str.maketrans("أإآٱةىؤئ", "ااااهيوي")
+_ARTICLE = re.compile(r"^(?:وال|بال|كال|فال|لل|ال)(?=\w{2})")
+_WORD = re.compile(r"\w+")
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """Fold Arabic spelling variants so queries match however a word is typed.
+
+    Strips harakat and tatweel, unifies alef/ta marbuta/ya forms and drops
+    the definite article, then lower-cases the rest.
+    """
+    if not value:
+        return ""
+    value = _TASHKEEL.sub("", value).translate(_LETTERS).lower()
+    return " ".join(_ARTICLE.sub("", word) for word in _WORD.findall(value))
+
+
+def match_query(query: str) -> str:
+    """FTS5 MATCH expression: every word must appear, as a prefix."""
+    return " ".join(f'"{word}"*' for word in normalize_text(query).split())
+
+
+def _is_sqlite(connection) -> bool:
+    return connection.dialect.name == "sqlite"
+
+
+_index_ready = False
+
+
+def _ensure_index(connection):
+    """Create the FTS table on databases set up without the migration."""
+    global _index_ready
+    if not _index_ready:
+        connection.execute(text(FTS_CREATE))
+        _index_ready = True
+
+
+def _index_error(e: Exception):
+    # The table may have been created in a transaction that rolled back
+    global _index_ready
+    _index_ready = False
+    print(f"Search index error: {e}")
+
+
+def index_file(connection, file_id: int, description: Optional[str], filename: str, uploader: str):
+    """Add or replace one file in the search index."""
+    connection.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": file_id})
+    connection.execute(
+        text(
+            f"INSERT INTO {FTS_TABLE} (rowid, file_description, filename, uploader) "
+            "VALUES (:id, :description, :filename, :uploader)"
+        ),
+        {
+            "id": file_id,
+            "description": normalize_text(description),
+            "filename": normalize_text(filename),
+            "uploader": normalize_text(uploader),
+        },
+    )
+
+
+@event.listens_for(UploadedFile, "after_insert")
+def _index_new_file(mapper, connection, target: UploadedFile):
+    if not _is_sqlite(connection):
+        return
+    uploader = connection.execute(
+        select(User.full_name, User.username).where(User.id == target.uploaded_by_id)
+    ).first()
+    try:
+        _ensure_index(connection)
+        index_file(
+            connection,
+            target.id,
+            target.file_description,
+            target.filename,
+            (uploader[0] or uploader[1]) if uploader else "",
+        )
+    except Exception as e:
+        # A missing index must never block an upload
+        _index_error(e)
+
+
+def unindex_file(connection, file_id: int):
+    """Drop one file from the search index, for deletes that bypass the ORM."""
+    if not _is_sqlite(connection):
+        return
+    try:
+        _ensure_index(connection)
+        connection.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": file_id})
+    except Exception as e:
+        _index_error(e)
+
+
+@event.listens_for(UploadedFile, "after_delete")
+def _unindex_file(mapper, connection, target: UploadedFile):
+    unindex_file(connection, target.id)
+
+
+def search_file_ids(session, query: str, semester: str = "", limit: int = SEARCH_LIMIT) -> List[int]:
+    """Ids of the files matching query, best match first."""
+    connection = session.connection()
+    if _is_sqlite(connection):
+        expression = match_query(query)
+        if not expression:
+            return []
+        _ensure_index(connection)
+        sql = (
+            f"SELECT f.id FROM {FTS_TABLE} JOIN uploadedfile f ON f.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH :q"
+            + (" AND f.semester = :semester" if semester else "")
+            + f" ORDER BY {RANK} LIMIT :limit"
+        )
+        rows = connection.execute(
+            text(sql), {"q": expression, "semester": semester, "limit": limit}
+        )
+        return [row[0] for row in rows]
+
+    # Other databases: plain substring match, newest first
+    words = query.split()
+    if not words:
+        return []
+    stmt = select(UploadedFile.id).join(User, UploadedFile.uploaded_by_id == User.id)
+    for word in words:
+        pattern = f"%{word}%"
+        stmt = stmt.where(
+            or_(
+                UploadedFile.file_description.ilike(pattern),
+                UploadedFile.filename.ilike(pattern),
+                User.full_name.ilike(pattern),
+            )
+        )
+    if semester:
+        stmt = stmt.where(UploadedFile.semester == semester)
+    stmt = stmt.order_by(UploadedFile.upload_date.desc(), UploadedFile.id.desc()).limit(limit)
+    return [row[0] for row in connection.execute(stmt)]
@@ -0,0 +1,35 @@
+import csv
+import os
+from typing import Iterator, List
+
+
+def iter_rows(file_path: str, filename: str) -> Iterator[List[str]]:
+    """Rows of a CSV or XLSX file as lists of strings, read one at a time.
+
+    XLSX files are opened in openpyxl's read-only mode, which streams the
+    sheet instead of loading it; empty cells come back as "" so columns
+    keep their position.
+    """
+    if os.path.splitext(filename)[1].lower() == ".xlsx":
+        # Only needed for spreadsheets
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                for row in sheet.iter_rows(values_only=True):
+                    cells = []
+                    for cell in row:
+                        if cell is None:
+                            cell = ""
+                        # Numbers typed into Excel come back as int or float
+                        if isinstance(cell, float) and cell.is_integer():
+                            cell = int(cell)
+                        cells.append(str(cell))
+                    yield cells
+        finally:
+            workbook.close()
+        return
+
+    with open(file_path, newline="", encoding="utf-8-sig", errors="replace") as f:
+        yield from csv.reader(f)
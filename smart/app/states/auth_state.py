@@ -1,7 +1,14 @@
 import reflex as rx
 from typing import Literal
-from sqlmodel import select
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from app import db, queries
+from app.identity import Identity, identity_cache
 from app.models import User, AllowedStudent, AllowedTeacher
+from app.passwords import PasswordPoolBusy, password_pool
+
+
+BUSY_MESSAGE = "The server is busy, please try again in a moment"
 
 
 class AuthState(rx.State):
@@ -34,7 +41,7 @@ class AuthState(rx.State):
         self.signup_type = signup_type
 
     @rx.event
-    def login(self, form_data: dict):
+    async def login(self, form_data: dict):
         """Handle user login with database authentication."""
         # For students, they use university_id, for teachers/supervisors they use username
         username = form_data.get("username", "")
@@ -49,48 +56,52 @@ class AuthState(rx.State):
             return
         
         # Query database for user (check both username and university_id)
-        with rx.session() as session:
+        async with db.asession() as session:
             if username:
-                user = session.exec(
-                    select(User).where(User.username == username)
-                ).first()
+                user = (await session.exec(queries.user_by_username(username))).first()
             else:
-                user = session.exec(
-                    select(User).where(User.university_id == university_id)
-                ).first()
-            
-            if not user:
-                yield rx.toast.error("Invalid username or password")
-                return
-            
-            # Verify password
-            if not user.verify_password(password):
-                yield rx.toast.error("Invalid username or password")
-                return
-            
-            # Check if user role matches selected role
-            if user.role != self.login_role:
-                yield rx.toast.error(f"This account is not a {self.login_role} account")
-                return
-            
-            # Login successful
-            self.is_authenticated = True
-            self.current_user_role = user.role
-            self.current_username = user.username
-            
-            # Store semester if student
-            if user.role == "student" and user.semester:
-                self.user_semester = user.semester
-            
-            yield rx.toast.success(f"Welcome back, {user.full_name or user.username}!")
-            
-            # Redirect based on role
-            if user.role == "student":
-                return rx.redirect("/student-dashboard")
-            elif user.role == "teacher":
-                return rx.redirect("/teacher-dashboard")
-            elif user.role == "supervisor":
-                return rx.redirect("/supervisor-dashboard")
+                user = (await session.exec(queries.user_by_university_id(university_id))).first()
+        
+        if not user:
+            yield rx.toast.error("Invalid username or password")
+            return
+        
+        # Verify password on the bcrypt pool, with no connection held meanwhile
+        try:
+            valid = await password_pool.verify(password, user.password_hash)
+        except PasswordPoolBusy:
+            yield rx.toast.warning(BUSY_MESSAGE)
+            return
+        if not valid:
+            yield rx.toast.error("Invalid username or password")
+            return
+        
+        # Check if user role matches selected role
+        if user.role != self.login_role:
+            yield rx.toast.error(f"This account is not a {self.login_role} account")
+            return
+        
+        # Login successful
+        self.is_authenticated = True
+        self.current_user_role = user.role
+        self.current_username = user.username
+        
+        # Store semester if student
+        if user.role == "student" and user.semester:
+            self.user_semester = user.semester
+        
+        # Handlers read this instead of looking the user up again
+        identity_cache.remember(self.router.session.client_token, Identity.from_user(user))
+        
+        yield rx.toast.success(f"Welcome back, {user.full_name or user.username}!")
+        
+        # Redirect based on role
+        if user.role == "student":
+            yield rx.redirect("/student-dashboard")
+        elif user.role == "teacher":
+            yield rx.redirect("/teacher-dashboard")
+        elif user.role == "supervisor":
+            yield rx.redirect("/supervisor-dashboard")
 
     @rx.event
     def logout(self):
@@ -99,6 +110,7 @@ class AuthState(rx.State):
         self.current_user_role = ""
         self.current_username = ""
         self.user_semester = ""
+        identity_cache.forget(self.router.session.client_token)
         yield rx.toast.info("Logged out successfully")
         return rx.redirect("/login")
 
@@ -109,7 +121,7 @@ class AuthState(rx.State):
             return rx.redirect("/login")
 
     @rx.event
-    def create_student_account(self, form_data: dict):
+    async def create_student_account(self, form_data: dict):
         """Handle student account creation."""
         username = form_data.get("username", "")
         email = form_data.get("email", "")
@@ -137,62 +149,85 @@ class AuthState(rx.State):
             yield rx.toast.error("Password must be at least 6 characters")
             return
         
-        # Create user in database
-        with rx.session() as session:
+        # Checks first, on a session released before the slow hash
+        async with db.asession() as session:
             # Check if student number is in whitelist
-            allowed = session.exec(
-                select(AllowedStudent).where(AllowedStudent.student_number == university_id)
-            ).first()
-            
-            if not allowed:
-                yield rx.toast.error("رقم الطالب غير مسموح به. الرجاء التواصل مع المشرف")
-                return
-            
-            if allowed.is_registered:
-                yield rx.toast.error("هذا الرقم مسجل مسبقاً")
-                return
-            
-            # Check if username already exists
-            existing_user = session.exec(
-                select(User).where(User.username == username)
-            ).first()
-            
-            if existing_user:
-                yield rx.toast.error("Username already exists")
-                return
-            
-            # Check if email already exists
-            existing_email = session.exec(
-                select(User).where(User.email == email)
-            ).first()
-            
-            if existing_email:
-                yield rx.toast.error("Email already exists")
-                return
+            allowed = (await session.exec(queries.allowed_student(university_id))).first()
+            error = await self._account_conflict(session, username, email)
+        
+        if not allowed:
+            yield rx.toast.error("رقم الطالب غير مسموح به. الرجاء التواصل مع المشرف")
+            return
+        
+        if allowed.is_registered:
+            yield rx.toast.error("هذا الرقم مسجل مسبقاً")
+            return
+        
+        if error:
+            yield rx.toast.error(error)
+            return
+        
+        try:
+            password_hash = await password_pool.hash(password)
+        except PasswordPoolBusy:
+            yield rx.toast.warning(BUSY_MESSAGE)
+            return
+        
+        async def register(session) -> bool:
+            # Mark student number as registered, unless a parallel signup just did
+            claimed = await session.execute(
+                update(AllowedStudent)
+                .where(
+                    AllowedStudent.id == allowed.id,
+                    AllowedStudent.is_registered.is_(False),
+                )
+                .values(is_registered=True)
+            )
+            if claimed.rowcount != 1:
+                return False
             
             # Create new student user WITH SEMESTER
-            new_user = User(
+            session.add(User(
                 username=username,
                 email=email,
-                password_hash=User.hash_password(password),
+                password_hash=password_hash,
                 role="student",
                 full_name=full_name or None,
                 university_id=university_id or None,
                 semester=semester  # Save semester here
-            )
-            
-            session.add(new_user)
-            
-            # Mark student number as registered
-            allowed.is_registered = True
-            
-            session.commit()
-            
-            yield rx.toast.success("Student account created successfully!")
-            return rx.redirect("/login")
+            ))
+            return True
+        
+        try:
+            # Signups in a surge share commits on the write queue
+            registered = await db.write(register)
+        except IntegrityError:
+            yield rx.toast.error("Username or email already exists")
+            return
+        
+        if not registered:
+            yield rx.toast.error("هذا الرقم مسجل مسبقاً")
+            return
+        
+        yield rx.toast.success("Student account created successfully!")
+        yield rx.redirect("/login")
+
+    @staticmethod
+    async def _account_conflict(session, username: str, email: str) -> str:
+        """Error for a taken username or email, or "" when both are free."""
+        # Check if username already exists
+        existing_user = (await session.exec(queries.user_by_username(username))).first()
+        if existing_user:
+            return "Username already exists"
+        
+        # Check if email already exists
+        existing_email = (await session.exec(queries.user_by_email(email))).first()
+        if existing_email:
+            return "Email already exists"
+        return ""
 
     @rx.event
-    def create_teacher_account(self, form_data: dict):
+    async def create_teacher_account(self, form_data: dict):
         """Handle teacher account creation."""
         username = form_data.get("username", "")
         email = form_data.get("email", "")
@@ -214,38 +249,36 @@ class AuthState(rx.State):
             yield rx.toast.error("Password must be at least 6 characters")
             return
         
-        # Create teacher in database
-        with rx.session() as session:
-            # Check if username already exists
-            existing_user = session.exec(
-                select(User).where(User.username == username)
-            ).first()
-            
-            if existing_user:
-                yield rx.toast.error("Username already exists")
-                return
-            
-            # Check if email already exists
-            existing_email = session.exec(
-                select(User).where(User.email == email)
-            ).first()
-            
-            if existing_email:
-                yield rx.toast.error("Email already exists")
-                return
-            
+        # Checks first, on a session released before the slow hash
+        async with db.asession() as session:
+            error = await self._account_conflict(session, username, email)
+        if error:
+            yield rx.toast.error(error)
+            return
+        
+        try:
+            password_hash = await password_pool.hash(password)
+        except PasswordPoolBusy:
+            yield rx.toast.warning(BUSY_MESSAGE)
+            return
+        
+        async def register(session):
             # Create new teacher user
-            new_user = User(
+            session.add(User(
                 username=username,
                 email=email,
-                password_hash=User.hash_password(password),
+                password_hash=password_hash,
                 role="teacher",
                 full_name=full_name or None,
                 university_id=university_id or None
-            )
-            
-            session.add(new_user)
-            session.commit()
-            
-            yield rx.toast.success("Teacher account created successfully!")
-            return rx.redirect("/login")
\ No newline at end of file
+            ))
+        
+        try:
+            await db.write(register)
+        except IntegrityError:
+            # Taken between the check and the insert
+            yield rx.toast.error("Username or email already exists")
+            return
+        
+        yield rx.toast.success("Teacher account created successfully!")
+        yield rx.redirect("/login")
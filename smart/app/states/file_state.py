@@ -1,9 +1,25 @@
 import reflex as rx
-from sqlmodel import select
-from typing import List
+from typing import List, Optional, Union
+import asyncio
+import json
 import os
 from datetime import datetime
+from app import db, queries
 from app.models import UploadedFile, User
+from app.identity import Identity, current_identity
+from app.listing_cache import listing_cache
+from app.pagination import split_page
+from app.pubsub import publish_to_semester
+from app.search import search_file_ids
+from app.blobstore import add_blob_refs, delete_uploaded_file, stage_upload, unmove_blobs
+from app.downloads import backend_url
+from app.storage import UPLOAD_CONCURRENCY, remove_file, run_io
+from app.uploads import (
+    RESUMABLE_CHUNK_SIZE,
+    UploadError,
+    commit_upload,
+    create_upload_session,
+)
 
 
 class FileInfo(rx.Base):
@@ -30,6 +46,12 @@ class FileState(rx.State):
     # Files list - using proper type now
     uploaded_files: List[FileInfo] = []
     
+    # Keyset pagination of uploaded_files: (upload_date, id) of the last row
+    files_has_more: bool = False
+    _files_semester: str = ""
+    _files_version: int = 0
+    _files_cursor: list = []
+    
     # Upload state tracking - CRITICAL FIX
     is_uploading: bool = False
     current_upload_id: str = ""
@@ -63,7 +85,6 @@ class FileState(rx.State):
         """Set username from auth state. Called from UI."""
         self.cached_username = username
         self._auth_current_username = username
-        print(f"✓ Username set from auth: {username}")
     
     @rx.event
     def set_file_description(self, value: str):
@@ -120,102 +141,98 @@ class FileState(rx.State):
         self.is_uploading = True
         
         try:
-            # SIMPLIFIED APPROACH: Get username from database by checking who's logged in as teacher
-            current_username = None
+            # Identity stored at login, no lookup needed
+            user = await current_identity(self)
             
-            # First try cached username
-            if self.cached_username:
-                current_username = self.cached_username
-                print(f"Using cached username: {current_username}")
+            if not user:
+                yield rx.toast.error("خطأ في المصادقة - الرجاء تسجيل الدخول مجدداً")
+                return
             
-            # If no cache, try to get from AuthState
-            if not current_username:
-                from app.states.auth_state import AuthState
-                try:
-                    auth_state = await self.get_state(AuthState)
-                    if auth_state and hasattr(auth_state, 'current_username'):
-                        current_username = auth_state.current_username
-                        if current_username:
-                            self.cached_username = current_username
-                            print(f"Fetched and cached username: {current_username}")
-                except Exception as e:
-                    print(f"Error getting auth state: {e}")
+            # Stream every file to the staging area, a few at a time
+            limit = asyncio.Semaphore(UPLOAD_CONCURRENCY)
             
-            # Last resort: Get from cookie/session token
-            if not current_username:
-                try:
-                    # Try to get from router session
-                    if hasattr(self, 'router') and hasattr(self.router, 'session'):
-                        # This might have session info
-                        session_data = self.router.session
-                        print(f"Router session data: {session_data}")
-                except Exception as e:
-                    print(f"Error getting session: {e}")
+            async def stage(file):
+                async with limit:
+                    return await stage_upload(file)
             
-            # FALLBACK: Query database for any teacher (for testing only)
-            if not current_username:
-                print("WARNING: Using fallback - getting first teacher from database")
-                with rx.session() as session:
-                    teacher = session.exec(
-                        select(User).where(User.role == "teacher")
-                    ).first()
-                    if teacher:
-                        current_username = teacher.username
-                        self.cached_username = current_username
-                        print(f"Fallback username: {current_username}")
+            results = await asyncio.gather(
+                *(stage(file) for file in files), return_exceptions=True
+            )
             
-            if not current_username:
-                yield rx.toast.error("خطأ في المصادقة - الرجاء تسجيل الدخول مجدداً")
-                return
+            staged = []
+            failed = []
+            for file, result in zip(files, results):
+                if isinstance(result, BaseException):
+                    print(f"Upload error: {result}")
+                    failed.append(file.filename)
+                else:
+                    staged.append((file.filename, result))
             
-            for file in files:
+            # Save the whole batch to the database in one transaction
+            if staged:
+                moved = []
                 try:
-                    # Create uploads directory inside assets (so Reflex serves it)
-                    upload_dir = "assets/uploaded_files"
-                    os.makedirs(upload_dir, exist_ok=True)
-                    
-                    # Generate unique filename
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    original_filename = file.filename
-                    file_extension = os.path.splitext(original_filename)[1]
-                    stored_filename = f"{timestamp}_{self.file_type}_{original_filename}"
-                    file_path = os.path.join(upload_dir, stored_filename)
-                    
-                    # Save file
-                    file_data = await file.read()
-                    with open(file_path, "wb") as f:
-                        f.write(file_data)
-                    
-                    # Save to database
-                    with rx.session() as session:
-                        # Get current user from database using stored username
-                        user = session.exec(
-                            select(User).where(User.username == current_username)
-                        ).first()
-                        
-                        if not user:
-                            yield rx.toast.error("خطأ في العثور على المستخدم")
-                            continue
-                        
-                        new_file = UploadedFile(
-                            filename=original_filename,
-                            stored_filename=stored_filename,
-                            file_type=self.file_type,
-                            file_description=self.file_description,
-                            semester=self.selected_semester,
-                            uploaded_by_id=user.id,
-                            file_size=len(file_data),
-                            file_path=file_path
+                    async with db.asession() as session:
+                        # Identical content is stored once and shared
+                        blobs = await add_blob_refs(
+                            session,
+                            [
+                                (staged_path, sha256, file_size, os.path.splitext(filename)[1])
+                                for filename, (staged_path, sha256, file_size) in staged
+                            ],
+                            moved,
                         )
                         
-                        session.add(new_file)
-                        session.commit()
-                    
-                    yield rx.toast.success(f"تم رفع الملف بنجاح: {original_filename}")
-                    
+                        new_files = [
+                            UploadedFile(
+                                filename=filename,
+                                stored_filename=os.path.basename(blob.file_path),
+                                file_type=self.file_type,
+                                file_description=self.file_description,
+                                semester=self.selected_semester,
+                                uploaded_by_id=user.id,
+                                file_size=file_size,
+                                file_path=blob.file_path,
+                                blob_id=blob.id,
+                            )
+                            for (filename, (_, _, file_size)), blob in zip(staged, blobs)
+                        ]
+                        session.add_all(new_files)
+                        await session.flush()
+                        # Built before commit expires the rows
+                        added = [self._file_info(f, user) for f in new_files]
+                        await session.commit()
                 except Exception as e:
-                    yield rx.toast.error(f"خطأ في رفع الملف: {str(e)}")
-                    print(f"Upload error: {e}")  # Debug log
+                    print(f"Upload error: {e}")
+                    # New content already sits in the blob store; back to staging
+                    await unmove_blobs(moved)
+                    for _, (staged_path, _, _) in staged:
+                        await run_io(remove_file, staged_path)
+                    failed.extend(filename for filename, _ in staged)
+                    staged = []
+                else:
+                    listing_cache.invalidate(self.selected_semester)
+                    # The files are saved; a failed refresh or push is only reported
+                    try:
+                        await self._apply_files_delta(self.selected_semester, added=added)
+                        await publish_to_semester(
+                            self.selected_semester, "files", [info.dict() for info in added]
+                        )
+                    except Exception as e:
+                        print(f"Upload saved, refresh failed: {e}")
+            
+            # One summary toast for the whole batch
+            if staged and not failed:
+                if len(staged) == 1:
+                    yield rx.toast.success(f"تم رفع الملف بنجاح: {staged[0][0]}")
+                else:
+                    yield rx.toast.success(f"تم رفع {len(staged)} ملفات بنجاح")
+            elif staged:
+                yield rx.toast.warning(
+                    f"تم رفع {len(staged)} ملفات، وفشل رفع {len(failed)}: {', '.join(failed)}"
+                )
+            else:
+                yield rx.toast.error(f"خطأ في رفع الملفات: {', '.join(failed)}")
             
             # CRITICAL: Clear form and upload component
             self.file_description = ""
@@ -223,12 +240,9 @@ class FileState(rx.State):
             # Clear the upload component by calling clear_files
             yield rx.clear_selected_files(self.current_upload_id)
             
-            # Refresh files list AFTER all uploads
-            yield FileState.load_files()
-            
         except Exception as e:
             yield rx.toast.error(f"خطأ عام: {str(e)}")
-            print(f"General upload error: {e}")  # Debug log
+            print(f"General upload error: {e}")
             
         finally:
             # Always reset uploading flag
@@ -236,76 +250,217 @@ class FileState(rx.State):
             self.current_upload_id = ""
     
     @rx.event
-    def load_files(self, semester: str = ""):
-        """Load files for a specific semester or all files."""
-        with rx.session() as session:
-            query = select(UploadedFile, User).join(User)
-            
-            # Only filter by semester if provided
-            if semester and isinstance(semester, str):
-                query = query.where(UploadedFile.semester == semester)
-            
-            results = session.exec(query).all()
+    async def start_resumable_upload(self, file_info: dict):
+        """Open a resumable upload for the file picked in the browser."""
+        if self.is_uploading:
+            yield rx.toast.warning("جاري رفع ملف، الرجاء الانتظار")
+            return
+        
+        if not file_info or not file_info.get("filename"):
+            yield rx.toast.error("الرجاء اختيار ملف")
+            return
+        
+        if not self.file_description:
+            yield rx.toast.error("الرجاء إدخال اسم الملف")
+            return
+        
+        file_type = file_info.get("file_type")
+        if file_type not in ("lecture", "homework"):
+            yield rx.toast.error("نوع الملف غير صالح")
+            return
+        
+        user = await current_identity(self)
+        if not user:
+            yield rx.toast.error("خطأ في المصادقة - الرجاء تسجيل الدخول مجدداً")
+            return
+        
+        upload = await create_upload_session(
+            user_id=user.id,
+            filename=file_info["filename"],
+            total_size=int(file_info.get("size") or 0),
+            file_type=file_type,
+            semester=self.selected_semester,
+            file_description=self.file_description,
+            client_key=file_info.get("client_key"),
+        )
+        
+        self.is_uploading = True
+        self.current_upload_id = f"upload_{file_type}"
+        
+        # The browser sends the chunks itself and reports back when done
+        args = ", ".join(
+            json.dumps(arg)
+            for arg in (
+                file_info.get("input_id", ""),
+                rx.config.get_config().api_url,
+                upload.upload_id,
+                RESUMABLE_CHUNK_SIZE,
+            )
+        )
+        yield rx.call_script(
+            f"smartResumableUpload({args})",
+            callback=FileState.finish_resumable_upload,
+        )
+    
+    @rx.event
+    async def finish_resumable_upload(self, result: dict):
+        """Commit a resumable upload once every chunk has arrived."""
+        self.is_uploading = False
+        self.current_upload_id = ""
+        
+        if not result or not result.get("ok"):
+            if result and result.get("expired"):
+                yield rx.toast.error("انتهت صلاحية جلسة الرفع، الرجاء إعادة المحاولة")
+            else:
+                yield rx.toast.warning("انقطع الاتصال، اختر نفس الملف مجدداً لاستكمال الرفع")
+            return
+        
+        try:
+            new_file = await commit_upload(result["upload_id"])
+        except UploadError as e:
+            yield rx.toast.error(f"خطأ في رفع الملف: {str(e)}")
+            return
+        
+        user = await current_identity(self)
+        if user is None or user.id != new_file.uploaded_by_id:
+            async with db.asession() as session:
+                user = await session.get(User, new_file.uploaded_by_id)
+        added = self._file_info(new_file, user)
+        await self._apply_files_delta(new_file.semester, added=[added])
+        await publish_to_semester(new_file.semester, "files", [added.dict()])
+        
+        self.file_description = ""
+        yield rx.toast.success(f"تم رفع الملف بنجاح: {new_file.filename}")
+    
+    def _file_info(self, file: UploadedFile, user: Union[User, Identity]) -> FileInfo:
+        """Row shown in the files listings."""
+        return FileInfo(
+            id=file.id,
+            filename=file.filename,
+            file_description=file.file_description or "",
+            semester=file.semester,
+            file_type=file.file_type,
+            upload_date=file.upload_date.strftime("%Y-%m-%d %H:%M"),
+            uploaded_by=user.full_name or user.username,
+            file_size=self._format_file_size(file.file_size or 0),
+            file_path=file.file_path,
+        )
+    
+    async def _fetch_files_page(self, semester: str, after=None) -> List[FileInfo]:
+        """Fetch one page of files, newest first, starting after a cursor.
+        
+        Pages come from the shared listing cache when possible; every
+        student of a semester mounts the same first page.
+        """
+        cursor = tuple(after) if after else None
+        version = listing_cache.version(semester)
+        page = listing_cache.get(semester, version, cursor)
+        
+        if page is None:
+            # The busiest read in the app: one thread hop instead of one per query
+            results, has_more = split_page(
+                await db.read(lambda session: session.exec(queries.files_page(semester, after)).all())
+            )
             
-            self.uploaded_files = [
-                FileInfo(
-                    id=file.id,
-                    filename=file.filename,
-                    file_description=file.file_description or "",
-                    semester=file.semester,
-                    file_type=file.file_type,
-                    upload_date=file.upload_date.strftime("%Y-%m-%d %H:%M"),
-                    uploaded_by=user.full_name or user.username,
-                    file_size=self._format_file_size(file.file_size or 0),
-                    file_path=file.file_path,
-                )
-                for file, user in results
-            ]
+            next_cursor = (results[-1][0].upload_date, results[-1][0].id) if results else None
+            page = ([self._file_info(file, user) for file, user in results], has_more, next_cursor)
+            listing_cache.put(semester, version, cursor, page)
+        
+        files, self.files_has_more, next_cursor = page
+        if next_cursor:
+            self._files_cursor = list(next_cursor)
+        
+        # The cached list is shared; state gets its own copy to mutate
+        return list(files)
+    
+    async def _reset_files(self, semester: str):
+        """Restart the files listing at its first page."""
+        self._files_semester = semester
+        self._files_version = listing_cache.version(semester)
+        self._files_cursor = []
+        self.uploaded_files = await self._fetch_files_page(semester)
+    
+    async def _apply_files_delta(
+        self,
+        semester: str,
+        added: Optional[List[FileInfo]] = None,
+        removed_ids: Optional[List[int]] = None,
+    ):
+        """Patch uploaded_files after this session's own upload or delete.
+        
+        Call it right after listing_cache.invalidate(). If the listing moved
+        by more than that one bump, someone else changed it as well and the
+        list is reloaded instead.
+        """
+        if self._files_semester and self._files_semester != semester:
+            return
+        
+        expected = self._files_version + 1
+        if listing_cache.version(self._files_semester) != expected:
+            await self._reset_files(self._files_semester)
+            return
+        self._files_version = expected
+        
+        if removed_ids:
+            self.uploaded_files = [f for f in self.uploaded_files if f.id not in removed_ids]
+        if added:
+            # Newest first, like the listing
+            self.uploaded_files = list(reversed(added)) + self.uploaded_files
+    
+    @rx.event
+    async def load_files(self, semester: str = ""):
+        """Load the first page of files for a specific semester or all files."""
+        await self._reset_files(semester if isinstance(semester, str) else "")
+    
+    @rx.event
+    async def load_more_files(self):
+        """Append the next page of the current files listing."""
+        if not self.files_has_more or not self._files_cursor:
+            return
+        self.uploaded_files.extend(
+            await self._fetch_files_page(self._files_semester, self._files_cursor)
+        )
+    
+    def prepend_files(self, files: List[FileInfo]):
+        """Show files pushed by another session on top of the list."""
+        known = {f.id for f in self.uploaded_files}
+        new_files = [f for f in files if f.id not in known]
+        if new_files:
+            self.uploaded_files = list(reversed(new_files)) + self.uploaded_files
+    
+    @rx.event
+    async def search_files(self, query: str):
+        """Show the files matching query, best match first; empty restores the list."""
+        if not query.strip():
+            await self._reset_files(self._files_semester)
+            return
+        
+        async with db.asession() as session:
+            # The FTS query is raw SQL on the connection, run through the sync API
+            ids = await session.run_sync(search_file_ids, query, self._files_semester)
+            results = (
+                await session.exec(queries.files_by_ids(ids))
+            ).all() if ids else []
+        
+        rank = {file_id: i for i, file_id in enumerate(ids)}
+        results = sorted(results, key=lambda row: rank[row[0].id])
+        self.uploaded_files = [self._file_info(file, user) for file, user in results]
+        self.files_has_more = False
+        # Search results are not a listing; the next change reloads it
+        self._files_version = -1
     
     @rx.event
     async def load_student_files(self):
         """Load files for logged-in student's semester only."""
-        from app.states.auth_state import AuthState
+        current_user = await current_identity(self)
         
-        # CRITICAL FIX: await the coroutine!
-        auth_state = await self.get_state(AuthState)
-        current_username = auth_state.current_username if auth_state else None
-        
-        if not current_username:
+        if not current_user or not current_user.semester:
             self.uploaded_files = []
+            self.files_has_more = False
             return
         
-        with rx.session() as session:
-            # Get current user
-            current_user = session.exec(
-                select(User).where(User.username == current_username)
-            ).first()
-            
-            if not current_user or not current_user.semester:
-                self.uploaded_files = []
-                return
-            
-            # Load files only from student's semester
-            query = select(UploadedFile, User).join(User).where(
-                UploadedFile.semester == current_user.semester
-            )
-            
-            results = session.exec(query).all()
-            
-            self.uploaded_files = [
-                FileInfo(
-                    id=file.id,
-                    filename=file.filename,
-                    file_description=file.file_description or "",
-                    semester=file.semester,
-                    file_type=file.file_type,
-                    upload_date=file.upload_date.strftime("%Y-%m-%d %H:%M"),
-                    uploaded_by=user.full_name or user.username,
-                    file_size=self._format_file_size(file.file_size or 0),
-                    file_path=file.file_path,
-                )
-                for file, user in results
-            ]
+        # Load files only from student's semester
+        await self._reset_files(current_user.semester)
     
     @staticmethod
     def _format_file_size(size_bytes: int) -> str:
@@ -320,57 +475,42 @@ class FileState(rx.State):
     @rx.event
     def download_file(self, file_id: int):
         """Trigger file download."""
-        with rx.session() as session:
-            file = session.get(UploadedFile, file_id)
-            if file:
-                # Convert path to URL format (remove 'assets/' and add leading '/')
-                url_path = "/" + file.file_path.replace("assets/", "")
-                return rx.download(url_path, filename=file.filename)
+        # The download route sends Content-Disposition, so the page stays put
+        url = backend_url(f"/api/files/{file_id}")
+        return rx.call_script(f"window.location.assign({json.dumps(url)})")
 
     @rx.event
     async def delete_file(self, file_id: int):
         """Delete a file."""
-        print(f"Delete file called with ID: {file_id}")  # Debug
-        
         if not file_id:
             yield rx.toast.error("معرف الملف غير صالح")
             return
         
         try:
-            file_to_delete = None
-            
-            with rx.session() as session:
-                file_to_delete = session.get(UploadedFile, file_id)
-                
+            async def delete(session):
+                file_to_delete = await session.get(UploadedFile, file_id)
                 if not file_to_delete:
-                    yield rx.toast.error("لم يتم العثور على الملف")
-                    return
-                
-                file_path = file_to_delete.file_path
-                
-                # Delete from database first
-                session.delete(file_to_delete)
-                session.commit()
-                print(f"File deleted from database: {file_id}")  # Debug
+                    return None
+                # Delete from database first; shared content stays until its last reference goes
+                return file_to_delete.semester, await delete_uploaded_file(session, file_to_delete)
+            
+            # Committed and released before anything is sent to the client
+            deleted = await db.write(delete)
+            if deleted is None:
+                yield rx.toast.error("لم يتم العثور على الملف")
+                return
+            semester, file_path = deleted
+            listing_cache.invalidate(semester)
             
             # Delete file from filesystem (outside session)
-            try:
-                if file_path and os.path.exists(file_path):
-                    os.remove(file_path)
-                    print(f"File deleted from filesystem: {file_path}")  # Debug
-            except Exception as fs_error:
-                print(f"Filesystem delete error: {fs_error}")
-                # Don't fail if file doesn't exist on disk
+            if file_path:
+                await run_io(remove_file, file_path)
             
             yield rx.toast.success("تم حذف الملف بنجاح")
             
-            # CRITICAL FIX: Reload files list properly
-            # Call load_files and get its result
-            self.load_files()
-            print(f"Files reloaded, count: {len(self.uploaded_files)}")  # Debug
+            # Drop the row in place instead of reloading the list
+            await self._apply_files_delta(semester, removed_ids=[file_id])
             
         except Exception as e:
             yield rx.toast.error(f"خطأ في حذف الملف: {str(e)}")
-            print(f"Delete error: {e}")
-            import traceback
-            traceback.print_exc()
\ No newline at end of file
+            print(f"Delete error: {e}")
\ No newline at end of file
@@ -1,9 +1,37 @@
+import asyncio
 import reflex as rx
-from sqlmodel import select
-from typing import List
+from sqlalchemy.exc import IntegrityError
+from typing import Any, Dict, List
+import json
 import os
+import secrets
 from datetime import datetime
-from app.models import User, AllowedStudent, AllowedTeacher, SemesterResult, UploadedFile
+from urllib.parse import urlencode
+from app import db
+from app.models import User, SemesterResult, UploadedFile
+from app.blobstore import delete_uploaded_file
+from app.components.virtual_table import VirtualTableState
+from app.downloads import backend_url, sign_download
+from app.identity import current_identity
+from app.jobs import JOB_POLL_SECONDS, enqueue
+from app.listing_cache import listing_cache
+from app.pubsub import is_connected
+from app import queries, whitelist
+from app.stats import dashboard_counts
+from app.storage import RESULTS_DIR, STAGING_DIR, remove_file, run_io, save_upload
+from app.states.file_state import FileState
+
+
+# Jobs shown on the dashboard, with their labels
+JOB_LABELS = {
+    "delete_user": "حذف مستخدم",
+    "delete_files": "حذف ملفات",
+    "remove_files": "إزالة ملفات من القرص",
+    "reindex_search": "إعادة بناء فهرس البحث",
+    "ingest_results": "معالجة ملف النتائج",
+}
+
+RECENT_JOBS = 5
 
 
 class UserInfo(rx.Base):
@@ -16,32 +44,147 @@ class UserInfo(rx.Base):
     university_id: str
 
 
-class AllowedStudentInfo(rx.Base):
-    """Type for allowed student display."""
-    id: int
-    student_number: str
-    is_registered: bool
-    added_date: str
+# ========== Virtualized Tables ==========
+class StudentsTableState(VirtualTableState, rx.State):
+    """Registered students, fetched a window at a time."""
+    
+    async def _fetch_count(self) -> int:
+        async with db.asession() as session:
+            return (
+                await session.exec(queries.users_count("student"))
+            ).one()
+    
+    async def _fetch_window(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        async with db.asession() as session:
+            users = (
+                await session.exec(queries.users_window("student", offset, limit))
+            ).all()
+        return [
+            {
+                "id": u.id,
+                "username": u.username,
+                "email": u.email,
+                "university_id": u.university_id or "",
+            }
+            for u in users
+        ]
 
 
-class AllowedTeacherInfo(rx.Base):
-    """Type for allowed teacher display."""
-    id: int
-    university_email: str
-    is_registered: bool
-    added_date: str
+class TeachersTableState(VirtualTableState, rx.State):
+    """Registered teachers, fetched a window at a time."""
+    
+    async def _fetch_count(self) -> int:
+        async with db.asession() as session:
+            return (
+                await session.exec(queries.users_count("teacher"))
+            ).one()
+    
+    async def _fetch_window(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        async with db.asession() as session:
+            users = (
+                await session.exec(queries.users_window("teacher", offset, limit))
+            ).all()
+        return [
+            {
+                "id": u.id,
+                "username": u.username,
+                "email": u.email,
+                "university_id": u.university_id or "",
+            }
+            for u in users
+        ]
+
+
+class AllowedStudentsTableState(VirtualTableState, rx.State):
+    """Students whitelist, newest first."""
+    
+    async def _fetch_count(self) -> int:
+        async with db.asession() as session:
+            return (await session.exec(queries.allowed_students_count())).one()
+    
+    async def _fetch_window(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        async with db.asession() as session:
+            allowed = (
+                await session.exec(queries.allowed_students_window(offset, limit))
+            ).all()
+        return [
+            {
+                "id": s.id,
+                "student_number": s.student_number,
+                "is_registered": "نعم" if s.is_registered else "لا",
+                "added_date": s.added_date.strftime("%Y-%m-%d"),
+            }
+            for s in allowed
+        ]
+
+
+class AllowedTeachersTableState(VirtualTableState, rx.State):
+    """Teachers whitelist, newest first."""
+    
+    async def _fetch_count(self) -> int:
+        async with db.asession() as session:
+            return (await session.exec(queries.allowed_teachers_count())).one()
+    
+    async def _fetch_window(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        async with db.asession() as session:
+            allowed = (
+                await session.exec(queries.allowed_teachers_window(offset, limit))
+            ).all()
+        return [
+            {
+                "id": t.id,
+                "university_email": t.university_email,
+                "is_registered": "نعم" if t.is_registered else "لا",
+                "added_date": t.added_date.strftime("%Y-%m-%d"),
+            }
+            for t in allowed
+        ]
+
+
+class FilesTableState(VirtualTableState, rx.State):
+    """Files of every semester, newest first."""
+    
+    async def _fetch_count(self) -> int:
+        async with db.asession() as session:
+            return (await session.exec(queries.files_count())).one()
+    
+    async def _fetch_window(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        async with db.asession() as session:
+            rows = (
+                await session.exec(queries.files_window(offset, limit))
+            ).all()
+        return [
+            {
+                "id": f.id,
+                "file_description": f.file_description or "",
+                "semester": f.semester,
+                "file_type": f.file_type,
+                "uploaded_by": u.full_name or u.username,
+                "upload_date": f.upload_date.strftime("%Y-%m-%d %H:%M"),
+                "file_size": FileState._format_file_size(f.file_size or 0),
+            }
+            for f, u in rows
+        ]
 
 
 class SupervisorState(rx.State):
     """State for supervisor dashboard functionality."""
     
-    # User lists
-    all_students: List[UserInfo] = []
+    # Teachers offered in the export filter; the tables live in *TableState
     all_teachers: List[UserInfo] = []
     
-    # Whitelist data
-    allowed_students: List[AllowedStudentInfo] = []
-    allowed_teachers: List[AllowedTeacherInfo] = []
+    # Dashboard stats, counted in the database (see load_stats)
+    total_students: int = 0
+    total_teachers: int = 0
+    total_allowed_students: int = 0
+    total_allowed_teachers: int = 0
+    
+    # Recent background jobs (see track_jobs)
+    jobs: List[Dict[str, Any]] = []
+    _tracking_jobs: bool = False
+    
+    # Dashboard section on screen; each loads its data when first opened
+    active_tab: str = "users"
     
     # Forms
     new_student_numbers: str = ""  # Comma-separated student numbers
@@ -57,6 +200,11 @@ class SupervisorState(rx.State):
         "الفصل التاسع", "الفصل العاشر",
     ]
     
+    # Files export filters ("all" means no filter)
+    export_semester: str = "all"
+    export_teacher_id: str = "all"
+    export_file_type: str = "all"
+    
     # ========== Form Setters ==========
     @rx.event
     def set_new_student_numbers(self, value: str):
@@ -74,259 +222,293 @@ class SupervisorState(rx.State):
     def set_result_description(self, value: str):
         self.result_description = value
     
-    # ========== Load Users ==========
     @rx.event
-    def load_all_users(self):
-        """Load all students and teachers."""
-        with rx.session() as session:
-            # Load students
-            students = session.exec(
-                select(User).where(User.role == "student")
-            ).all()
-            
-            self.all_students = [
-                UserInfo(
-                    id=user.id,
-                    username=user.username,
-                    email=user.email,
-                    role=user.role,
-                    full_name=user.full_name or "",
-                    university_id=user.university_id or "",
-                )
-                for user in students
-            ]
-            
-            # Load teachers
-            teachers = session.exec(
-                select(User).where(User.role == "teacher")
-            ).all()
-            
-            self.all_teachers = [
-                UserInfo(
-                    id=user.id,
-                    username=user.username,
-                    email=user.email,
-                    role=user.role,
-                    full_name=user.full_name or "",
-                    university_id=user.university_id or "",
-                )
-                for user in teachers
-            ]
+    def set_export_semester(self, value: str):
+        self.export_semester = value
+    
+    @rx.event
+    def set_export_teacher_id(self, value: str):
+        self.export_teacher_id = value
+    
+    @rx.event
+    def set_export_file_type(self, value: str):
+        self.export_file_type = value
+    
+    # ========== Tabs ==========
+    @rx.event
+    def open_tab(self, tab: str):
+        """Show a dashboard section, loading its tables if needed."""
+        self.active_tab = tab
+        if tab == "users":
+            return [StudentsTableState.show_table, TeachersTableState.show_table]
+        if tab == "whitelists":
+            return [AllowedStudentsTableState.show_table, AllowedTeachersTableState.show_table]
+        if tab == "files":
+            return [FilesTableState.show_table, SupervisorState.load_teacher_options]
+    
+    # ========== Load Teachers ==========
+    @staticmethod
+    async def _fetch_teacher_options() -> List[UserInfo]:
+        async with db.asession() as session:
+            teachers = (await session.exec(queries.teacher_options())).all()
+        return [
+            UserInfo(
+                id=user.id,
+                username=user.username,
+                email=user.email,
+                role=user.role,
+                full_name=user.full_name or user.username,
+                university_id=user.university_id or "",
+            )
+            for user in teachers
+        ]
+    
+    @rx.event(background=True)
+    async def load_teacher_options(self):
+        """Load the teachers offered in the export filter."""
+        teachers = await self._fetch_teacher_options()
+        async with self:
+            self.all_teachers = teachers
     
     # ========== Delete User ==========
     @rx.event
-    def delete_user(self, user_id: int):
-        """Delete a user by ID."""
-        with rx.session() as session:
-            user = session.get(User, user_id)
-            if user:
-                if user.role == "supervisor":
-                    yield rx.toast.error("لا يمكن حذف المشرف")
-                    return
-                
-                # Delete all files uploaded by this user (if teacher)
-                if user.role == "teacher":
-                    files = session.exec(
-                        select(UploadedFile).where(UploadedFile.uploaded_by_id == user_id)
-                    ).all()
-                    
-                    for file in files:
-                        # Delete physical file
-                        if os.path.exists(file.file_path):
-                            try:
-                                os.remove(file.file_path)
-                            except Exception:
-                                pass  # Ignore if file doesn't exist
-                        # Delete from database
-                        session.delete(file)
-                
-                # If student, unmark their student number as registered
-                if user.role == "student" and user.university_id:
-                    allowed_student = session.exec(
-                        select(AllowedStudent).where(AllowedStudent.student_number == user.university_id)
-                    ).first()
-                    if allowed_student:
-                        allowed_student.is_registered = False
+    async def delete_user(self, user_id: int):
+        """Queue the deletion of a user and everything they uploaded."""
+        supervisor = await current_identity(self)
+        async with db.asession() as session:
+            user = await session.get(User, user_id)
+        if not user:
+            return
+        if user.role == "supervisor":
+            yield rx.toast.error("لا يمكن حذف المشرف")
+            return
+        
+        # A teacher's uploads can take a while; the job queue does the work
+        await enqueue("delete_user", {"user_id": user_id}, supervisor.id if supervisor else None)
+        yield rx.toast.info(f"جاري حذف {user.username} في الخلفية")
+        yield SupervisorState.track_jobs
+    
+    # ========== Background Jobs ==========
+    async def _fetch_jobs(self) -> List[Dict[str, Any]]:
+        async with db.asession() as session:
+            jobs = (
+                await session.exec(queries.recent_jobs(JOB_LABELS, RECENT_JOBS))
+            ).all()
+        return [
+            {
+                "id": job.id,
+                "kind": job.kind,
+                "label": JOB_LABELS[job.kind],
+                "status": job.status,
+                "percent": int(job.progress * 100 / job.total) if job.total else 0,
+                "progress": f"{job.progress} / {job.total}" if job.total else "",
+                "error": job.error or "",
+            }
+            for job in jobs
+        ]
+    
+    @rx.event(background=True)
+    async def track_jobs(self):
+        """Poll the recent jobs of every supervisor until none is left running."""
+        async with self:
+            if self._tracking_jobs:
+                return
+            self._tracking_jobs = True
+        
+        token = self.router.session.client_token
+        try:
+            while True:
+                jobs = await self._fetch_jobs()
+                async with self:
+                    previous = {job["id"]: job["status"] for job in self.jobs}
+                    self.jobs = jobs
                 
-                # If teacher, unmark their email as registered
-                if user.role == "teacher":
-                    allowed_teacher = session.exec(
-                        select(AllowedTeacher).where(AllowedTeacher.university_email == user.email)
-                    ).first()
-                    if allowed_teacher:
-                        allowed_teacher.is_registered = False
+                # Tables change once a deletion is through
+                finished = {
+                    job["kind"]
+                    for job in jobs
+                    if job["status"] == "done" and previous.get(job["id"], "done") != "done"
+                }
+                if finished & {"delete_user", "delete_files"}:
+                    yield [
+                        StudentsTableState.load_table,
+                        TeachersTableState.load_table,
+                        AllowedStudentsTableState.load_table,
+                        AllowedTeachersTableState.load_table,
+                        FilesTableState.load_table,
+                        SupervisorState.load_teacher_options,
+                        SupervisorState.load_stats,
+                    ]
                 
-                # Delete the user
-                session.delete(user)
-                session.commit()
-                yield rx.toast.success(f"تم حذف {user.username} بنجاح")
-                yield self.load_all_users()
+                active = any(job["status"] in ("queued", "running") for job in jobs)
+                if not active or not is_connected(token):
+                    break
+                await asyncio.sleep(JOB_POLL_SECONDS)
+        finally:
+            async with self:
+                self._tracking_jobs = False
+    
+    @rx.event
+    async def reindex_search(self):
+        """Queue a rebuild of the file search index."""
+        supervisor = await current_identity(self)
+        await enqueue("reindex_search", {}, supervisor.id if supervisor else None)
+        yield rx.toast.info("جاري إعادة بناء فهرس البحث في الخلفية")
+        yield SupervisorState.track_jobs
     
     # ========== Add Allowed Students ==========
     @rx.event
     async def add_allowed_students(self):
-        """Add student numbers to whitelist."""
-        from app.states.auth_state import AuthState
-        
+        """Add student numbers (or ranges like 210001-210500) to whitelist."""
         if not self.new_student_numbers:
             yield rx.toast.error("الرجاء إدخال أرقام الطلاب")
             return
         
-        # Get current supervisor
-        auth_state = await self.get_state(AuthState)
+        # Current supervisor, as stored at login
+        supervisor = await current_identity(self)
+        if not supervisor:
+            yield rx.toast.error("خطأ في المصادقة")
+            return
         
-        with rx.session() as session:
-            supervisor = session.exec(
-                select(User).where(User.username == auth_state.current_username)
-            ).first()
-            
-            if not supervisor:
-                yield rx.toast.error("خطأ في المصادقة")
-                return
-            
-            # Split by comma and clean
-            numbers = [num.strip() for num in self.new_student_numbers.split(",")]
-            added_count = 0
-            
-            for num in numbers:
-                # Validate 6 digits
-                if not num.isdigit() or len(num) != 6:
-                    yield rx.toast.warning(f"رقم غير صالح: {num} (يجب أن يكون 6 أرقام)")
-                    continue
-                
-                # Check if already exists
-                exists = session.exec(
-                    select(AllowedStudent).where(AllowedStudent.student_number == num)
-                ).first()
-                
-                if exists:
-                    yield rx.toast.warning(f"الرقم {num} موجود مسبقاً")
-                    continue
-                
-                # Add to whitelist
-                new_allowed = AllowedStudent(
-                    student_number=num,
-                    added_by_id=supervisor.id,
-                )
-                session.add(new_allowed)
-                added_count += 1
-            
-            session.commit()
-            
-            if added_count > 0:
-                yield rx.toast.success(f"تم إضافة {added_count} رقم طالب بنجاح")
-                self.new_student_numbers = ""
-                yield self.load_allowed_students()
+        report = await self._add_to_whitelist(
+            whitelist.add_allowed_students,
+            whitelist.split_entries(self.new_student_numbers),
+            supervisor.id,
+        )
+        
+        if report and report.added > 0:
+            self.new_student_numbers = ""
+        async for event in self._whitelist_report(report, AllowedStudentsTableState):
+            yield event
     
     # ========== Add Allowed Teachers ==========
     @rx.event
     async def add_allowed_teachers(self):
         """Add teacher emails to whitelist."""
-        from app.states.auth_state import AuthState
-        
         if not self.new_teacher_emails:
             yield rx.toast.error("الرجاء إدخال البريد الإلكتروني")
             return
         
-        # Get current supervisor
-        auth_state = await self.get_state(AuthState)
+        # Current supervisor, as stored at login
+        supervisor = await current_identity(self)
+        if not supervisor:
+            yield rx.toast.error("خطأ في المصادقة")
+            return
         
-        with rx.session() as session:
-            supervisor = session.exec(
-                select(User).where(User.username == auth_state.current_username)
-            ).first()
-            
-            if not supervisor:
-                yield rx.toast.error("خطأ في المصادقة")
-                return
-            
-            # Split by comma and clean
-            emails = [email.strip() for email in self.new_teacher_emails.split(",")]
-            added_count = 0
-            
-            for email in emails:
-                # Validate email domain
-                if not email.endswith("@nilevalley.edu.sd"):
-                    yield rx.toast.warning(f"بريد غير صالح: {email} (يجب أن ينتهي بـ @nilevalley.edu.sd)")
-                    continue
-                
-                # Check if already exists
-                exists = session.exec(
-                    select(AllowedTeacher).where(AllowedTeacher.university_email == email)
-                ).first()
-                
-                if exists:
-                    yield rx.toast.warning(f"البريد {email} موجود مسبقاً")
-                    continue
-                
-                # Add to whitelist
-                new_allowed = AllowedTeacher(
-                    university_email=email,
-                    added_by_id=supervisor.id,
-                )
-                session.add(new_allowed)
-                added_count += 1
-            
-            session.commit()
-            
-            if added_count > 0:
-                yield rx.toast.success(f"تم إضافة {added_count} بريد إلكتروني بنجاح")
-                self.new_teacher_emails = ""
-                yield self.load_allowed_teachers()
+        report = await self._add_to_whitelist(
+            whitelist.add_allowed_teachers,
+            whitelist.split_entries(self.new_teacher_emails),
+            supervisor.id,
+        )
+        
+        if report and report.added > 0:
+            self.new_teacher_emails = ""
+        async for event in self._whitelist_report(report, AllowedTeachersTableState):
+            yield event
     
-    # ========== Load Whitelists ==========
+    # ========== Whitelist Files ==========
     @rx.event
-    def load_allowed_students(self):
-        """Load allowed students list."""
-        with rx.session() as session:
-            allowed = session.exec(select(AllowedStudent)).all()
-            self.allowed_students = [
-                AllowedStudentInfo(
-                    id=s.id,
-                    student_number=s.student_number,
-                    is_registered=s.is_registered,
-                    added_date=s.added_date.strftime("%Y-%m-%d"),
-                )
-                for s in allowed
-            ]
+    async def upload_allowed_students(self, files: list[rx.UploadFile]):
+        """Add the student numbers listed in CSV/XLSX files to whitelist."""
+        async for event in self._upload_whitelist(
+            files, whitelist.add_allowed_students, AllowedStudentsTableState, "upload_allowed_students"
+        ):
+            yield event
     
     @rx.event
-    def load_allowed_teachers(self):
-        """Load allowed teachers list."""
-        with rx.session() as session:
-            allowed = session.exec(select(AllowedTeacher)).all()
-            self.allowed_teachers = [
-                AllowedTeacherInfo(
-                    id=t.id,
-                    university_email=t.university_email,
-                    is_registered=t.is_registered,
-                    added_date=t.added_date.strftime("%Y-%m-%d"),
+    async def upload_allowed_teachers(self, files: list[rx.UploadFile]):
+        """Add the teacher emails listed in CSV/XLSX files to whitelist."""
+        async for event in self._upload_whitelist(
+            files, whitelist.add_allowed_teachers, AllowedTeachersTableState, "upload_allowed_teachers"
+        ):
+            yield event
+    
+    async def _upload_whitelist(self, files, add, table_state, upload_id: str):
+        if not files:
+            yield rx.toast.error("الرجاء اختيار ملف")
+            return
+        
+        supervisor = await current_identity(self)
+        if not supervisor:
+            yield rx.toast.error("خطأ في المصادقة")
+            return
+        
+        entries = []
+        for file in files:
+            if os.path.splitext(file.filename)[1].lower() not in (".csv", ".txt", ".xlsx"):
+                yield rx.toast.error(f"نوع ملف غير مدعوم: {file.filename} (CSV أو XLSX)")
+                return
+            
+            # Stream to disk first; spreadsheets are read from a file
+            staged_path = os.path.join(STAGING_DIR, f"{secrets.token_hex(16)}.part")
+            try:
+                await save_upload(file, staged_path)
+                entries.extend(
+                    await run_io(whitelist.read_file_entries, staged_path, file.filename)
                 )
-                for t in allowed
-            ]
+            except Exception as e:
+                print(f"Whitelist file error: {e}")  # Debug log
+                yield rx.toast.error(f"تعذرت قراءة الملف: {file.filename}")
+                return
+            finally:
+                await run_io(remove_file, staged_path)
+        
+        report = await self._add_to_whitelist(add, entries, supervisor.id)
+        
+        yield rx.clear_selected_files(upload_id)
+        async for event in self._whitelist_report(report, table_state):
+            yield event
+    
+    async def _add_to_whitelist(self, add, entries, supervisor_id: int):
+        """Run one whitelist ingestion; None if other supervisors kept adding the same entries."""
+        try:
+            async with db.asession() as session:
+                return await add(session, entries, supervisor_id)
+        except IntegrityError as e:
+            print(f"Whitelist insert conflict: {e}")  # Debug log
+            return None
+    
+    async def _whitelist_report(self, report, table_state):
+        """One toast for the whole batch, then refresh the table."""
+        if report is None:
+            yield rx.toast.error("أضاف مشرف آخر بعض المدخلات في نفس الوقت، الرجاء المحاولة مجدداً")
+            return
+        if report.added > 0 and not report.invalid:
+            yield rx.toast.success(report.message())
+        else:
+            yield rx.toast.warning(report.message())
+        
+        if report.added > 0:
+            yield table_state.load_table
+            yield SupervisorState.load_stats
     
     # ========== Delete Files ==========
     @rx.event
-    def delete_file(self, file_id: int):
+    async def delete_file(self, file_id: int):
         """Delete a file uploaded by teacher."""
-        with rx.session() as session:
-            file = session.get(UploadedFile, file_id)
-            if file:
-                # Delete physical file
-                if os.path.exists(file.file_path):
-                    os.remove(file.file_path)
-                
-                # Delete from database
-                session.delete(file)
-                session.commit()
-                yield rx.toast.success("تم حذف الملف بنجاح")
+        async def delete(session):
+            file = await session.get(UploadedFile, file_id)
+            if not file:
+                return None
+            # Delete from database
+            return file.semester, await delete_uploaded_file(session, file)
+        
+        deleted = await db.write(delete)
+        if deleted is None:
+            return
+        semester, file_path = deleted
+        listing_cache.invalidate(semester)
+        
+        # Delete physical file unless other uploads share it
+        if file_path:
+            await run_io(remove_file, file_path)
+        yield rx.toast.success("تم حذف الملف بنجاح")
+        yield FilesTableState.load_table
     
     # ========== Semester Results Upload ==========
     @rx.event
     async def upload_semester_result(self, files: list[rx.UploadFile]):
         """Handle semester result file upload."""
-        from app.states.auth_state import AuthState
-        
         if not files:
             yield rx.toast.error("الرجاء اختيار ملف")
             return
@@ -335,56 +517,97 @@ class SupervisorState(rx.State):
             yield rx.toast.error("الرجاء إدخال وصف للنتيجة")
             return
         
-        # Get current supervisor
-        auth_state = await self.get_state(AuthState)
+        # Current supervisor, as stored at login
+        supervisor = await current_identity(self)
+        if not supervisor:
+            yield rx.toast.error("خطأ في المصادقة")
+            return
         
         for file in files:
             try:
-                # Create uploads directory
-                upload_dir = "assets/uploaded_files/results"
-                os.makedirs(upload_dir, exist_ok=True)
-                
                 # Generate unique filename
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 original_filename = file.filename
                 file_extension = os.path.splitext(original_filename)[1]
+                
+                # Results are split into per-student rows, so only sheets are accepted
+                if file_extension.lower() not in (".csv", ".xlsx"):
+                    yield rx.toast.error(f"صيغة غير مدعومة: {original_filename} (CSV أو XLSX فقط)")
+                    continue
                 stored_filename = f"{timestamp}_result_{original_filename}"
-                file_path = os.path.join(upload_dir, stored_filename)
+                file_path = os.path.join(RESULTS_DIR, stored_filename)
                 
-                # Save file
-                file_data = await file.read()
-                with open(file_path, "wb") as f:
-                    f.write(file_data)
+                # Save file (streamed to disk in chunks)
+                file_size = await save_upload(file, file_path)
                 
                 # Save to database
-                with rx.session() as session:
-                    supervisor = session.exec(
-                        select(User).where(User.username == auth_state.current_username)
-                    ).first()
-                    
-                    if not supervisor:
-                        yield rx.toast.error("خطأ في المصادقة")
-                        return
-                    
+                async with db.asession() as session:
                     new_result = SemesterResult(
                         semester=self.result_semester,
                         filename=original_filename,
                         stored_filename=stored_filename,
                         file_path=file_path,
-                        file_size=len(file_data),
+                        file_size=file_size,
                         uploaded_by_id=supervisor.id,
                         description=self.result_description,
                     )
                     
                     session.add(new_result)
-                    session.commit()
+                    await session.commit()
+                    await session.refresh(new_result)
                 
-                yield rx.toast.success(f"تم رفع النتيجة بنجاح")
+                # Parsed into per-student rows by a job, which then tells the
+                # students of that semester to reload
+                await enqueue("ingest_results", {"result_id": new_result.id}, supervisor.id)
+                
+                yield rx.toast.success("تم رفع النتيجة، جاري معالجتها")
                 self.result_description = ""
+                yield SupervisorState.track_jobs
                 
             except Exception as e:
                 yield rx.toast.error(f"خطأ في رفع الملف: {str(e)}")
     
+    # ========== Export Files ==========
+    @rx.event
+    async def download_all_files(self):
+        """Download the uploaded files matching the export filters as a ZIP."""
+        supervisor = await current_identity(self)
+        if not supervisor or supervisor.role != "supervisor":
+            return rx.toast.error("خطأ في المصادقة")
+        filters = {
+            "semester": self.export_semester,
+            "teacher": self.export_teacher_id,
+            "type": self.export_file_type,
+        }
+        params = {k: v for k, v in filters.items() if v != "all"}
+        # The signed link expires after DOWNLOAD_TOKEN_SECONDS
+        params["token"] = sign_download("exports", supervisor.id)
+        url = backend_url("/api/exports/files.zip") + f"?{urlencode(params)}"
+        # The archive is streamed by the backend, the page stays put
+        return rx.call_script(f"window.location.assign({json.dumps(url)})")
+    
+    @rx.event
+    async def export_table(self, table: str, fmt: str):
+        """Download a whole table as CSV or JSON lines, streamed by the backend."""
+        supervisor = await current_identity(self)
+        if not supervisor or supervisor.role != "supervisor":
+            return rx.toast.error("خطأ في المصادقة")
+        # The signed link expires after DOWNLOAD_TOKEN_SECONDS
+        token = sign_download("exports", supervisor.id)
+        url = backend_url(f"/api/exports/{table}.{fmt}") + f"?{urlencode({'token': token})}"
+        return rx.call_script(f"window.location.assign({json.dumps(url)})")
+    
+    @rx.event
+    async def download_semester_result(self, result_id: int):
+        """Download an uploaded results sheet; it is never served as an asset."""
+        supervisor = await current_identity(self)
+        if not supervisor or supervisor.role != "supervisor":
+            return rx.toast.error("خطأ في المصادقة")
+        # The signed link expires after DOWNLOAD_TOKEN_SECONDS
+        token = sign_download("results", supervisor.id)
+        url = backend_url(f"/api/results/{result_id}") + f"?{urlencode({'token': token})}"
+        return rx.call_script(f"window.location.assign({json.dumps(url)})")
+    
     # ========== Load Results ==========
     @rx.event
     def load_semester_results(self):
@@ -393,22 +616,12 @@ class SupervisorState(rx.State):
         pass
     
     # ========== Dashboard Stats ==========
-    @rx.var
-    def total_students(self) -> int:
-        """Get total number of students."""
-        return len(self.all_students)
-    
-    @rx.var
-    def total_teachers(self) -> int:
-        """Get total number of teachers."""
-        return len(self.all_teachers)
-    
-    @rx.var
-    def total_allowed_students(self) -> int:
-        """Get total allowed students in whitelist."""
-        return len(self.allowed_students)
-    
-    @rx.var
-    def total_allowed_teachers(self) -> int:
-        """Get total allowed teachers in whitelist."""
-        return len(self.allowed_teachers)
\ No newline at end of file
+    @rx.event(background=True)
+    async def load_stats(self):
+        """Load the statistics header from aggregate counts."""
+        counts = await dashboard_counts()
+        async with self:
+            self.total_students = counts["students"]
+            self.total_teachers = counts["teachers"]
+            self.total_allowed_students = counts["allowed_students"]
+            self.total_allowed_teachers = counts["allowed_teachers"]
@@ -0,0 +1,10 @@
+from typing import Dict
+
+from app import db, queries
+
+
+async def dashboard_counts() -> Dict[str, int]:
+    """Supervisor statistics, all four counts in one round trip."""
+    async with db.asession() as session:
+        row = (await session.execute(queries.dashboard_counts())).one()
+    return dict(row._mapping)
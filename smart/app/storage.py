@@ -0,0 +1,102 @@
+import asyncio
+import functools
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator
+
+
+# Uploads are copied in 1 MB pieces so a worker never holds a whole file
+CHUNK_SIZE = 1024 * 1024
+
+# Inside assets so Reflex serves the files
+UPLOAD_DIR = "assets/uploaded_files"
+
+# Uploads that are not finished yet stay outside assets so they are never served
+STAGING_DIR = ".uploads_partial"
+
+# Results sheets hold every student's grades: outside assets, and only sent
+# through the signed /api/results route
+RESULTS_DIR = "uploaded_results"
+
+# Blocking disk work runs on this pool instead of the event loop. It is
+# bounded so a burst of uploads queues up rather than spawning threads.
+IO_WORKERS = 8
+_io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="smart-io")
+
+# How many files of one multi-file upload are written at the same time
+UPLOAD_CONCURRENCY = 4
+
+
+async def run_io(func, *args, **kwargs):
+    """Run a blocking filesystem call on the I/O pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor, functools.partial(func, *args, **kwargs))
+
+
+async def iter_upload(file, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Yield the content of an uploaded file in fixed-size chunks."""
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _open_temp(directory: str):
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".upload_", suffix=".part")
+    return os.fdopen(fd, "wb"), tmp_path
+
+
+def _write_chunk(out, chunk: bytes, digest):
+    out.write(chunk)
+    if digest is not None:
+        digest.update(chunk)
+
+
+async def write_stream(chunks: AsyncIterator[bytes], file_path: str, digest=None) -> int:
+    """Write chunks to a temp file, rename it to file_path and return the size.
+
+    The temp file lives next to the target so the final rename is atomic and
+    a half-written upload never shows up under its real name. When a hashlib
+    object is passed as digest it is fed every chunk on the way.
+    """
+    out, tmp_path = await run_io(_open_temp, os.path.dirname(file_path) or ".")
+    size = 0
+    try:
+        try:
+            async for chunk in chunks:
+                await run_io(_write_chunk, out, chunk, digest)
+                size += len(chunk)
+        finally:
+            await run_io(out.close)
+        await run_io(os.replace, tmp_path, file_path)
+    except BaseException:
+        await run_io(remove_file, tmp_path)
+        raise
+    return size
+
+
+async def save_upload(file, file_path: str, digest=None) -> int:
+    """Stream an rx.UploadFile to file_path and return its size in bytes."""
+    return await write_stream(iter_upload(file), file_path, digest)
+
+
+def hash_file(file_path: str) -> str:
+    """Compute the sha256 of a file on disk without loading it whole."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def remove_file(file_path: str):
+    """Delete a file from disk, ignoring files that are already gone."""
+    try:
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+    except Exception as e:
+        print(f"Filesystem delete error: {e}")
@@ -0,0 +1,279 @@
+import asyncio
+import base64
+import hashlib
+import os
+import secrets
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Optional
+
+from sqlalchemy import delete, update
+
+from app import db, queries
+from app.models import UploadedFile, UploadSession
+from app.blobstore import add_blob_ref, stage_existing, unmove_blobs
+from app.listing_cache import listing_cache
+from app.storage import STAGING_DIR, remove_file, run_io
+
+
+# Chunk size used by the browser client, and the most we accept per request
+RESUMABLE_CHUNK_SIZE = 5 * 1024 * 1024
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+
+# Partial uploads untouched for this long are removed by the janitor
+UPLOAD_SESSION_TTL = timedelta(hours=24)
+JANITOR_INTERVAL_SECONDS = 60 * 60
+
+# One lock per upload so two requests can't append at the same offset
+_upload_locks: Dict[str, asyncio.Lock] = {}
+
+
+class UploadError(Exception):
+    """Resumable upload failure carrying the HTTP status to answer with."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+async def create_upload_session(
+    user_id: int,
+    filename: str,
+    total_size: int,
+    file_type: str,
+    semester: str,
+    file_description: str = "",
+    client_key: Optional[str] = None,
+) -> UploadSession:
+    """Start a resumable upload, or return the unfinished one for client_key."""
+    if client_key:
+        async with db.asession() as session:
+            existing = (
+                await session.exec(queries.resumable_upload(client_key, user_id, total_size))
+            ).first()
+        if existing:
+            return existing
+
+    upload_id = secrets.token_urlsafe(24)
+    part_path = os.path.join(STAGING_DIR, f"{upload_id}.part")
+    await run_io(_create_part, part_path)
+
+    async def add(session) -> UploadSession:
+        upload = UploadSession(
+            upload_id=upload_id,
+            filename=filename,
+            file_type=file_type,
+            file_description=file_description,
+            semester=semester,
+            total_size=total_size,
+            client_key=client_key,
+            part_path=part_path,
+            uploaded_by_id=user_id,
+        )
+        session.add(upload)
+        await session.flush()
+        return upload
+
+    return await db.write(add)
+
+
+def _create_part(part_path: str):
+    os.makedirs(os.path.dirname(part_path), exist_ok=True)
+    open(part_path, "wb").close()
+
+
+async def get_upload_session(upload_id: str) -> UploadSession:
+    """Get an upload session by its token."""
+    async with db.asession() as session:
+        upload = (
+            await session.exec(queries.upload_session(upload_id))
+        ).first()
+    if not upload:
+        raise UploadError(404, "Unknown upload")
+    return upload
+
+
+def _parse_checksum(header: Optional[str]) -> Optional[bytes]:
+    """Parse an `Upload-Checksum: sha256 <base64>` header."""
+    if not header:
+        return None
+    algorithm, _, value = header.strip().partition(" ")
+    if algorithm.lower() != "sha256":
+        raise UploadError(400, "Only sha256 checksums are supported")
+    try:
+        return base64.b64decode(value)
+    except ValueError:
+        raise UploadError(400, "Malformed checksum")
+
+
+def _open_part(part_path: str, offset: int):
+    f = open(part_path, "r+b")
+    # Drop bytes left over from a chunk that was never acknowledged
+    f.truncate(offset)
+    f.seek(offset)
+    return f
+
+
+def _truncate_and_close(f, offset: int):
+    f.truncate(offset)
+    f.close()
+
+
+async def append_chunk(
+    upload_id: str,
+    offset: int,
+    chunks: AsyncIterator[bytes],
+    checksum: Optional[str] = None,
+) -> int:
+    """Append one chunk at offset and return the new offset.
+
+    The chunk is only kept when its sha256 matches the checksum sent by the
+    client, otherwise the partial file is cut back to the previous offset.
+    """
+    expected_digest = _parse_checksum(checksum)
+    lock = _upload_locks.setdefault(upload_id, asyncio.Lock())
+
+    async with lock:
+        upload = await get_upload_session(upload_id)
+        if offset != upload.offset:
+            raise UploadError(409, f"Offset mismatch, expected {upload.offset}")
+
+        digest = hashlib.sha256()
+        written = 0
+        f = await run_io(_open_part, upload.part_path, offset)
+        try:
+            async for data in chunks:
+                written += len(data)
+                if written > MAX_CHUNK_SIZE or offset + written > upload.total_size:
+                    raise UploadError(413, "Chunk exceeds the declared upload size")
+                await run_io(_write_hashed, f, data, digest)
+            if expected_digest is not None and digest.digest() != expected_digest:
+                raise UploadError(460, "Checksum mismatch")
+        except BaseException:
+            await run_io(_truncate_and_close, f, offset)
+            raise
+        await run_io(f.close)
+
+        # One small write per chunk; the write queue commits them together
+        async def save_offset(session):
+            await session.execute(
+                update(UploadSession)
+                .where(UploadSession.id == upload.id)
+                .values(offset=offset + written, updated_date=datetime.now())
+            )
+
+        await db.write(save_offset)
+        return offset + written
+
+
+def _write_hashed(f, data: bytes, digest):
+    f.write(data)
+    digest.update(data)
+
+
+async def commit_upload(upload_id: str) -> UploadedFile:
+    """Turn a fully received upload into an UploadedFile row.
+
+    The part file is hashed before any connection is taken, then the rows
+    are written in one short queued write.
+    """
+    lock = _upload_locks.setdefault(upload_id, asyncio.Lock())
+
+    async with lock:
+        upload = await get_upload_session(upload_id)
+        if upload.offset != upload.total_size:
+            raise UploadError(409, "Upload is not complete")
+
+        # Identical content is stored once and shared
+        try:
+            staged_path, sha256, size = await stage_existing(upload.part_path)
+        except FileNotFoundError:
+            # Another request committed it meanwhile
+            raise UploadError(404, "Unknown upload")
+        extension = os.path.splitext(upload.filename)[1]
+        moved = []
+
+        async def save(session) -> UploadedFile:
+            # Run again alone if a shared commit failed: start from the part file
+            await unmove_blobs(moved)
+            moved.clear()
+
+            claimed = await session.execute(
+                delete(UploadSession).where(UploadSession.id == upload.id)
+            )
+            if not claimed.rowcount:
+                raise UploadError(404, "Unknown upload")
+
+            blob = await add_blob_ref(session, staged_path, sha256, size, extension, moved)
+            new_file = UploadedFile(
+                filename=upload.filename,
+                stored_filename=os.path.basename(blob.file_path),
+                file_type=upload.file_type,
+                file_description=upload.file_description,
+                semester=upload.semester,
+                uploaded_by_id=upload.uploaded_by_id,
+                file_size=size,
+                file_path=blob.file_path,
+                blob_id=blob.id,
+            )
+            session.add(new_file)
+            await session.flush()
+            return new_file
+
+        try:
+            new_file = await db.write(save)
+        except Exception:
+            # The part file goes back in place, so the commit can be retried
+            await unmove_blobs(moved)
+            raise
+    listing_cache.invalidate(new_file.semester)
+
+    _upload_locks.pop(upload_id, None)
+    return new_file
+
+
+async def abort_upload(upload_id: str):
+    """Cancel an upload and remove its partial file."""
+
+    async def delete(session) -> Optional[str]:
+        upload = (
+            await session.exec(queries.upload_session(upload_id))
+        ).first()
+        if not upload:
+            return None
+        await session.delete(upload)
+        return upload.part_path
+
+    part_path = await db.write(delete)
+    if part_path is None:
+        raise UploadError(404, "Unknown upload")
+
+    _upload_locks.pop(upload_id, None)
+    await run_io(remove_file, part_path)
+
+
+async def expire_stale_uploads() -> int:
+    """Remove upload sessions that have not received data within the TTL."""
+    cutoff = datetime.now() - UPLOAD_SESSION_TTL
+    async with db.asession() as session:
+        stale = (await session.exec(queries.stale_uploads(cutoff))).all()
+        part_paths = [upload.part_path for upload in stale]
+        for upload in stale:
+            _upload_locks.pop(upload.upload_id, None)
+            await session.delete(upload)
+        await session.commit()
+
+    for part_path in part_paths:
+        await run_io(remove_file, part_path)
+    return len(part_paths)
+
+
+async def upload_janitor():
+    """Lifespan task that periodically expires stale partial uploads."""
+    while True:
+        try:
+            removed = await expire_stale_uploads()
+            if removed:
+                print(f"Upload janitor removed {removed} stale uploads")
+        except Exception as e:
+            print(f"Upload janitor error: {e}")
+        await asyncio.sleep(JANITOR_INTERVAL_SECONDS)
@@ -0,0 +1,144 @@
+import re
+from datetime import datetime
+from typing import Iterable, Iterator, List, NamedTuple, Sequence, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from app import queries
+from app.models import AllowedStudent, AllowedTeacher
+from app.spreadsheets import iter_rows
+
+
+TEACHER_EMAIL_DOMAIN = "@nilevalley.edu.sd"
+
+# A pasted range expands to at most this many student numbers
+MAX_RANGE_SIZE = 10_000
+
+# Values per IN (...) lookup, well under SQLite's bound-parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+# Invalid entries quoted in the report; the rest are only counted
+REPORT_EXAMPLES = 5
+
+_SEPARATORS = re.compile(r"[\s,;،]+")
+_RANGE = re.compile(r"^(\d{6})-(\d{6})$")
+
+
+class WhitelistReport(NamedTuple):
+    """Outcome of one bulk whitelist ingestion."""
+
+    added: int
+    duplicates: int
+    invalid: List[str]
+
+    def message(self) -> str:
+        """One summary line for the supervisor."""
+        parts = [f"تمت إضافة {self.added}"]
+        if self.duplicates:
+            parts.append(f"موجود مسبقاً {self.duplicates}")
+        if self.invalid:
+            examples = "، ".join(self.invalid[:REPORT_EXAMPLES])
+            more = "…" if len(self.invalid) > REPORT_EXAMPLES else ""
+            parts.append(f"غير صالح {len(self.invalid)} ({examples}{more})")
+        return " - ".join(parts)
+
+
+def split_entries(text: str) -> List[str]:
+    """Entries of a pasted list, separated by commas, semicolons or whitespace."""
+    return [entry for entry in _SEPARATORS.split(text or "") if entry]
+
+
+def parse_student_numbers(entries: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """Valid 6-digit numbers (ranges like 210001-210500 expanded) and invalid entries."""
+    valid: List[str] = []
+    invalid: List[str] = []
+    for entry in entries:
+        entry = entry.strip()
+        match = _RANGE.match(entry)
+        if match:
+            first, last = int(match.group(1)), int(match.group(2))
+            if first <= last and last - first < MAX_RANGE_SIZE:
+                valid.extend(f"{n:06d}" for n in range(first, last + 1))
+            else:
+                invalid.append(entry)
+        elif entry.isdigit() and len(entry) == 6:
+            valid.append(entry)
+        elif entry:
+            invalid.append(entry)
+    return list(dict.fromkeys(valid)), invalid
+
+
+def parse_teacher_emails(entries: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """Valid university emails and invalid entries."""
+    valid: List[str] = []
+    invalid: List[str] = []
+    for entry in entries:
+        entry = entry.strip()
+        if entry.lower().endswith(TEACHER_EMAIL_DOMAIN) and len(entry) > len(TEACHER_EMAIL_DOMAIN):
+            valid.append(entry)
+        elif entry:
+            invalid.append(entry)
+    return list(dict.fromkeys(valid)), invalid
+
+
+def iter_file_entries(file_path: str, filename: str) -> Iterator[str]:
+    """Every non-empty cell of a CSV or XLSX file, read row by row.
+
+    A first row with no digit and no "@" is taken as a header and skipped.
+    """
+    for i, row in enumerate(iter_rows(file_path, filename)):
+        if i == 0 and not any(ch.isdigit() or ch == "@" for cell in row for ch in cell):
+            continue
+        for cell in row:
+            yield from split_entries(cell)
+
+
+def read_file_entries(file_path: str, filename: str) -> List[str]:
+    """All entries of an uploaded whitelist file (blocking, run on the I/O pool)."""
+    return list(iter_file_entries(file_path, filename))
+
+
+async def _existing(session, column, values: Sequence[str]) -> set:
+    found = set()
+    for i in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        chunk = values[i:i + LOOKUP_CHUNK_SIZE]
+        found.update((await session.exec(queries.existing_whitelist_values(column, chunk))).all())
+    return found
+
+
+async def _ingest(session, model, column, values: List[str], invalid: List[str], added_by_id: int) -> WhitelistReport:
+    for attempt in range(2):
+        existing = await _existing(session, column, values)
+        new_values = [v for v in values if v not in existing]
+        if not new_values:
+            break
+        now = datetime.now()
+        try:
+            await session.execute(
+                insert(model),
+                [
+                    {column.key: v, "added_by_id": added_by_id, "is_registered": False, "added_date": now}
+                    for v in new_values
+                ],
+            )
+            await session.commit()
+            break
+        except IntegrityError:
+            # Another supervisor added some of them meanwhile; check again
+            await session.rollback()
+            if attempt:
+                raise
+    return WhitelistReport(added=len(new_values), duplicates=len(existing), invalid=invalid)
+
+
+async def add_allowed_students(session, entries: Iterable[str], added_by_id: int) -> WhitelistReport:
+    """Whitelist student numbers with one lookup per chunk and one bulk insert."""
+    numbers, invalid = parse_student_numbers(entries)
+    return await _ingest(session, AllowedStudent, AllowedStudent.student_number, numbers, invalid, added_by_id)
+
+
+async def add_allowed_teachers(session, entries: Iterable[str], added_by_id: int) -> WhitelistReport:
+    """Whitelist teacher emails with one lookup per chunk and one bulk insert."""
+    emails, invalid = parse_teacher_emails(entries)
+    return await _ingest(session, AllowedTeacher, AllowedTeacher.university_email, emails, invalid, added_by_id)
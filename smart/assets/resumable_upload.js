@@ -0,0 +1,82 @@
+// Resumable chunked uploads against /api/uploads (see app/api.py).
+// The backend matches client_key to an unfinished upload, so picking the
+// same file again after a reload resumes where it stopped.
+
+// Describe the file picked in inputId so the backend can open a session.
+window.smartFileInfo = function (inputId, fileType) {
+  const input = document.getElementById(inputId);
+  const file = input && input.files && input.files[0];
+  if (!file) {
+    return { input_id: inputId, file_type: fileType, filename: "" };
+  }
+  return {
+    input_id: inputId,
+    file_type: fileType,
+    filename: file.name,
+    size: file.size,
+    client_key: `${file.name}:${file.size}:${file.lastModified}`,
+  };
+};
+
+async function smartChecksum(buffer) {
+  if (!window.crypto || !window.crypto.subtle) {
+    return null;
+  }
+  const digest = new Uint8Array(await crypto.subtle.digest("SHA-256", buffer));
+  let binary = "";
+  digest.forEach((b) => (binary += String.fromCharCode(b)));
+  return "sha256 " + btoa(binary);
+}
+
+async function smartUploadOffset(url) {
+  const resp = await fetch(url, { cache: "no-store" });
+  if (!resp.ok) {
+    throw new Error(`status ${resp.status}`);
+  }
+  return (await resp.json()).offset;
+}
+
+// Send the file in chunks, resuming from the server offset after failures.
+window.smartResumableUpload = async function (inputId, apiUrl, uploadId, chunkSize) {
+  const file = document.getElementById(inputId).files[0];
+  const url = `${apiUrl}/api/uploads/${uploadId}`;
+
+  let failures = 0;
+  let offset = null;
+  while (offset === null || offset < file.size) {
+    try {
+      if (offset === null) {
+        offset = await smartUploadOffset(url);
+        continue;
+      }
+      const buffer = await file.slice(offset, offset + chunkSize).arrayBuffer();
+      const headers = {
+        "Content-Type": "application/offset+octet-stream",
+        "Upload-Offset": String(offset),
+      };
+      const checksum = await smartChecksum(buffer);
+      if (checksum) {
+        headers["Upload-Checksum"] = checksum;
+      }
+      const resp = await fetch(url, { method: "PATCH", headers, body: buffer });
+      if (resp.status === 404) {
+        return { upload_id: uploadId, ok: false, expired: true };
+      }
+      if (!resp.ok) {
+        throw new Error(`status ${resp.status}`);
+      }
+      offset = (await resp.json()).offset;
+      failures = 0;
+    } catch (e) {
+      failures += 1;
+      if (failures > 8) {
+        return { upload_id: uploadId, ok: false, expired: false };
+      }
+      // Back off, then ask the server where to continue from
+      await new Promise((r) => setTimeout(r, Math.min(30000, 1000 * 2 ** failures)));
+      offset = null;
+    }
+  }
+
+  return { upload_id: uploadId, ok: true, expired: false };
+};
@@ -0,0 +1,201 @@
+"""Throughput of concurrent page loads: blocking, async and threaded sessions.
+
+    python benchmarks/db_concurrency.py [rows]
+
+Each simulated client loads the files page (count + first page of its
+semester) and then waits a few milliseconds, as if sending the result.
+With a blocking session every query holds the event loop, so clients
+queue behind each other. An async session keeps the loop free but hops
+to aiosqlite's thread for every query and fetch; a threaded read (what
+app.db.read() does) runs the whole read in one hop on a thread per
+pooled connection. Prints requests/s and loop lag for a growing number
+of clients, on a temporary SQLite database.
+
+Measured on one core with 100 000 files and the default pool:
+
+    clients  blocking req/s  lag p99  async req/s  lag p99  threaded req/s  lag p99
+          1             105    4.2ms           89    2.4ms             101    2.2ms
+          4             289   12.9ms          191    3.7ms             262    5.3ms
+         16             366   44.5ms          281   10.2ms             332   25.9ms
+         64             366  197.3ms          300    9.1ms             336  119.5ms
+
+Blocking sessions serve the most requests but stall every other client.
+Async sessions keep the loop responsive and are 15-35% slower. Threaded
+reads come within 10% of blocking with less lag, though under heavy load
+the worker threads still compete with the loop for the GIL. Numbers move
+by ~20% between runs here; compare columns within one run.
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Reflex has to load before sqlmodel, so the app modules come first
+from app.db import db_settings
+from app.models import UploadedFile, User
+
+import sqlmodel
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, SQLModel, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+CLIENTS = (1, 4, 16, 64)
+REQUESTS_PER_CLIENT = 20
+SEMESTERS = [f"الفصل {n}" for n in range(1, 11)]
+SEND_SECONDS = 0.005
+TICK_SECONDS = 0.001
+
+
+def _page_query(semester: str):
+    return (
+        select(UploadedFile, User)
+        .join(User)
+        .where(UploadedFile.semester == semester)
+        .order_by(UploadedFile.upload_date.desc(), UploadedFile.id.desc())
+        .limit(20)
+    )
+
+
+def _count_query(semester: str):
+    return select(func.count(UploadedFile.id)).where(UploadedFile.semester == semester)
+
+
+def _seed(url: str, rows: int):
+    engine = sqlmodel.create_engine(url)
+    SQLModel.metadata.create_all(engine)
+    now = datetime.now()
+    with Session(engine) as session:
+        teacher = User(username="t", email="t@x", password_hash="x", role="teacher")
+        session.add(teacher)
+        session.commit()
+        session.refresh(teacher)
+        for start in range(0, rows, 10_000):
+            session.execute(
+                insert(UploadedFile),
+                [
+                    {
+                        "filename": f"f{i}.pdf",
+                        "stored_filename": f"f{i}.pdf",
+                        "file_type": "lecture",
+                        "semester": SEMESTERS[i % len(SEMESTERS)],
+                        "uploaded_by_id": teacher.id,
+                        "file_path": f"/tmp/f{i}.pdf",
+                        "upload_date": now - timedelta(minutes=i),
+                    }
+                    for i in range(start, min(start + 10_000, rows))
+                ],
+            )
+        session.commit()
+    engine.dispose()
+
+
+async def _blocking_request(engine, semester: str):
+    """What the handlers did before: a sync session inside an async handler."""
+    with Session(engine) as session:
+        session.exec(_count_query(semester)).one()
+        session.exec(_page_query(semester)).all()
+    await asyncio.sleep(SEND_SECONDS)
+
+
+async def _async_request(engine, semester: str):
+    async with AsyncSession(engine) as session:
+        (await session.exec(_count_query(semester))).one()
+        (await session.exec(_page_query(semester))).all()
+    await asyncio.sleep(SEND_SECONDS)
+
+
+def _load_page(engine, semester: str):
+    with Session(engine) as session:
+        session.exec(_count_query(semester)).one()
+        session.exec(_page_query(semester)).all()
+
+
+def _threaded_request(executor: ThreadPoolExecutor):
+    """A blocking session run in one executor hop, like app.db.read()."""
+    async def request(engine, semester: str):
+        await asyncio.get_running_loop().run_in_executor(executor, _load_page, engine, semester)
+        await asyncio.sleep(SEND_SECONDS)
+
+    return request
+
+
+async def _measure_lag(stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        samples.append((time.perf_counter() - start - TICK_SECONDS) * 1000)
+
+
+async def _run(request, engine, clients: int):
+    async def client():
+        for _ in range(REQUESTS_PER_CLIENT):
+            await request(engine, random.choice(SEMESTERS))
+
+    samples = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_measure_lag(stop, samples))
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+
+    samples.sort()
+    p99 = samples[max(0, int(len(samples) * 0.99) - 1)] if samples else 0.0
+    return clients * REQUESTS_PER_CLIENT / elapsed, p99
+
+
+async def _bench(path: str):
+    settings = db_settings()
+    pool = {
+        "pool_size": settings["db_pool_size"],
+        "max_overflow": settings["db_max_overflow"],
+        "pool_timeout": settings["db_pool_timeout"],
+    }
+    blocking = sqlmodel.create_engine(
+        f"sqlite:///{path}", connect_args={"check_same_thread": False}, **pool
+    )
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", **pool)
+    executor = ThreadPoolExecutor(max_workers=pool["pool_size"] + pool["max_overflow"])
+    threaded_request = _threaded_request(executor)
+    print(f"pool_size={pool['pool_size']} max_overflow={pool['max_overflow']}")
+    print(
+        f"{'clients':>8} {'blocking req/s':>15} {'lag p99':>9} {'async req/s':>12} {'lag p99':>9}"
+        f" {'threaded req/s':>15} {'lag p99':>9}"
+    )
+    for clients in CLIENTS:
+        sync_rate, sync_lag = await _run(_blocking_request, blocking, clients)
+        async_rate, async_lag = await _run(_async_request, async_engine, clients)
+        threaded_rate, threaded_lag = await _run(threaded_request, blocking, clients)
+        print(
+            f"{clients:>8} {sync_rate:>15.0f} {sync_lag:>7.1f}ms"
+            f" {async_rate:>12.0f} {async_lag:>7.1f}ms"
+            f" {threaded_rate:>15.0f} {threaded_lag:>7.1f}ms"
+        )
+    executor.shutdown()
+    blocking.dispose()
+    await async_engine.dispose()
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    workdir = tempfile.mkdtemp(prefix="smart_bench_")
+    path = os.path.join(workdir, "bench.db")
+    print(f"Seeding {rows} files")
+    _seed(f"sqlite:///{path}", rows)
+    try:
+        asyncio.run(_bench(path))
+    finally:
+        os.remove(path)
+        os.rmdir(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""Check that the app's queries use indexes on a large seeded database.
+
+    python benchmarks/query_plans.py [files]
+    QUERY_PLAN_FILES=1000000 python -m pytest tests/test_query_plans.py
+
+Seeds a temporary SQLite database from the models (20k uploaded files by
+default, plus users, whitelists, jobs and results), runs ANALYZE, then
+prints EXPLAIN QUERY PLAN for each builder in app.queries, called with
+the sample arguments below. Exits with status 1 when a query scans a
+whole table, so it can be run as a regression check after changing a
+model or a query. A builder without samples stops the check.
+
+File search is left out: on SQLite it goes through the FTS index
+(app/search.py).
+"""
+import inspect
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Reflex has to load before sqlmodel, so the app modules come first
+from app import queries
+from app.exports import EXPORT_TABLES
+from app.models import (
+    AllowedStudent,
+    AllowedTeacher,
+    FileBlob,
+    Job,
+    SemesterResult,
+    StudentResult,
+    UploadedFile,
+    UploadSession,
+    User,
+)
+
+import sqlmodel
+from sqlalchemy import insert
+from sqlmodel import SQLModel
+
+
+# Small enough for the test run; set QUERY_PLAN_FILES=1000000 for a live-sized check
+DEFAULT_FILES = int(os.environ.get("QUERY_PLAN_FILES", 20_000))
+SEED_BATCH = 50_000
+SEMESTERS = [f"الفصل {n}" for n in range(1, 11)]
+
+# Queries that read every row on purpose; a table scan is expected there
+FULL_READS = {"export_entries (no filter)", "table_export"}
+
+# Windows walked in primary-key order; the scan stops at OFFSET + LIMIT rows
+ORDERED_WALKS = {"allowed_students_window", "allowed_teachers_window", "recent_jobs"}
+
+
+def _seed(engine, files: int):
+    now = datetime.now()
+    students = max(files // 20, 100)
+    teachers = max(files // 2000, 10)
+
+    def rows(model, count, make):
+        with engine.begin() as connection:
+            for start in range(0, count, SEED_BATCH):
+                connection.execute(
+                    insert(model), [make(i) for i in range(start, min(start + SEED_BATCH, count))]
+                )
+
+    rows(User, students + teachers + 1, lambda i: {
+        "username": f"user{i}",
+        "email": f"user{i}@x",
+        "password_hash": "x",
+        "role": "supervisor" if i == 0 else "teacher" if i <= teachers else "student",
+        "full_name": f"User {i}",
+        "university_id": f"{200000 + i}",
+        "semester": SEMESTERS[i % len(SEMESTERS)],
+    })
+    rows(UploadedFile, files, lambda i: {
+        "filename": f"f{i}.pdf",
+        "stored_filename": f"f{i}.pdf",
+        "file_type": "lecture" if i % 3 else "exam",
+        "semester": SEMESTERS[i % len(SEMESTERS)],
+        "uploaded_by_id": 1 + i % teachers,
+        "upload_date": now - timedelta(minutes=i),
+        "file_path": f"/tmp/f{i}.pdf",
+    })
+    rows(FileBlob, files // 10, lambda i: {
+        "sha256": f"{i:064x}", "file_path": f"/tmp/b{i}", "file_size": 1, "ref_count": 1,
+        "created_date": now,
+    })
+    rows(AllowedStudent, students, lambda i: {
+        "student_number": f"{200000 + i}", "is_registered": True, "added_by_id": 1, "added_date": now,
+    })
+    rows(AllowedTeacher, teachers, lambda i: {
+        "university_email": f"t{i}@nilevalley.edu.sd", "is_registered": True, "added_by_id": 1,
+        "added_date": now,
+    })
+    rows(SemesterResult, 100, lambda i: {
+        "semester": SEMESTERS[i % len(SEMESTERS)], "filename": "r.xlsx", "stored_filename": "r.xlsx",
+        "file_path": "/tmp/r.xlsx", "uploaded_by_id": 1, "upload_date": now - timedelta(days=i),
+    })
+    rows(StudentResult, students, lambda i: {
+        "result_id": 1 + i % 100, "semester": SEMESTERS[i % len(SEMESTERS)],
+        "student_number": f"{200000 + i}", "grades": "[]",
+    })
+    # Mostly finished jobs, a few waiting or running, as on a live server
+    rows(Job, files // 100, lambda i: {
+        "kind": ("delete_files", "remove_files", "ingest_results", "delete_user")[i % 4],
+        "payload": "{}", "status": "done" if i % 50 else ("queued", "running", "failed")[i // 50 % 3],
+        "progress": 1, "total": 1,
+        "attempts": 1, "run_after": now, "created_date": now, "updated_date": now - timedelta(hours=i),
+    })
+    rows(UploadSession, 1000, lambda i: {
+        "upload_id": f"u{i}", "filename": "f", "file_type": "lecture", "semester": SEMESTERS[0],
+        "total_size": 10, "offset": 0, "client_key": f"k{i}", "part_path": f"/tmp/u{i}",
+        "uploaded_by_id": 1, "created_date": now, "updated_date": now - timedelta(minutes=i),
+    })
+    with engine.begin() as connection:
+        connection.exec_driver_sql("ANALYZE")
+
+
+def _samples():
+    """Sample arguments for each builder in app.queries, by label."""
+    now = datetime.now()
+    semester = SEMESTERS[3]
+    return {
+        # auth_state, identity
+        "user_by_username": {"": ("user5",)},
+        "user_by_university_id": {"": ("200500",)},
+        "user_by_email": {"": ("user5@x",)},
+        # supervisor_state tables, stats
+        "users_count": {"": ("student",)},
+        "users_window": {"": ("student", 5000, 40)},
+        "teacher_options": {"": ()},
+        "dashboard_counts": {"": ()},
+        "allowed_students_count": {"": ()},
+        "allowed_students_window": {"": (5000, 40)},
+        "allowed_teachers_count": {"": ()},
+        "allowed_teachers_window": {"": (40, 40)},
+        "files_count": {"": ()},
+        "files_window": {"": (5000, 40)},
+        "recent_jobs": {"": (["delete_user", "delete_files"], 5)},
+        # whitelist, signup
+        "allowed_student": {"": ("200500",)},
+        "allowed_teacher": {"": ("t3@nilevalley.edu.sd",)},
+        "existing_whitelist_values": {
+            "numbers": (AllowedStudent.student_number, ["200001", "200002"]),
+            "emails": (AllowedTeacher.university_email, ["t1@nilevalley.edu.sd"]),
+        },
+        # file_state listing, downloads
+        "files_page": {
+            "semester, first page": (semester,),
+            "semester, next page": (semester, (now - timedelta(days=30), 500_000)),
+            "all, first page": ("",),
+        },
+        "files_by_ids": {"": ([1, 2, 3],)},
+        "file_download": {"": (5,)},
+        # job_handlers
+        "files_of_user_count": {"": (3,)},
+        "files_of_user": {"": (3, 100)},
+        "files_to_index": {"": (5000, 500)},
+        "delete_student_results": {"": (7,)},
+        # exports
+        "export_entries": {
+            "by semester": (semester,),
+            "by teacher": (None, 3),
+            "no filter": (),
+        },
+        "table_export": {table: (columns,) for table, columns in EXPORT_TABLES.items()},
+        # uploads, blobstore
+        "blobs_by_hash": {"": ([f"{1:064x}", f"{2:064x}"],)},
+        "upload_session": {"": ("u5",)},
+        "resumable_upload": {"": ("k5", 1, 10)},
+        "stale_uploads": {"": (now - timedelta(hours=24),)},
+        # student_dashboard
+        "student_results": {"": (semester, "200500")},
+        # jobs
+        "next_queued_job": {"": (now,)},
+        "next_expired_job": {"": (now - timedelta(minutes=5),)},
+        "finished_jobs": {"": (now - timedelta(days=7),)},
+    }
+
+
+def _builders():
+    return {
+        name for name, value in vars(queries).items()
+        if inspect.isfunction(value) and value.__module__ == queries.__name__ and not name.startswith("_")
+    }
+
+
+def _queries():
+    """(builder, name, statement) for every query in app.queries."""
+    samples = _samples()
+    missing = _builders() - samples.keys()
+    if missing:
+        raise SystemExit(f"No sample arguments for: {', '.join(sorted(missing))}")
+    for builder, cases in samples.items():
+        for label, args in cases.items():
+            name = f"{builder} ({label})" if label else builder
+            yield builder, name, getattr(queries, builder)(*args)
+
+
+def _plan(connection, statement):
+    compiled = statement.compile(
+        dialect=connection.dialect, compile_kwargs={"render_postcompile": True}
+    )
+    params = compiled.construct_params()
+    args = tuple(params[name] for name in compiled.positiontup)
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", args).all()
+    return [row[3] for row in rows]
+
+
+def _table_scans(plan):
+    """Steps that read a whole table; an index scan (ordered, stops at LIMIT) is fine."""
+    return [step for step in plan if step.startswith("SCAN ") and " INDEX " not in step
+            and not step.startswith("SCAN CONSTANT")]
+
+
+def check_plans(files: int = DEFAULT_FILES) -> list:
+    """Seed a temporary database, print each plan, return the queries that scan."""
+    workdir = tempfile.mkdtemp(prefix="smart_bench_")
+    path = os.path.join(workdir, "plans.db")
+    engine = sqlmodel.create_engine(f"sqlite:///{path}")
+    try:
+        SQLModel.metadata.create_all(engine)
+        started = time.perf_counter()
+        print(f"Seeding {files} files ...")
+        _seed(engine, files)
+        print(f"seeded in {time.perf_counter() - started:.0f}s\n")
+
+        failures = []
+        with engine.connect() as connection:
+            for builder, name, statement in _queries():
+                plan = _plan(connection, statement)
+                expected = {builder, name} & (FULL_READS | ORDERED_WALKS)
+                bad = bool(_table_scans(plan)) and not expected
+                print(f"{'FAIL' if bad else 'ok':>4}  {name}")
+                for step in plan:
+                    print(f"        {step}")
+                if bad:
+                    failures.append(name)
+    finally:
+        engine.dispose()
+        os.remove(path)
+        os.rmdir(workdir)
+    return failures
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_FILES
+    failures = check_plans(files)
+    if failures:
+        print(f"\nFAIL: full table scan in {len(failures)} queries: {', '.join(failures)}")
+        sys.exit(1)
+    print("\nAll queries use an index")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Write throughput on SQLite, default settings vs the production profile.
+
+    python benchmarks/sqlite_writes.py [writers]
+
+Concurrent writers each commit small writes (a job row and a progress
+update, like the job queue and upload chunks do) while readers keep
+counting rows. Three setups are timed on a fresh temporary database:
+
+    default   rollback journal, synchronous=FULL, one commit per write
+    pragmas   app.db.SQLITE_PRAGMAS, one commit per write
+    profile   SQLITE_PRAGMAS and app.db.WriteQueue batching the commits
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Reflex has to load before sqlmodel, so the app modules come first
+from app.db import WriteQueue, use_sqlite_profile
+from app.models import Job
+
+import sqlmodel
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+WRITES_PER_WRITER = 50
+READERS = 4
+
+
+async def _write(session, i: int):
+    job = Job(kind="bench", payload="{}")
+    session.add(job)
+    await session.flush()
+    await session.execute(update(Job).where(Job.id == job.id).values(progress=i))
+
+
+async def _run(url: str, pragmas: bool, queued: bool, writers: int):
+    engine = create_async_engine(url, pool_size=writers + READERS, max_overflow=0)
+    if pragmas:
+        use_sqlite_profile(engine.sync_engine)
+    queue = WriteQueue(lambda: AsyncSession(engine, expire_on_commit=False))
+    errors = 0
+    reads = 0
+    done = asyncio.Event()
+
+    async def writer():
+        nonlocal errors
+        for i in range(WRITES_PER_WRITER):
+            try:
+                if queued:
+                    await queue.run(lambda session: _write(session, i))
+                else:
+                    async with AsyncSession(engine) as session:
+                        await _write(session, i)
+                        await session.commit()
+            except OperationalError:
+                errors += 1
+
+    async def reader():
+        nonlocal reads
+        while not done.is_set():
+            async with AsyncSession(engine) as session:
+                (await session.exec(select(func.count(Job.id)))).one()
+            reads += 1
+            await asyncio.sleep(0)
+
+    readers = [asyncio.create_task(reader()) for _ in range(READERS)]
+    started = time.perf_counter()
+    await asyncio.gather(*(writer() for _ in range(writers)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await asyncio.gather(*readers)
+    await engine.dispose()
+    return writers * WRITES_PER_WRITER / elapsed, reads / elapsed, errors, queue.commits
+
+
+def main():
+    writers = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    workdir = tempfile.mkdtemp(prefix="smart_bench_")
+    print(f"{writers} writers x {WRITES_PER_WRITER} writes, {READERS} readers")
+    print(f"{'setup':>8} {'writes/s':>9} {'reads/s':>8} {'locked':>7} {'commits':>8}")
+    for name, pragmas, queued in (
+        ("default", False, False),
+        ("pragmas", True, False),
+        ("profile", True, True),
+    ):
+        path = os.path.join(workdir, f"{name}.db")
+        sync_engine = sqlmodel.create_engine(f"sqlite:///{path}")
+        SQLModel.metadata.create_all(sync_engine)
+        sync_engine.dispose()
+
+        write_rate, read_rate, errors, commits = asyncio.run(
+            _run(f"sqlite+aiosqlite:///{path}", pragmas, queued, writers)
+        )
+        commits = commits if queued else writers * WRITES_PER_WRITER - errors
+        print(f"{name:>8} {write_rate:>9.0f} {read_rate:>8.0f} {errors:>7} {commits:>8}")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    os.rmdir(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Measure event-loop lag while a large upload is written to disk.
+
+    python benchmarks/upload_loop_lag.py [size_mb]
+
+Compares the old read-everything-then-write handler with the streaming
+path in app.storage. Exits with status 1 when the p99 lag of the streaming
+path goes over LAG_BUDGET_MS, so it can be run as a regression check.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.datastructures import UploadFile
+
+from app.storage import CHUNK_SIZE, save_upload
+
+
+LAG_BUDGET_MS = 5.0
+TICK_SECONDS = 0.001
+
+
+async def _measure_lag(stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        samples.append((time.perf_counter() - start - TICK_SECONDS) * 1000)
+
+
+async def _buffered_write(file, file_path: str) -> int:
+    """What the handlers did before: whole file in memory, blocking write."""
+    file_data = await file.read()
+    with open(file_path, "wb") as f:
+        f.write(file_data)
+    return len(file_data)
+
+
+async def _run(write, source: str, target: str):
+    samples = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_measure_lag(stop, samples))
+    started = time.perf_counter()
+    with open(source, "rb") as f:
+        await write(UploadFile(file=f, filename="bench.bin"), target)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+
+    samples.sort()
+    p99 = samples[max(0, int(len(samples) * 0.99) - 1)] if samples else 0.0
+    worst = samples[-1] if samples else 0.0
+    return elapsed, p99, worst
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    workdir = tempfile.mkdtemp(prefix="smart_bench_")
+    source = os.path.join(workdir, "source.bin")
+    with open(source, "wb") as f:
+        for _ in range(size_mb):
+            f.write(os.urandom(CHUNK_SIZE))
+
+    print(f"Uploading {size_mb} MB")
+    failed = False
+    for name, write in (("buffered", _buffered_write), ("streaming", save_upload)):
+        target = os.path.join(workdir, f"{name}.bin")
+        elapsed, p99, worst = asyncio.run(_run(write, source, target))
+        print(f"{name:>10}: {elapsed:6.2f}s  loop lag p99 {p99:7.2f} ms  max {worst:7.2f} ms")
+        if name == "streaming" and p99 > LAG_BUDGET_MS:
+            failed = True
+        os.remove(target)
+
+    os.remove(source)
+    os.rmdir(workdir)
+    if failed:
+        print(f"FAIL: streaming p99 lag is over {LAG_BUDGET_MS} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
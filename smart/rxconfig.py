@@ -2,6 +2,18 @@ import reflex as rx
 
 config = rx.Config(
     app_name="app",
+    db_url="sqlite:///reflex.db",
+    # Same database through an async driver, used by app.db.asession()
+    async_db_url="sqlite+aiosqlite:///reflex.db",
+    # Connection pool of app.db's engines; each worker process has its own
+    db_pool_size=5,  # Connections kept open
+    db_max_overflow=10,  # Extra connections opened under load, closed when idle
+    db_pool_timeout=30,  # Seconds to wait for a free connection before failing
+    db_pool_recycle=1800,  # Reopen connections older than this (seconds)
+    db_pool_pre_ping=True,  # Test a connection before handing it out
+    db_sqlite_profile=True,  # WAL and tuned pragmas on SQLite (see app.db.SQLITE_PRAGMAS)
+    # Bearer token for the /api/stats/* monitoring routes; empty keeps them closed
+    stats_token="",
    # api_url="https://l81znvm7-8000.uks1.devtunnels.ms",  # Add this line
     plugins=[rx.plugins.TailwindV3Plugin()]
 )
\ No newline at end of file
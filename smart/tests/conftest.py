@@ -0,0 +1,34 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Reflex has to load before sqlmodel, so the app modules come first
+import app.models  # noqa: F401
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+@pytest.fixture
+def run_in_db(tmp_path):
+    """Run test(sessions) on a fresh SQLite database in its own event loop."""
+
+    async def main(test):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+        try:
+            async with engine.begin() as connection:
+                await connection.run_sync(SQLModel.metadata.create_all)
+            # Same options as db.asession()
+            sessions = async_sessionmaker(
+                bind=engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
+            )
+            await test(sessions)
+        finally:
+            await engine.dispose()
+
+    return lambda test: asyncio.run(main(test))
@@ -0,0 +1,47 @@
+import hashlib
+import os
+
+from app import blobstore
+from app.blobstore import add_blob_ref, delete_uploaded_file
+from app.models import UploadedFile, User
+
+
+def _stage(directory, name, data):
+    path = directory / name
+    path.write_bytes(data)
+    return str(path), hashlib.sha256(data).hexdigest(), len(data)
+
+
+async def _upload(sessions, staged):
+    async with sessions() as session:
+        blob = await add_blob_ref(session, *staged, ".txt")
+        file = UploadedFile(
+            filename="a.txt", stored_filename="a.txt", file_type="lecture", semester="S",
+            uploaded_by_id=1, file_path=blob.file_path, blob_id=blob.id,
+        )
+        session.add(file)
+        await session.commit()
+        return file
+
+
+def test_reupload_survives_pending_unlink(run_in_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(blobstore, "BLOB_DIR", str(tmp_path / "blobs"))
+
+    async def test(sessions):
+        async with sessions() as session:
+            session.add(User(username="t", email="t@x", password_hash="x", role="teacher"))
+            await session.commit()
+        first = await _upload(sessions, _stage(tmp_path, "one", b"content"))
+
+        # The last reference goes, and the same content is uploaded again
+        # before the deleter unlinks the old file
+        async with sessions() as session:
+            path = await delete_uploaded_file(session, await session.get(UploadedFile, first.id))
+            await session.commit()
+        second = await _upload(sessions, _stage(tmp_path, "two", b"content"))
+        os.remove(path)
+
+        with open(second.file_path, "rb") as f:
+            assert f.read() == b"content"
+
+    run_in_db(test)
@@ -0,0 +1,21 @@
+import os
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_models_match_migrations(tmp_path):
+    """Migrated to head, the database has no changes left to autogenerate."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    try:
+        with engine.begin() as connection:
+            config.attributes["connection"] = connection
+            command.upgrade(config, "head")
+            # Raises when autogenerate would write a migration
+            command.check(config)
+    finally:
+        engine.dispose()
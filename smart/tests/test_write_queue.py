@@ -0,0 +1,80 @@
+import asyncio
+
+from app.blobstore import delete_uploaded_file
+from app.db import WriteQueue
+from app.models import FileBlob, UploadedFile, User
+
+from sqlalchemy import text
+
+
+async def _insert_user(session, name):
+    session.add(User(username=name, email=f"{name}@x", password_hash="x", role="teacher"))
+
+
+def test_batch_commits_once(run_in_db):
+    async def test(sessions):
+        queue = WriteQueue(sessions)
+        results = await asyncio.gather(
+            *(queue.run(lambda session, i=i: _insert_user(session, f"user{i}")) for i in range(5))
+        )
+        assert results == [None] * 5
+        assert (queue.writes, queue.commits) == (5, 1)
+        async with sessions() as session:
+            assert (await session.execute(text("SELECT COUNT(*) FROM user"))).scalar() == 5
+
+    run_in_db(test)
+
+
+def test_failing_write_is_rolled_back_alone(run_in_db):
+    async def test(sessions):
+        queue = WriteQueue(sessions)
+        async def duplicate(session):
+            await _insert_user(session, "same")
+            await session.flush()
+            await _insert_user(session, "same")
+
+        results = await asyncio.gather(
+            queue.run(lambda session: _insert_user(session, "first")),
+            queue.run(duplicate),
+            queue.run(lambda session: _insert_user(session, "last")),
+            return_exceptions=True,
+        )
+        assert results[0] is None and results[2] is None
+        assert isinstance(results[1], Exception)
+        assert queue.commits == 1
+        async with sessions() as session:
+            names = (await session.execute(text("SELECT username FROM user ORDER BY id"))).scalars()
+            assert list(names) == ["first", "last"]
+
+    run_in_db(test)
+
+
+def test_writes_do_not_share_loaded_rows(run_in_db):
+    async def test(sessions):
+        queue = WriteQueue(sessions)
+        async with sessions() as session:
+            await _insert_user(session, "teacher")
+            blob = FileBlob(sha256="0" * 64, file_path="/tmp/blob", file_size=1, ref_count=2)
+            session.add(blob)
+            await session.flush()
+            for name in ("a.pdf", "b.pdf"):
+                session.add(UploadedFile(
+                    filename=name, stored_filename=name, file_type="lecture", semester="S",
+                    uploaded_by_id=1, file_path=blob.file_path, blob_id=blob.id,
+                ))
+            await session.commit()
+
+        async def delete(session):
+            file = await session.get(UploadedFile, 1)
+            return file and await delete_uploaded_file(session, file)
+
+        # Two deletes of the same file in one batch drop a single reference
+        results = await asyncio.gather(queue.run(delete), queue.run(delete))
+        assert results == [None, None]
+        assert queue.commits == 1
+        async with sessions() as session:
+            blob = await session.get(FileBlob, 1)
+            assert blob is not None and blob.ref_count == 1
+            assert (await session.get(UploadedFile, 2)).blob_id == blob.id
+
+    run_in_db(test)